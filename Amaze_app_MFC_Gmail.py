@@ -1,17 +1,41 @@
 import streamlit as st
-import pandas as pd
-import gspread
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
 from datetime import datetime, timedelta
-from PIL import Image
-from pyzbar.pyzbar import decode 
 import io 
 import time
-from googleapiclient.errors import HttpError
+import os
+import re
+import sys
+import threading
+import hashlib
+import importlib
+import shared_cache
+import drive_mirror
+import catalog_search
+import session_profiler
+import google_io
+import photo_storage
+import log_store
+import stock_ledger
+import submission_ledger
+import sheet_data
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import json
 
+# --- LAZY IMPORTS (library หนักโหลดตอนใช้ครั้งแรก เพื่อให้ container ที่เพิ่ง start แสดงหน้าแรกได้เร็ว) ---
+HEAVY_MODULES = ("pandas", "log_analytics", "gspread", "googleapiclient.discovery", "googleapiclient.http", "PIL.Image", "pyzbar.pyzbar")
+
+class _LazyModule:
+    def __init__(self, name): self._name = name
+    def __getattr__(self, attr): return getattr(importlib.import_module(self._name), attr)
+
+pd = _LazyModule("pandas")
+gspread = _LazyModule("gspread")
+Image = _LazyModule("PIL.Image")
+log_analytics = _LazyModule("log_analytics") # ใช้ pandas
+if os.environ.get("AMAZE_EAGER_IMPORTS") == "1": # โหมดเดิม: โหลดทุกอย่างตอนเริ่ม (ใช้เทียบใน Amaze_startup_report.py)
+    for _name in HEAVY_MODULES: importlib.import_module(_name)
+
 # --- DEBUG CONNECTION ---
 # st.write("Testing Connection...")
 # try:
@@ -51,6 +75,26 @@ SHEET_ID = '1rWgqfrut0H0wRSTocEq04mGGgnZs0T45uaMYZmXVdj8'
 LOG_SHEET_NAME = 'Logs'
 RIDER_SHEET_NAME = 'Rider_Logs'
 USER_SHEET_NAME = 'User'
+LOG_ARCHIVE_DIR = 'log_archive'
+LOG_HEADERS = ("Timestamp", "Picker Name", "Order ID", "Barcode", "Product Name", "Location", "Pick Qty", "User", "Image Link (Col I)")
+RIDER_HEADERS = ("Timestamp", "User Name", "Order ID", "Folder Name", "Rider Image Link")
+SUBMISSION_LEDGER_PATH = 'submission_ledger.jsonl'
+SUBMISSION_LEDGER_DAYS = 7
+SHEET_CACHE_TTL = 600
+FOLDER_CACHE_TTL = 2 * 86400
+DRIVE_MIRROR_PATH = os.environ.get("AMAZE_DRIVE_MIRROR_PATH", "drive_mirror.db") # ค่าว่าง = ปิด crawler
+DRIVE_MIRROR_INTERVAL = 30
+PROFILE_DIR = os.environ.get("AMAZE_PROFILE_DIR", "profiles")
+PROFILER_SESSION_IDLE = 1800 # session ที่ไม่ได้ rerun นานกว่านี้ไม่แสดงในหน้า Profiler
+PROFILE_LIST_LIMIT = 100
+GOOGLE_IO_POOL_SIZE = 8 # จำนวน client / thread I/O ต่อ Google ทั้ง process
+GOOGLE_IO_TIMEOUT = 60
+LOG_STORE_PATH = os.environ.get("AMAZE_LOG_STORE_PATH", "log_store.db")
+LOG_REPLICATE_INTERVAL = 5
+STOCK_COLUMN = os.environ.get("AMAZE_STOCK_COLUMN", "Stock") # คอลัมน์สต็อกใน Sheet catalog (ไม่มีคอลัมน์นี้ = ไม่ตรวจสต็อก)
+STOCK_RECONCILE_INTERVAL = int(os.environ.get("AMAZE_STOCK_RECONCILE_INTERVAL", "60"))
+STOCK_HOLD_TTL = 1800 # session ที่เงียบนานกว่านี้ถือว่าทิ้งตะกร้า คืนของที่จองไว้
+PHOTO_MIRROR_JOURNAL = 'photo_mirror.jsonl' # งานคัดลอกรูปขึ้น Drive ที่ยังค้าง (เมื่อเปิด mirror_to_drive)
 
 # --- AUTHENTICATION ---
 def get_credentials():
@@ -76,164 +120,287 @@ def get_credentials():
         st.error(f"❌ Error Credentials: {e}")
         return None
 
-def authenticate_drive():
-    try:
-        creds = get_credentials()
-        if creds: return build('drive', 'v3', credentials=creds)
-        return None
+@st.cache_resource(show_spinner=False)
+def load_drive_discovery_doc():
+    # discovery document ของ Drive v3 ที่มากับ google-api-python-client (อ่านไฟล์ครั้งเดียวต่อ process, ไม่ดึงจาก network)
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc('drive', 'v3')
+
+# --- GOOGLE I/O (event loop + pool ของ client ใช้ร่วมทั้ง process: Drive / Sheets ทุกคำสั่งเป็น coroutine มี timeout) ---
+@st.cache_resource(show_spinner=False)
+def get_google_io():
+    creds = get_credentials()
+    if creds is None: raise RuntimeError("ไม่พบข้อมูล [oauth] ใน Secrets") # ไม่ cache engine ที่ใช้ไม่ได้
+    discovery_doc = load_drive_discovery_doc()
+    def _new_client():
+        from googleapiclient.discovery import build_from_document
+        return {'drive': build_from_document(discovery_doc, credentials=creds), 'sheet': gspread.authorize(creds).open_by_key(SHEET_ID)}
+    return google_io.GoogleIO(_new_client, pool_size=GOOGLE_IO_POOL_SIZE, timeout=GOOGLE_IO_TIMEOUT)
+
+# --- PHOTO STORAGE (Drive / ดิสก์ / S3 เลือกได้ โครง Folder เดียวกัน, mirror ขึ้น Drive ได้) ---
+@st.cache_resource(show_spinner=False)
+def get_photo_storage():
+    # URL จาก env AMAZE_PHOTO_STORAGE หรือ [storage] url ใน Secrets, ไม่ตั้ง = Google Drive (แบบเดิม)
+    try: conf = dict(st.secrets["storage"])
+    except Exception: conf = {}
+    url = os.environ.get("AMAZE_PHOTO_STORAGE") or conf.get("url") or "drive"
+    mirror = os.environ.get("AMAZE_PHOTO_MIRROR_DRIVE") == "1" or bool(conf.get("mirror_to_drive"))
+    drive_factory = lambda: photo_storage.DriveStorage(get_google_io(), MAIN_FOLDER_ID, cached_lookup, shared_cache_get, shared_cache_set, FOLDER_CACHE_TTL)
+    return photo_storage.open_storage(url, drive_factory, mirror, PHOTO_MIRROR_JOURNAL, conf.get("access_key"), conf.get("secret_key"))
+
+def upload_photos(photos, folder_id):
+    # photos: {key: (bytes, ชื่อไฟล์)} อัปพร้อมกัน -> ({key: file id} ของรูปที่สำเร็จ, error แรกถ้ามี)
+    return get_photo_storage().upload_many(photos, folder_id)
+
+# --- SHARED CACHE (ใช้ร่วมกันทุก replica: catalog, user, folder id, order -> folder) ---
+@st.cache_resource(show_spinner=False)
+def get_shared_cache():
+    # URL จาก env AMAZE_CACHE_URL หรือ [cache] url ใน Secrets, ไม่ตั้ง = ไฟล์ SQLite ในเครื่อง
+    url = os.environ.get("AMAZE_CACHE_URL")
+    if not url:
+        try: url = st.secrets["cache"]["url"]
+        except Exception: url = None
+    return shared_cache.open_cache(url, prefix=f"amaze:{SHEET_ID}")
+
+def cached_lookup(key, loader, ttl, cache_if=None):
+    # ถ้า shared cache ใช้ไม่ได้ ให้ทำงานต่อแบบไม่มี cache (แต่ error จาก loader เองให้โยนต่อตามปกติ)
+    called = []
+    def _load(): called.append(True); return loader()
+    try: return get_shared_cache().get_or_refresh(key, _load, ttl=ttl, cache_if=cache_if)
     except Exception as e:
-        st.error(f"Error Drive: {e}")
-        return None
+        if called: raise
+        print(f"⚠️ Shared cache ใช้ไม่ได้: {e}"); return loader()
+
+def shared_cache_get(key):
+    try: return get_shared_cache().get(key)
+    except Exception as e: print(f"⚠️ Shared cache ใช้ไม่ได้: {e}"); return None
+
+def shared_cache_set(key, value, ttl=None):
+    try: get_shared_cache().set(key, value, ttl)
+    except Exception as e: print(f"⚠️ Shared cache ใช้ไม่ได้: {e}")
+
+def get_cache_generation(namespace):
+    try: return get_shared_cache().generation(namespace)
+    except Exception: return 0
+
+def invalidate_shared_cache(namespace):
+    # replica อื่นเห็น generation ใหม่ในการเรียกครั้งถัดไปแล้วโหลดใหม่ (ครั้งเดียวรวมทุก replica)
+    try: get_shared_cache().invalidate(namespace)
+    except Exception as e: st.warning(f"⚠️ Shared cache ใช้ไม่ได้: {e}")
+    st.cache_data.clear()
 
 # --- GOOGLE SERVICES ---
-@st.cache_data(ttl=600)
-def load_sheet_data(sheet_name=0): 
+def load_sheet_data(sheet_name=0):
+    return _load_sheet_data_cached(sheet_name, get_cache_generation("sheets"))
+
+def load_sheet_rows(sheet_name):
+    # แถวดิบ (list) ไม่ผ่าน pandas: หน้า Login ไม่ต้องโหลด pandas
+    return _load_sheet_rows_cached(sheet_name, get_cache_generation("sheets"))
+
+@st.cache_data(ttl=SHEET_CACHE_TTL, show_spinner=False)
+def _load_sheet_rows_cached(sheet_name, generation):
+    return cached_lookup(f"rows:{generation}:{sheet_name}", lambda: download_sheet_rows(sheet_name), SHEET_CACHE_TTL, cache_if=lambda rows: len(rows) > 1)
+
+@st.cache_data(ttl=SHEET_CACHE_TTL, show_spinner=False)
+def _load_sheet_data_cached(sheet_name, generation):
+    # N replica ดาวน์โหลด Sheet ครั้งเดียว: replica แรกโหลด, ที่เหลือรอผลจาก shared cache
+    df = cached_lookup(f"sheet:{generation}:{sheet_name}", lambda: download_sheet_data(sheet_name), SHEET_CACHE_TTL, cache_if=lambda df: not df.empty)
+    if sheet_name == 0 and not df.empty: refresh_catalog_search(df) # รันเฉพาะตอน cache miss = catalog โหลดใหม่
+    return df
+
+def download_sheet_rows(sheet_name=0): 
     try:
-        creds = get_credentials()
-        if not creds: return pd.DataFrame()
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(SHEET_ID)
-        if isinstance(sheet_name, int): worksheet = sh.get_worksheet(sheet_name)
-        else: worksheet = sh.worksheet(sheet_name)
-        rows = worksheet.get_all_values()
-        if len(rows) > 1:
-            headers = rows[0]; data = rows[1:]
-            df = pd.DataFrame(data, columns=headers)
-            df.columns = df.columns.str.strip()
-            for col in df.columns:
-                if 'barcode' in col.lower() or 'id' in col.lower(): 
-                    df[col] = df[col].astype(str).str.replace(r'\.0$', '', regex=True)
-            if 'Barcode' not in df.columns:
-                for col in df.columns:
-                    if col.lower() == 'barcode':
-                        df.rename(columns={col: 'Barcode'}, inplace=True); break
-            return df
-        return pd.DataFrame()
+        gio = get_google_io()
+        return gio.run(gio.get_all_values(sheet_name))
     except Exception as e:
-        return pd.DataFrame()
+        return []
+
+def download_sheet_data(sheet_name=0): return sheet_data.values_to_frame(download_sheet_rows(sheet_name))
+
+# --- CATALOG SEARCH (index ค้นหา Barcode / ชื่อสินค้า ใช้ร่วมทั้ง process) ---
+@st.cache_resource(show_spinner=False)
+def get_catalog_search():
+    return {'lock': threading.Lock(), 'index': catalog_search.CatalogIndex()}
+
+def catalog_search_rows(df_items):
+    # (barcode, ชื่อสินค้า, Zone-Location) แบบเดียวกับ _find_product
+    if 'Barcode' not in df_items.columns: return []
+    col = lambda c: df_items[c].astype(str).str.strip() if c in df_items.columns else ""
+    names = df_items.iloc[:, 3].astype(str) + " " + df_items.iloc[:, 5].astype(str) if len(df_items.columns) > 5 else ["Error Name"] * len(df_items)
+    locations = (col('Zone') + "-" + col('Location')) if 'Zone' in df_items.columns or 'Location' in df_items.columns else ["-"] * len(df_items)
+    return list(zip(df_items['Barcode'], names, locations))
+
+def refresh_catalog_search(df_items):
+    # อัปเดต index ใน background (แก้เฉพาะแถวที่เปลี่ยน), ระหว่างนั้นค้นจาก index เดิม
+    rows = catalog_search_rows(df_items); holder = get_catalog_search()
+    def _run():
+        with holder['lock']: holder['index'] = holder['index'].apply(rows)
+    threading.Thread(target=_run, daemon=True).start()
+
+def suggest_products(query, limit=5): return get_catalog_search()['index'].search(query, limit)
+
+# --- STOCK RESERVATION (จองสต็อกตอนเพิ่มลงตะกร้า ใช้ร่วมทั้ง process, reconcile กับ Sheet catalog เป็นรอบ) ---
+def _read_catalog_stock():
+    # snapshot catalog ใน shared cache ชุดเดียวกับที่ค้นสินค้า (ไม่ดึงทั้ง Sheet ทุกรอบ)
+    df = load_sheet_data(0)
+    if df.empty: raise RuntimeError("โหลด catalog ไม่ได้") # ไม่ใช่ "ไม่มีคอลัมน์สต็อก": ห้ามทิ้งยอดที่ค้างอยู่
+    return stock_ledger.parse_catalog_frame(df, STOCK_COLUMN)
+
+def _read_catalog_cells(cells):
+    gio = get_google_io(); return gio.run(gio.get_cells(0, cells))
+
+def _write_catalog_stock(cells):
+    gio = get_google_io(); gio.run(gio.update_cells(0, cells))
+
+@st.cache_resource(show_spinner=False)
+def get_stock_ledger(): return stock_ledger.StockLedger()
+
+@st.cache_resource(show_spinner=False)
+def get_stock_reconciler():
+    # เริ่มครั้งแรกหลังมีคน login (หน้า login ไม่เริ่ม thread / ไม่โหลด catalog), lease ใน shared cache = เขียน Sheet ทีละ replica
+    if not STOCK_COLUMN: return None
+    try: cache = get_shared_cache()
+    except Exception as e: print(f"⚠️ Shared cache ใช้ไม่ได้: {e}"); cache = None
+    return stock_ledger.StockReconciler(get_stock_ledger(), _read_catalog_stock, _read_catalog_cells, _write_catalog_stock, cache,
+                                        STOCK_RECONCILE_INTERVAL, STOCK_HOLD_TTL, 2 * SHEET_CACHE_TTL).start()
+
+def cart_frame(items):
+    # ตารางตะกร้าที่แสดง (ไม่รวม field ภายในอย่าง Location เป้าหมายที่ใช้จองสต็อก)
+    return pd.DataFrame([{k: v for k, v in item.items() if not k.startswith("_")} for item in items])
+
+def get_stock_holder():
+    # ของที่จองผูกกับ session (ปิดแท็บ / refresh = session ใหม่: ของเดิมถูกปล่อยเมื่อเงียบครบ STOCK_HOLD_TTL)
+    ctx = get_script_run_ctx(); return ctx.session_id if ctx else "-"
 
 # --- TIME HELPER ---
 def get_thai_time(): return (datetime.utcnow() + timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S")
 def get_thai_date_str(): return (datetime.utcnow() + timedelta(hours=7)).strftime("%d-%m-%Y")
 def get_thai_time_suffix(): return (datetime.utcnow() + timedelta(hours=7)).strftime("%H-%M")
 def get_thai_ts_filename(): return (datetime.utcnow() + timedelta(hours=7)).strftime("%Y%m%d_%H%M%S")
-
-def save_log_to_sheet(picker_name, order_id, barcode, prod_name, location, pick_qty, user_col, file_id):
+def get_thai_month_key(): return (datetime.utcnow() + timedelta(hours=7)).strftime("%Y_%m")
+
+# --- LOG ROTATION (แยก Sheet Log รายเดือน เช่น Logs_2026_10) ---
+def get_log_shard_name(base_name, month_key=None): return f"{base_name}_{month_key or get_thai_month_key()}"
+def get_log_archive_path(shard_name): return os.path.join(LOG_ARCHIVE_DIR, f"{shard_name}.parquet")
+
+def archive_closed_log_shards(base_name):
+    # เก็บ Log ของเดือนที่ปิดไปแล้วลงไฟล์ Parquet (columnar + บีบอัด) ในเครื่อง
+    gio = get_google_io(); current_shard = get_log_shard_name(base_name); archived = []
+    for title in gio.run(gio.worksheet_titles()):
+        if not re.fullmatch(rf"{re.escape(base_name)}_\d{{4}}_\d{{2}}", title) or title >= current_shard: continue
+        path = get_log_archive_path(title)
+        if os.path.exists(path) or get_log_store().pending(title): continue # ยังมีแถวรอขึ้น Sheet: archive รอบหน้า
+        rows = gio.run(gio.get_all_values(title))
+        if len(rows) < 2: continue
+        os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+        df = pd.DataFrame(rows[1:], columns=rows[0])
+        df.to_parquet(path + ".tmp", index=False, compression="zstd"); os.replace(path + ".tmp", path)
+        archived.append(title)
+    return archived
+
+def _archive_closed_log_shards_worker():
+    for base_name in (LOG_SHEET_NAME, RIDER_SHEET_NAME):
+        try: archived = archive_closed_log_shards(base_name)
+        except Exception as e: print(f"⚠️ Archive {base_name} ไม่สำเร็จ: {e}"); continue
+        if archived: print(f"📦 Archive Log: {', '.join(archived)}")
+
+@st.cache_resource(show_spinner=False)
+def start_log_archive(month_key):
+    # รันครั้งเดียวต่อเดือนต่อ process ใน background เพื่อไม่ให้ picker ต้องรอ
+    thread = threading.Thread(target=_archive_closed_log_shards_worker, daemon=True); thread.start()
+    return thread
+
+def query_log_shards(base_name, start_date, end_date=None):
+    # อ่าน Log ข้ามหลายเดือน: เดือนที่ archive แล้วอ่านจากไฟล์, ที่เหลืออ่านจาก Sheet ของเดือนนั้น
+    end_date = end_date or (datetime.utcnow() + timedelta(hours=7))
+    year, month = start_date.year, start_date.month; frames = []; gio = get_google_io()
+    while (year, month) <= (end_date.year, end_date.month):
+        shard_name = get_log_shard_name(base_name, f"{year:04d}_{month:02d}"); path = get_log_archive_path(shard_name)
+        if os.path.exists(path): frames.append(pd.read_parquet(path))
+        else:
+            try: rows = gio.run(gio.get_all_values(shard_name))
+            except gspread.WorksheetNotFound: rows = []
+            if len(rows) > 1: frames.append(pd.DataFrame(rows[1:], columns=rows[0]))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# --- LOG ANALYTICS (cache แบบ columnar ต่อ shard อยู่ใน log_analytics.py, อ่านเฉพาะแถวที่เพิ่มมาใหม่) ---
+def _read_log_shard_rows(shard_name, headers, start_row):
+    # อ่านเฉพาะแถวหลัง cursor: เดือนปัจจุบันสร้าง Sheet ให้ถ้ายังไม่มี, เดือนอื่นอ่านเฉพาะถ้ามี Sheet อยู่แล้ว
+    gio = get_google_io(); a1_range = f"A{start_row}:{chr(ord('A') + len(headers) - 1)}"
+    try: return gio.run(gio.get_values(shard_name, a1_range, headers if shard_name.endswith(get_thai_month_key()) else None))
+    except gspread.WorksheetNotFound: return []
+
+@st.cache_resource(show_spinner=False)
+def get_log_analytics():
+    # เดือนที่ผ่านไปแล้วปิด (ไม่อ่านซ้ำ) เมื่อ archive แล้ว หรือไม่มีแถวค้างใน Log Store
+    return log_analytics.LogAnalytics(_read_log_shard_rows, get_log_archive_path, get_thai_month_key, pending=lambda shard: get_log_store().pending(shard))
+
+def load_log_analytics(base_name, headers, start_date, end_date): return get_log_analytics().load(base_name, headers, start_date, end_date)
+
+# --- LOG STORE (SQLite WAL ในเครื่องเป็น Log หลัก, replicator ทยอยส่งขึ้น Sheet รายเดือนใน background) ---
+@st.cache_resource(show_spinner=False)
+def get_log_store():
+    return log_store.LogStore(LOG_STORE_PATH, {LOG_SHEET_NAME: LOG_HEADERS, RIDER_SHEET_NAME: RIDER_HEADERS})
+
+def _push_log_rows(shard_name, headers, rows):
+    gio = get_google_io(); gio.run(gio.append_rows(shard_name, headers, rows))
+
+@st.cache_resource(show_spinner=False)
+def start_log_replicator():
+    # 1 ตัวต่อ process: ส่งแถวที่ค้าง (รวมที่ค้างจากก่อน restart) ทุก LOG_REPLICATE_INTERVAL วินาที หรือทันทีที่มีแถวใหม่
+    return log_store.LogReplicator(get_log_store(), _push_log_rows, LOG_REPLICATE_INTERVAL).start()
+
+def commit_logs(base_name, rows, keys):
+    # commit ลงไฟล์ในเครื่อง (ไม่กี่ ms) แล้วปลุก replicator; Sheets ล่มก็ไม่เสียแถว
+    get_log_store().append_many(base_name, get_log_shard_name(base_name), rows, keys)
+    start_log_replicator().notify(); start_log_archive(get_thai_month_key())
+
+def save_pack_logs(picker_name, order_id, items, user_col, file_id, entry_key):
+    # ทุกรายการของ Order commit ใน transaction เดียว, key ต่อแถวกันบันทึกซ้ำเมื่อกดยืนยันอีกครั้ง
     try:
-        creds = get_credentials(); gc = gspread.authorize(creds); sh = gc.open_by_key(SHEET_ID)
-        try: worksheet = sh.worksheet(LOG_SHEET_NAME)
-        except: worksheet = sh.add_worksheet(title=LOG_SHEET_NAME, rows="1000", cols="20"); worksheet.append_row(["Timestamp", "Picker Name", "Order ID", "Barcode", "Product Name", "Location", "Pick Qty", "User", "Image Link (Col I)"])
-        timestamp = get_thai_time(); image_link = f"https://drive.google.com/open?id={file_id}"
-        worksheet.append_row([timestamp, picker_name, order_id, barcode, prod_name, location, pick_qty, user_col, image_link])
-    except Exception as e: st.warning(f"⚠️ บันทึก Log ไม่สำเร็จ: {e}")
-
-def save_rider_log(picker_name, order_id, file_id, folder_name):
+        timestamp = get_thai_time(); image_link = get_photo_storage().link(file_id)
+        rows = [[timestamp, picker_name, order_id, item['Barcode'], item['Product Name'], item['Location'], item['Qty'], user_col, image_link] for item in items]
+        commit_logs(LOG_SHEET_NAME, rows, [f"{entry_key}:{n}" for n in range(len(rows))])
+        return True
+    except Exception as e: st.warning(f"⚠️ บันทึก Log ไม่สำเร็จ: {e}"); return False
+
+def save_rider_log(picker_name, order_id, file_id, folder_name, entry_key=None):
     try:
-        creds = get_credentials(); gc = gspread.authorize(creds); sh = gc.open_by_key(SHEET_ID)
-        try: worksheet = sh.worksheet(RIDER_SHEET_NAME)
-        except: worksheet = sh.add_worksheet(title=RIDER_SHEET_NAME, rows="1000", cols="10"); worksheet.append_row(["Timestamp", "User Name", "Order ID", "Folder Name", "Rider Image Link"])
-        timestamp = get_thai_time(); image_link = f"https://drive.google.com/open?id={file_id}"
-        worksheet.append_row([timestamp, picker_name, order_id, folder_name, image_link])
-    except Exception as e: st.warning(f"⚠️ บันทึก Rider Log ไม่สำเร็จ: {e}")
-
-# --- [MODIFIED] FOLDER STRUCTURE LOGIC ---
-def get_target_folder_structure(service, order_id, main_parent_id):
-    # คำนวณวันเวลาปัจจุบัน
-    now = datetime.utcnow() + timedelta(hours=7)
-    year_str = now.strftime("%Y")
-    month_str = now.strftime("%m")
-    date_str = now.strftime("%d-%m-%Y")
-
-    # Helper function: ค้นหาหรือสร้าง Folder
-    def _get_or_create(parent_id, name):
-        q = f"name = '{name}' and '{parent_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        res = service.files().list(q=q, fields="files(id)").execute()
-        files = res.get('files', [])
-        if files: return files[0]['id']
-        
-        # ถ้าไม่เจอให้สร้างใหม่
-        meta = {'name': name, 'parents': [parent_id], 'mimeType': 'application/vnd.google-apps.folder'}
-        folder = service.files().create(body=meta, fields='id').execute()
-        return folder.get('id')
-
-    # Step 1: จัดการ Folder ปี (YYYY)
-    year_id = _get_or_create(main_parent_id, year_str)
-    
-    # Step 2: จัดการ Folder เดือน (MM)
-    month_id = _get_or_create(year_id, month_str)
-    
-    # Step 3: จัดการ Folder วันที่ (DD-MM-YYYY)
-    date_id = _get_or_create(month_id, date_str)
-
-    # Step 4: สร้าง Folder Order (OrderNumber_HH-MM)
-    time_suffix = now.strftime("%H-%M")
-    order_folder_name = f"{order_id}_{time_suffix}"
-    meta_order = {'name': order_folder_name, 'parents': [date_id], 'mimeType': 'application/vnd.google-apps.folder'}
-    order_folder = service.files().create(body=meta_order, fields='id').execute()
-    
-    return order_folder.get('id')
-
-def find_existing_order_folder(service, order_id, main_parent_id):
-    # คำนวณวันเวลาปัจจุบันเพื่อหา Path
+        timestamp = get_thai_time(); image_link = get_photo_storage().link(file_id)
+        commit_logs(RIDER_SHEET_NAME, [[timestamp, picker_name, order_id, folder_name, image_link]], [entry_key])
+        return True
+    except Exception as e: st.warning(f"⚠️ บันทึก Rider Log ไม่สำเร็จ: {e}"); return False
+
+# --- IDEMPOTENT SUBMISSION (กันกดซ้ำ / rerun ระหว่าง Upload ไม่ให้สร้าง Folder และ Log ซ้ำ, ไฟล์รูปแบบเดียวกับ scanner API) ---
+@st.cache_resource(show_spinner=False)
+def get_submission_ledger():
+    return submission_ledger.SubmissionLedger(SUBMISSION_LEDGER_PATH, SUBMISSION_LEDGER_DAYS)
+
+def get_submission(key): return get_submission_ledger().get(key)
+
+def record_submission(key, **data): get_submission_ledger().record(key, **data)
+
+def get_photo_date_parts(now=None):
+    # โครง Folder วันที่: ปี (YYYY) / เดือน (MM) / วันที่ (DD-MM-YYYY)
+    now = now or datetime.utcnow() + timedelta(hours=7)
+    return [now.strftime("%Y"), now.strftime("%m"), now.strftime("%d-%m-%Y")]
+
+def get_target_folder_structure(order_id):
+    # Folder ปี/เดือน/วัน/Order สร้างใน photo storage ที่ตั้งไว้
     now = datetime.utcnow() + timedelta(hours=7)
-    year_str = now.strftime("%Y")
-    month_str = now.strftime("%m")
-    date_str = now.strftime("%d-%m-%Y")
-
-    # Helper function: ค้นหา Folder (คืนค่า None ถ้าไม่เจอ)
-    def _find_folder(parent_id, name):
-        q = f"name = '{name}' and '{parent_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        res = service.files().list(q=q, fields="files(id)").execute()
-        files = res.get('files', [])
-        return files[0]['id'] if files else None
-
-    # Step 1: หา Folder ปี (YYYY)
-    year_id = _find_folder(main_parent_id, year_str)
-    if not year_id: return None, "ไม่พบ Folder ปีปัจจุบัน"
-
-    # Step 2: หา Folder เดือน (MM)
-    month_id = _find_folder(year_id, month_str)
-    if not month_id: return None, "ไม่พบ Folder เดือนปัจจุบัน"
-
-    # Step 3: หา Folder วันที่ (DD-MM-YYYY)
-    date_id = _find_folder(month_id, date_str)
-    if not date_id: return None, "ไม่พบ Folder วันที่ของวันนี้ (ยังไม่มีการเปิดบิลวันนี้)"
-    
-    # Step 4: หา Folder Order ภายใต้ Folder วันที่
-    # 1. ค้นหาแบบกว้างๆ ก่อน
-    q_order = f"'{date_id}' in parents and name contains '{order_id}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    res_order = service.files().list(q=q_order, fields="files(id, name)", orderBy="createdTime desc").execute()
-    files_order = res_order.get('files', [])
-    
-    # 2. กรองให้ชัวร์ว่าขึ้นต้นด้วย OrderID_
-    target_prefix = f"{order_id}_" # เช่น "B01_"
-    
-    found_folder = None
-    for f in files_order:
-        if f['name'].startswith(target_prefix):
-            found_folder = f
-            break
-            
-    if found_folder:
-        return found_folder['id'], found_folder['name']
-    else:
-        return None, f"ไม่พบ Folder ของ Order: {order_id} ในวันนี้"
+    return get_photo_storage().create_order_folder(get_photo_date_parts(now), order_id, now.strftime("%H-%M"))[0]
+
+def find_existing_order_folder(order_id):
+    # Folder ล่าสุดของ Order ในวันนี้ -> (folder id, ชื่อ Folder) หรือ (None, ข้อความ error)
+    return get_photo_storage().find_order_folder(get_photo_date_parts(), order_id)
 # ---------------------------------------------
 
-def upload_photo(service, file_obj, filename, folder_id):
+def upload_photo(file_obj, filename, folder_id):
+    from googleapiclient.errors import HttpError
     try:
-        file_metadata = {'name': filename, 'parents': [folder_id]}
-        
-        if isinstance(file_obj, bytes): 
-            media_body = io.BytesIO(file_obj)
-        else: 
-            media_body = file_obj 
-            
-        media = MediaIoBaseUpload(media_body, mimetype='image/jpeg', chunksize=1024*1024, resumable=True)
-        
         # --- จุดที่แก้: เพิ่มการดักจับ Error เพื่อดูรายละเอียด ---
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        return file.get('id')
+        return get_photo_storage().upload(file_obj, filename, folder_id)
 
     except HttpError as error:
         # แปลง Error เป็นข้อความที่อ่านออก
@@ -245,12 +412,138 @@ def upload_photo(service, file_obj, filename, folder_id):
         print(f"❌ GENERAL ERROR: {e}")
         raise e
 
+# --- DRIVE MIRROR (index ในเครื่องของ Folder / รูปทั้งหมด ค้นหาย้อนหลังได้โดยไม่ต้อง list Drive) ---
+@st.cache_resource(show_spinner=False)
+def get_drive_mirror():
+    return drive_mirror.DriveMirror(DRIVE_MIRROR_PATH, MAIN_FOLDER_ID)
+
+def sync_drive_mirror_logs(mirror, legacy_titles):
+    # ชื่อพนักงานต่อ Order: แถวใหม่อ่านจาก Log Store ในเครื่องต่อจาก seq ที่อ่านแล้ว (ไม่ต้องถาม Sheets ทุกรอบ)
+    # เดือนที่ archive แล้ว (ไฟล์ Parquet) และเดือนเก่าที่มี Sheet อ่านทั้งเดือนครั้งเดียวแล้วปิด: รวมแถวก่อนมี Log Store
+    # (แถวที่ได้จาก tail ไปแล้วซ้ำได้ ตาราง pickers ไม่เก็บซ้ำ: key = order, วัน, พนักงาน, role)
+    store = get_log_store(); roles = {LOG_SHEET_NAME: "PACK", RIDER_SHEET_NAME: "RIDER"}
+    while True:
+        batch = store.tail(mirror.get_state("log_seq", 0))
+        if not batch: break
+        mirror.ingest_log_rows([(r[0], r[1], r[2], roles[base_name]) for seq, base_name, shard, r in batch if base_name in roles], "log_seq", batch[-1][0])
+    archived = {f[:-len(".parquet")] for f in os.listdir(LOG_ARCHIVE_DIR) if f.endswith(".parquet")} if os.path.isdir(LOG_ARCHIVE_DIR) else set()
+    for base_name, role in roles.items():
+        current_shard = get_log_shard_name(base_name)
+        for shard_name in sorted(t for t in archived | set(legacy_titles) if re.fullmatch(rf"{re.escape(base_name)}_\d{{4}}_\d{{2}}", t) and t < current_shard):
+            if mirror.get_state(f"log_closed:{shard_name}"): continue
+            if shard_name in archived: rows = pd.read_parquet(get_log_archive_path(shard_name)).values.tolist()
+            else: gio = get_google_io(); rows = gio.run(gio.get_all_values(shard_name))[1:] # อยู่ใน legacy_titles
+            mirror.ingest_log_rows([(r[0], r[1], r[2], role) for r in rows if len(r) > 2], f"log_closed:{shard_name}", True)
+
+def _drive_mirror_worker(mirror, creds, discovery_doc):
+    # Drive client ของ thread นี้เอง (httplib2 ใช้ข้าม thread ไม่ได้), error แล้วสร้างใหม่รอบถัดไป
+    from googleapiclient.discovery import build_from_document
+    service = None
+    while True:
+        try:
+            if service is None:
+                service = build_from_document(discovery_doc, credentials=creds) # รายชื่อ Sheet Log เดือนเก่า list ครั้งเดียวต่อ client
+                gio = get_google_io(); legacy_titles = set(gio.run(gio.worksheet_titles()))
+            applied = mirror.sync(service)
+            if applied: print(f"🗂️ Drive mirror: {applied} changes")
+            sync_drive_mirror_logs(mirror, legacy_titles)
+        except Exception as e: print(f"⚠️ Drive mirror sync ไม่สำเร็จ: {e}"); service = None
+        time.sleep(DRIVE_MIRROR_INTERVAL)
+
+@st.cache_resource(show_spinner=False)
+def start_drive_mirror():
+    # crawler 1 ตัวต่อ process: ครั้งแรกเดินทั้ง tree แล้วอ่าน changes feed ทุก DRIVE_MIRROR_INTERVAL วินาที
+    creds = get_credentials()
+    if not DRIVE_MIRROR_PATH or not creds: return None
+    thread = threading.Thread(target=_drive_mirror_worker, args=(get_drive_mirror(), creds, load_drive_discovery_doc()), daemon=True); thread.start()
+    return thread
+
+# --- SESSION MEMO (เรียก lookup ที่แพงเฉพาะตอนค่า input เปลี่ยน, ใช้ผลเดิมจนจบ flow) ---
+def memo_lookup(name, key, fn, *args):
+    memo = st.session_state.memo_cache
+    if name in memo and memo[name][0] == key:
+        st.session_state.memo_saved_calls += 1
+        return memo[name][1]
+    result = fn(*args)
+    memo[name] = (key, result)
+    return result
+
+def forget_memo(name): st.session_state.memo_cache.pop(name, None)
+
+def _decode_barcode(data):
+    from pyzbar.pyzbar import decode
+    res = decode(Image.open(io.BytesIO(data)))
+    return res[0].data.decode("utf-8") if res else None
+
+def scan_barcode(name, img_file):
+    # ถอดรหัสรูปจากกล้องครั้งเดียวต่อรูป (rerun ด้วยรูปเดิมไม่ต้อง decode ใหม่)
+    data = img_file.getvalue()
+    return memo_lookup(f"scan:{name}", hashlib.sha1(data).hexdigest(), _decode_barcode, data)
+
+def _find_login_user(user_rows, user_id):
+    if len(user_rows) < 2 or len(user_rows[0]) < 3: return None
+    row = sheet_data.find_row(user_rows, user_id)
+    if row is None: return {}
+    row = list(row) + [""] * (3 - len(row))
+    return {'id': str(user_id), 'pass': str(row[1]).strip(), 'name': row[2]}
+
+def _find_product(df_items, barcode):
+    match = df_items[df_items['Barcode'] == barcode]
+    if match.empty: return None
+    row = match.iloc[0]
+    try: brand = str(row.iloc[3]); variant = str(row.iloc[5]); full_name = f"{brand} {variant}"
+    except: full_name = "Error Name"
+    return full_name, f"{str(row.get('Zone','')).strip()}-{str(row.get('Location','')).strip()}"
+
+def _find_rider_folder(order_id):
+    with st.spinner(f"🔍 กำลังหา Folder ของ {order_id}..."):
+        try: return find_existing_order_folder(order_id)
+        except Exception as e: return None, f"เชื่อมต่อที่เก็บรูปไม่ได้: {e}"
+
+# --- SESSION PROFILER (admin เปิด sampling profiler ให้ทีละ session, เก็บ flame graph ทุก rerun ลงดิสก์) ---
+def get_admin_ids():
+    # รหัสพนักงานที่เป็น admin: env AMAZE_ADMIN_IDS (คั่นด้วย ,) หรือ [admin] user_ids ใน Secrets
+    ids = os.environ.get("AMAZE_ADMIN_IDS", "").split(",")
+    try: ids += [str(i) for i in st.secrets["admin"]["user_ids"]]
+    except Exception: pass
+    return {i.strip() for i in ids if i.strip()}
+
+def is_admin(): return bool(st.session_state.current_user_id) and str(st.session_state.current_user_id) in get_admin_ids()
+
+@st.cache_resource(show_spinner=False)
+def get_profiler_registry():
+    # session ที่ใช้งานอยู่ (ให้ admin เลือก) และ session ที่เปิด profiler ไว้ ใช้ร่วมทั้ง process
+    return {'lock': threading.Lock(), 'sessions': {}, 'targets': set(), 'store': session_profiler.ProfileStore(PROFILE_DIR)}
+
+def start_session_profile():
+    # เรียกต้น rerun: บันทึกว่า session นี้ยังใช้งานอยู่, ถ้า admin เปิด profiler ไว้ให้ sample rerun นี้จนจบ (session อื่นไม่ถูก sample)
+    st.session_state.profiler = None
+    try: session_id = get_script_run_ctx().session_id
+    except Exception: return
+    reg = get_profiler_registry(); now = time.time()
+    with reg['lock']:
+        if len(reg['sessions']) > 500:
+            for sid in [k for k, s in reg['sessions'].items() if now - s['seen'] > PROFILER_SESSION_IDLE]: reg['sessions'].pop(sid); reg['targets'].discard(sid)
+        entry = reg['sessions'].setdefault(session_id, {'step': "-"})
+        entry.update(user=st.session_state.current_user_name or "-", seen=now)
+    st.session_state.profile_session_id = session_id; st.session_state.profile_entry = entry
+    if session_id in reg['targets']:
+        meta = {'session': session_id, 'user': entry['user'], 'app': os.path.basename(__file__), 'time': get_thai_time()}
+        st.session_state.profiler = session_profiler.SamplingProfiler(sys._getframe(1), meta, on_finish=reg['store'].save).start()
+
+def set_profile_step(step):
+    # tag ขั้นตอนของ rerun นี้ (login / scan / pack-confirm / rider-upload ...) ตัวสุดท้ายที่ตั้งชนะ
+    entry = st.session_state.get('profile_entry')
+    if entry is not None: entry['step'] = step
+    if st.session_state.get('profiler') is not None: st.session_state.profiler.step = step
+
 # --- SAFE RESET SYSTEM ---
 def trigger_reset():
     st.session_state.need_reset = True
 
 def check_and_execute_reset():
     if st.session_state.get('need_reset'):
+        get_stock_ledger().release(get_stock_holder()) # ของที่จองไว้แต่ไม่ได้ส่ง คืนให้คนอื่นเบิก
         # Reset Widgets
         if 'pack_order_man' in st.session_state: st.session_state.pack_order_man = ""
         if 'rider_ord_man' in st.session_state: st.session_state.rider_ord_man = ""
@@ -268,6 +561,8 @@ def check_and_execute_reset():
         # --- NEW: Clear Target Folder State to avoid stale data ---
         st.session_state.target_rider_folder_id = None
         st.session_state.target_rider_folder_name = ""
+        st.session_state.submit_key = ""
+        st.session_state.memo_cache = {}
         
         # Reset Helpers
         st.session_state.prod_val = ""
@@ -291,7 +586,8 @@ def init_session_state():
     if 'need_reset' not in st.session_state: st.session_state.need_reset = False
     keys = ['current_user_name', 'current_user_id', 'order_val', 'prod_val', 'loc_val', 'prod_display_name', 
             'photo_gallery', 'cam_counter', 'pick_qty', 'rider_photo', 'current_order_items', 'picking_phase', 'temp_login_user',
-            'target_rider_folder_id', 'target_rider_folder_name'] # Added target folder vars
+            'target_rider_folder_id', 'target_rider_folder_name', # Added target folder vars
+            'submit_key', 'memo_cache', 'memo_saved_calls']
     for k in keys:
         if k not in st.session_state:
             if k == 'pick_qty': st.session_state[k] = 1
@@ -299,15 +595,19 @@ def init_session_state():
             elif k == 'photo_gallery': st.session_state[k] = []
             elif k == 'current_order_items': st.session_state[k] = []
             elif k == 'picking_phase': st.session_state[k] = 'scan'
+            elif k == 'memo_cache': st.session_state[k] = {}
+            elif k == 'memo_saved_calls': st.session_state[k] = 0
             else: st.session_state[k] = None if k in ['temp_login_user', 'target_rider_folder_id'] else ""
 
 init_session_state()
+start_session_profile()
 check_and_execute_reset()
 
 # --- LOGIN ---
 if not st.session_state.current_user_name:
     st.title("🔐 Login พนักงาน")
-    df_users = load_sheet_data(USER_SHEET_NAME)
+    set_profile_step("login")
+    user_rows = load_sheet_rows(USER_SHEET_NAME)
 
     if st.session_state.temp_login_user is None:
         st.info("กรุณาสแกนรหัสพนักงาน")
@@ -319,17 +619,15 @@ if not st.session_state.current_user_name:
         user_input_val = None
         if manual_user: user_input_val = manual_user
         elif scan_user:
-            res_u = decode(Image.open(scan_user))
-            if res_u: user_input_val = res_u[0].data.decode("utf-8")
+            user_input_val = scan_barcode("user", scan_user)
         
         if user_input_val:
-            if not df_users.empty and len(df_users.columns) >= 3:
-                match = df_users[df_users.iloc[:, 0].astype(str) == str(user_input_val)]
-                if not match.empty:
-                    st.session_state.temp_login_user = {'id': str(user_input_val), 'pass': str(match.iloc[0, 1]).strip(), 'name': match.iloc[0, 2]}
-                    st.rerun()
-                else: st.error(f"❌ ไม่พบรหัสพนักงาน: {user_input_val}")
-            else: st.warning("⚠️ โหลดข้อมูลพนักงานไม่ได้")
+            login_user = memo_lookup("login_user", str(user_input_val), _find_login_user, user_rows, user_input_val)
+            if login_user is None: forget_memo("login_user"); st.warning("⚠️ โหลดข้อมูลพนักงานไม่ได้")
+            elif login_user:
+                st.session_state.temp_login_user = login_user
+                st.rerun()
+            else: st.error(f"❌ ไม่พบรหัสพนักงาน: {user_input_val}")
     else:
         user_info = st.session_state.temp_login_user
         st.info(f"👤 พนักงาน: **{user_info['name']}** ({user_info['id']})")
@@ -349,11 +647,15 @@ if not st.session_state.current_user_name:
                 st.session_state.temp_login_user = None; st.rerun()
 else:
     # --- LOGGED IN ---
+    get_stock_reconciler(); get_stock_ledger().touch(get_stock_holder())
     with st.sidebar:
         st.write(f"👤 **{st.session_state.current_user_name}**")
-        mode = st.radio("เลือกโหมดทำงาน:", ["📦 แผนกแพ็คสินค้า", "🏍️ ส่งงาน Rider"])
+        mode = st.radio("เลือกโหมดทำงาน:", ["📦 แผนกแพ็คสินค้า", "🏍️ ส่งงาน Rider", "📊 Dashboard", "🔎 ค้นหารูปย้อนหลัง"] + (["🩺 Profiler"] if is_admin() else []))
         st.divider()
         if st.button("Logout", type="secondary"): logout_user()
+        if st.button("🔄 โหลดข้อมูลสินค้า/พนักงานใหม่", type="secondary"): invalidate_shared_cache("sheets"); st.rerun()
+        if st.session_state.memo_saved_calls: st.caption(f"⚡ ลดการค้นหาซ้ำได้ {st.session_state.memo_saved_calls} ครั้ง")
+    start_drive_mirror(); start_log_replicator()
 
     # ================= MODE 1: PACKING =================
     if mode == "📦 แผนกแพ็คสินค้า":
@@ -361,6 +663,7 @@ else:
         df_items = load_sheet_data(0)
 
         if st.session_state.picking_phase == 'scan':
+            set_profile_step("scan")
             st.markdown("#### 1. Order ID")
             if not st.session_state.order_val:
                 col1, col2 = st.columns([3, 1])
@@ -368,8 +671,8 @@ else:
                 if manual_order: st.session_state.order_val = manual_order; st.rerun()
                 scan_order = back_camera_input("แตะเพื่อสแกน Order", key=f"pack_cam_{st.session_state.cam_counter}")
                 if scan_order:
-                    res = decode(Image.open(scan_order))
-                    if res: st.session_state.order_val = res[0].data.decode("utf-8").upper(); st.rerun()
+                    res = scan_barcode("order", scan_order)
+                    if res: st.session_state.order_val = res.upper(); st.rerun()
             else:
                 c1, c2 = st.columns([3, 1])
                 with c1: st.success(f"📦 Order: **{st.session_state.order_val}**")
@@ -380,24 +683,26 @@ else:
                 st.markdown("---"); st.markdown("#### 2. เพิ่มรายการสินค้า (Scan & Add)")
                 if not st.session_state.prod_val:
                     col1, col2 = st.columns([3, 1])
-                    manual_prod = col1.text_input("พิมพ์ Barcode", key="pack_prod_man").strip()
+                    manual_prod = col1.text_input("พิมพ์ Barcode หรือชื่อสินค้า", key="pack_prod_man").strip()
                     if manual_prod: st.session_state.prod_val = manual_prod; st.rerun()
                     scan_prod = back_camera_input("แตะเพื่อสแกนสินค้า", key=f"prod_cam_{st.session_state.cam_counter}")
                     if scan_prod:
-                        res_p = decode(Image.open(scan_prod))
-                        if res_p: st.session_state.prod_val = res_p[0].data.decode("utf-8"); st.rerun()
+                        res_p = scan_barcode("prod", scan_prod)
+                        if res_p: st.session_state.prod_val = res_p; st.rerun()
                 else:
                     target_loc_str = None; prod_found = False
                     if not df_items.empty:
-                        match = df_items[df_items['Barcode'] == st.session_state.prod_val]
-                        if not match.empty:
-                            prod_found = True; row = match.iloc[0]
-                            try: brand = str(row.iloc[3]); variant = str(row.iloc[5]); full_name = f"{brand} {variant}"
-                            except: full_name = "Error Name"
+                        product = memo_lookup("product", st.session_state.prod_val, _find_product, df_items, st.session_state.prod_val)
+                        if product:
+                            prod_found = True; full_name, target_loc_str = product
                             st.session_state.prod_display_name = full_name
-                            target_loc_str = f"{str(row.get('Zone','')).strip()}-{str(row.get('Location','')).strip()}"
                             st.success(f"✅ **{full_name}**"); st.warning(f"📍 เป้าหมาย: **{target_loc_str}**")
-                        else: st.error("❌ ไม่พบ Barcode")
+                        else:
+                            st.error("❌ ไม่พบ Barcode")
+                            # พิมพ์ผิด / พิมพ์ชื่อสินค้า: กดเลือกตัวที่ใกล้เคียงแทนการเริ่มใหม่
+                            for sug in suggest_products(st.session_state.prod_val):
+                                if st.button(f"🔎 {sug['barcode']} · {sug['name']} ({sug['location']})", key=f"suggest_{sug['barcode']}", use_container_width=True):
+                                    st.session_state.prod_val = sug['barcode']; st.rerun()
                     else: st.warning("⚠️ Loading Data...")
                     
                     if st.button("❌ สแกนใหม่"): 
@@ -410,20 +715,25 @@ else:
                             if man_loc: st.session_state.loc_val = man_loc; st.rerun()
                             scan_loc = back_camera_input("แตะเพื่อสแกน Location", key=f"loc_cam_{st.session_state.cam_counter}")
                             if scan_loc:
-                                res_l = decode(Image.open(scan_loc))
-                                if res_l: st.session_state.loc_val = res_l[0].data.decode("utf-8").upper(); st.rerun()
+                                res_l = scan_barcode("loc", scan_loc)
+                                if res_l: st.session_state.loc_val = res_l.upper(); st.rerun()
                         else:
                             if st.session_state.loc_val == target_loc_str or st.session_state.loc_val in target_loc_str:
                                 st.success(f"✅ ถูกต้อง: {st.session_state.loc_val}")
                                 st.markdown("##### ระบุจำนวน")
+                                stock_key = (st.session_state.prod_val, target_loc_str); available = get_stock_ledger().available(stock_key)
+                                if available is not None: st.caption(f"📦 คงเหลือให้เบิก: {available} ชิ้น (หักที่คนอื่นจองไว้แล้ว)")
                                 st.session_state.pick_qty = st.number_input("จำนวน (Qty)", min_value=1, value=1)
                                 st.markdown("---")
                                 if st.button("➕ เพิ่มลงตะกร้า", type="primary", use_container_width=True):
-                                    new_item = {"Barcode": st.session_state.prod_val, "Product Name": st.session_state.prod_display_name, "Location": st.session_state.loc_val, "Qty": st.session_state.pick_qty}
-                                    st.session_state.current_order_items.append(new_item)
-                                    st.toast(f"เพิ่ม {st.session_state.prod_display_name} แล้ว!", icon="🛒")
-                                    st.session_state.prod_val = ""; st.session_state.loc_val = ""; st.session_state.pick_qty = 1; st.session_state.cam_counter += 1
-                                    st.rerun()
+                                    reserved, left = get_stock_ledger().reserve(get_stock_holder(), stock_key, st.session_state.pick_qty)
+                                    if not reserved: st.error(f"❌ สต็อกไม่พอ: เหลือให้เบิก {left} ชิ้น")
+                                    else:
+                                        new_item = {"Barcode": st.session_state.prod_val, "Product Name": st.session_state.prod_display_name, "Location": st.session_state.loc_val, "Qty": st.session_state.pick_qty, stock_ledger.TARGET_FIELD: target_loc_str}
+                                        st.session_state.current_order_items.append(new_item)
+                                        st.toast(f"เพิ่ม {st.session_state.prod_display_name} แล้ว!", icon="🛒")
+                                        st.session_state.prod_val = ""; st.session_state.loc_val = ""; st.session_state.pick_qty = 1; st.session_state.cam_counter += 1
+                                        st.rerun()
                             else:
                                 st.error(f"❌ ผิดตำแหน่ง ({st.session_state.loc_val})")
                                 if st.button("แก้ Location"): st.session_state.loc_val = ""; st.rerun()
@@ -431,14 +741,15 @@ else:
                 if st.session_state.current_order_items:
                     st.markdown("---")
                     st.markdown(f"### 🛒 ตะกร้าสินค้า ({len(st.session_state.current_order_items)} รายการ)")
-                    st.dataframe(pd.DataFrame(st.session_state.current_order_items), use_container_width=True)
+                    st.dataframe(cart_frame(st.session_state.current_order_items), use_container_width=True)
                     if st.button("✅ ยืนยันรายการครบแล้ว (ไปถ่ายรูป)", type="primary", use_container_width=True):
                         st.session_state.picking_phase = 'pack'; st.rerun()
 
         elif st.session_state.picking_phase == 'pack':
+            set_profile_step("pack")
             st.success(f"📦 Order: **{st.session_state.order_val}** (ยืนยันแล้ว)")
             st.info("รายการสินค้าที่จะแพ็ค:")
-            st.dataframe(pd.DataFrame(st.session_state.current_order_items), use_container_width=True)
+            st.dataframe(cart_frame(st.session_state.current_order_items), use_container_width=True)
             st.markdown("#### 3. ถ่ายรูปปิดกล่อง (รวมทุกชิ้น)")
             
             if st.session_state.photo_gallery:
@@ -463,44 +774,50 @@ else:
             with col_b2:
                 if len(st.session_state.photo_gallery) > 0:
                     if st.button("☁️ ยืนยัน Upload ทั้งหมด", type="primary", use_container_width=True):
+                        set_profile_step("pack-confirm")
                         with st.spinner("กำลังบันทึกข้อมูล..."):
-                            srv = authenticate_drive()
-                            if srv:
-                                fid = get_target_folder_structure(srv, st.session_state.order_val, MAIN_FOLDER_ID)
-                                ts = get_thai_ts_filename()
-                                
-                                # 1. หาจำนวนรูปทั้งหมดก่อน
-                                total_imgs = len(st.session_state.photo_gallery)
-                                final_image_link_id = "" # เตรียมตัวแปรไว้เก็บ ID รูปสุดท้าย
-
-                                for i, b in enumerate(st.session_state.photo_gallery):
-                                    # i เริ่มที่ 0, 1, 2...
-                                    current_seq = i + 1 
-                                    
-                                    # ตั้งชื่อไฟล์ให้มีลำดับชัดเจน Img1, Img2, ...
-                                    fn = f"{st.session_state.order_val}_PACKED_{ts}_Img{current_seq}.jpg"
-                                    uid = upload_photo(srv, b, fn, fid)
-                                    
-                                    # 2. เช็คเงื่อนไข: "ถ้านี่คือรอบสุดท้าย ให้จำ ID นี้ไว้"
-                                    if current_seq == total_imgs:
-                                        final_image_link_id = uid
-                                
-                                # 3. บันทึกลง Sheet (ใช้ ID ที่เราดักจับไว้)
-                                # ถ้าไม่มีรูปเลย (กัน Error) ให้ใส่ขีด -
-                                if not final_image_link_id: final_image_link_id = "-"
-
-                                for item in st.session_state.current_order_items:
-                                    save_log_to_sheet(
-                                        st.session_state.current_user_name, 
-                                        st.session_state.order_val, 
-                                        item['Barcode'], 
-                                        item['Product Name'], 
-                                        item['Location'], 
-                                        item['Qty'], 
-                                        st.session_state.current_user_id, 
-                                        final_image_link_id  # <--- ส่ง Link รูปสุดท้ายไปบันทึก
-                                    )
-                                    
+                            # Idempotency key ของการส่งครั้งนี้ (กดซ้ำ/rerun ด้วยข้อมูลเดิม = key เดิม)
+                            st.session_state.submit_key = submission_ledger.make_submission_key(
+                                "PACK",
+                                st.session_state.current_user_id,
+                                st.session_state.order_val,
+                                st.session_state.current_order_items,
+                                *st.session_state.photo_gallery
+                            )
+                            sub = get_submission(st.session_state.submit_key)
+                            if sub.get('done'):
+                                # ส่งไปแล้ว: คืนผลเดิมโดยไม่เรียก Drive/Sheets ซ้ำ
+                                st.success("✅ บันทึกครบทุกรายการเรียบร้อย! (ส่งไปแล้วก่อนหน้านี้)")
+                                time.sleep(1.5)
+                                trigger_reset()
+                                st.rerun()
+
+                            # ทำต่อจากจุดที่ค้างไว้ (ถ้ามี): ใช้ Folder / ไฟล์ / Log ที่ส่งสำเร็จแล้วซ้ำ
+                            fid = sub.get('folder_id') or get_target_folder_structure(st.session_state.order_val)
+                            ts = sub.get('ts') or get_thai_ts_filename()
+                            record_submission(st.session_state.submit_key, folder_id=fid, ts=ts)
+                            
+                            # 1. หาจำนวนรูปทั้งหมดก่อน
+                            total_imgs = len(st.session_state.photo_gallery)
+                            uploads = sub.get('uploads', {}) # index รูป -> file id ที่อัปสำเร็จแล้ว
+
+                            # อัปทุกรูปที่ยังไม่ได้อัป (ข้ามที่อัปไปแล้วในรอบก่อน) พร้อมกัน
+                            # ตั้งชื่อไฟล์ให้มีลำดับชัดเจน Img1, Img2, ... (i เริ่มที่ 0)
+                            pending = {str(i): (b, f"{st.session_state.order_val}_PACKED_{ts}_Img{i + 1}.jpg") for i, b in enumerate(st.session_state.photo_gallery) if str(i) not in uploads}
+                            done, upload_error = upload_photos(pending, fid)
+                            uploads.update(done); record_submission(st.session_state.submit_key, uploads=uploads)
+                            if upload_error: raise upload_error # รูปที่อัปสำเร็จบันทึกไว้แล้ว กดยืนยันอีกครั้งจะอัปเฉพาะที่เหลือ
+                            
+                            # 2. ใช้ ID ของรูปสุดท้าย
+                            # 3. บันทึกลง Sheet (ใช้ ID ที่เราดักจับไว้)
+                            # ถ้าไม่มีรูปเลย (กัน Error) ให้ใส่ขีด -
+                            final_image_link_id = uploads.get(str(total_imgs - 1)) or "-"
+
+                            # logged: แถวที่ขึ้น Sheet ไปแล้วจากการส่งค้างก่อนมี Log store
+                            if save_pack_logs(st.session_state.current_user_name, st.session_state.order_val, st.session_state.current_order_items[sub.get('logged', 0):],
+                                              st.session_state.current_user_id, final_image_link_id, st.session_state.submit_key): # <--- ส่ง Link รูปสุดท้ายไปบันทึก
+                                record_submission(st.session_state.submit_key, done=True) # ก่อนหักสต็อก: rerun ซ้ำจะไม่หักซ้ำ
+                                get_stock_ledger().commit(get_stock_holder(), stock_ledger.cart_lines(st.session_state.current_order_items)) # หักตามที่ส่งจริง รอ reconcile ลง Sheet
                                 st.balloons()
                                 st.success("✅ บันทึกครบทุกรายการเรียบร้อย!")
                                 time.sleep(1.5)
@@ -510,6 +827,7 @@ else:
     # ================= MODE 2: RIDER =================
     elif mode == "🏍️ ส่งงาน Rider":
         st.title("🏍️ ส่งงาน Rider")
+        set_profile_step("rider")
         st.info("ถ่ายรูปเพิ่มเติมเพื่อส่งให้ Rider (จะบันทึกลง Folder เดิม)")
 
         st.markdown("#### 1. สแกน Order ที่จะส่ง")
@@ -522,22 +840,21 @@ else:
         current_rider_order = ""
         if man_rider_ord: current_rider_order = man_rider_ord
         elif scan_rider_ord:
-            res = decode(Image.open(scan_rider_ord))
-            if res: current_rider_order = res[0].data.decode("utf-8").upper()
+            res = scan_barcode("rider_order", scan_rider_ord)
+            if res: current_rider_order = res.upper()
 
         if current_rider_order:
             st.session_state.order_val = current_rider_order
-            with st.spinner(f"🔍 กำลังหา Folder ของ {current_rider_order}..."):
-                srv = authenticate_drive()
-                if srv:
-                    folder_id, folder_name = find_existing_order_folder(srv, current_rider_order, MAIN_FOLDER_ID)
-                    if folder_id:
-                        st.success(f"✅ เจอ Folder: **{folder_name}**")
-                        st.session_state.target_rider_folder_id = folder_id; st.session_state.target_rider_folder_name = folder_name
-                    else: 
-                        st.error(f"❌ {folder_name}")
-                        st.session_state.target_rider_folder_id = None
-                        st.session_state.target_rider_folder_name = ""
+            # ค้นหา Folder เฉพาะตอนเลข Order เปลี่ยน (ถ่ายรูป/กดปุ่มต่อจากนี้ไม่ต้องค้น Drive ซ้ำ)
+            folder_id, folder_name = memo_lookup("rider_folder", current_rider_order, _find_rider_folder, current_rider_order)
+            if folder_id:
+                st.success(f"✅ เจอ Folder: **{folder_name}**")
+                st.session_state.target_rider_folder_id = folder_id; st.session_state.target_rider_folder_name = folder_name
+            else: 
+                forget_memo("rider_folder") # ยังไม่เจอ: ให้ค้นใหม่รอบหน้า
+                st.error(f"❌ {folder_name}")
+                st.session_state.target_rider_folder_id = None
+                st.session_state.target_rider_folder_name = ""
 
         if st.session_state.get('target_rider_folder_id') and st.session_state.order_val:
             st.markdown("---"); st.markdown(f"#### 2. ถ่ายรูปส่งมอบ ({st.session_state.target_rider_folder_name})")
@@ -551,12 +868,125 @@ else:
                          st.session_state.cam_counter += 1; st.rerun()
                 with col_upload:
                     if st.button("🚀 ยืนยันส่งรูปนี้", type="primary", use_container_width=True):
+                        set_profile_step("rider-upload")
                         with st.spinner("Uploading..."):
-                            srv = authenticate_drive()
-                            ts = get_thai_ts_filename()
+                            rider_bytes = rider_img_input.getvalue()
+                            st.session_state.submit_key = submission_ledger.make_submission_key("RIDER", st.session_state.order_val, st.session_state.target_rider_folder_id, rider_bytes)
+                            sub = get_submission(st.session_state.submit_key)
+                            if sub.get('done'):
+                                # ส่งไปแล้ว: คืนผลเดิมโดยไม่เรียก Drive/Sheets ซ้ำ
+                                st.success("บันทึกรูป Rider สำเร็จ! (ส่งไปแล้วก่อนหน้านี้)")
+                                time.sleep(1.5)
+                                trigger_reset(); st.rerun()
+                            ts = sub.get('ts') or get_thai_ts_filename()
                             fn = f"RIDER_{st.session_state.order_val}_{ts}.jpg"
-                            uid = upload_photo(srv, rider_img_input, fn, st.session_state.target_rider_folder_id)
-                            save_rider_log(st.session_state.current_user_name, st.session_state.order_val, uid, st.session_state.target_rider_folder_name)
-                            st.success("บันทึกรูป Rider สำเร็จ!")
-                            time.sleep(1.5)
-                            trigger_reset(); st.rerun()
+                            record_submission(st.session_state.submit_key, ts=ts)
+                            uid = sub.get('file_id') or upload_photo(rider_bytes, fn, st.session_state.target_rider_folder_id)
+                            record_submission(st.session_state.submit_key, file_id=uid)
+                            if save_rider_log(st.session_state.current_user_name, st.session_state.order_val, uid, st.session_state.target_rider_folder_name, st.session_state.submit_key):
+                                record_submission(st.session_state.submit_key, done=True)
+                                st.success("บันทึกรูป Rider สำเร็จ!")
+                                time.sleep(1.5)
+                                trigger_reset(); st.rerun()
+
+    # ================= MODE 3: DASHBOARD =================
+    elif mode == "📊 Dashboard":
+        st.title("📊 Dashboard ประสิทธิภาพ")
+        set_profile_step("dashboard")
+        today = (datetime.utcnow() + timedelta(hours=7)).date()
+        date_range = st.date_input("ช่วงวันที่", value=(today - timedelta(days=6), today), max_value=today)
+        if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+            start_date, end_date = date_range
+            t0 = time.perf_counter()
+            try:
+                df_logs = load_log_analytics(LOG_SHEET_NAME, LOG_HEADERS, start_date, end_date)
+                df_rider = load_log_analytics(RIDER_SHEET_NAME, RIDER_HEADERS, start_date, end_date)
+            except Exception as e:
+                st.error(f"❌ โหลด Log ไม่สำเร็จ: {e}"); st.stop()
+            log_info = get_log_store().stats()
+            if log_info['pending']:
+                st.caption(f"⏳ Log ในเครื่องรอขึ้น Sheet {log_info['pending']:,} แถว (ยังไม่รวมในกราฟ) ค้างนานสุด {log_info['lag_seconds']:,.0f} วินาที"
+                           + (f" | ⚠️ ส่งล่าสุดไม่สำเร็จ: {log_info['last_error']}" if log_info['last_error'] else ""))
+            df_throughput = log_analytics.compute_picker_throughput(df_logs)
+            df_latency = log_analytics.compute_handover_latency(df_logs, df_rider)
+            df_locations = log_analytics.compute_busiest_locations(df_logs)
+            elapsed = time.perf_counter() - t0
+
+            m1, m2, m3 = st.columns(3)
+            m1.metric("จำนวนชิ้น", f"{int(df_logs['Pick Qty'].sum()):,}")
+            m2.metric("จำนวน Order", f"{df_logs['Order ID'].nunique():,}")
+            m3.metric("Pack → Rider (median)", f"{df_latency['Latency (min)'].median():.1f} นาที" if not df_latency.empty else "-")
+
+            st.markdown("#### 👷 Items / Hour ต่อพนักงาน")
+            if not df_throughput.empty: st.bar_chart(df_throughput.set_index('Picker Name')['Items/Hour'])
+            st.dataframe(df_throughput, use_container_width=True)
+            st.markdown("#### 🏍️ เวลาจากแพ็คถึงส่ง Rider ต่อ Order")
+            st.dataframe(df_latency, use_container_width=True)
+            st.markdown("#### 📍 Location ที่เบิกบ่อยที่สุด")
+            st.dataframe(df_locations, use_container_width=True)
+            st.caption(f"⏱️ {len(df_logs):,} + {len(df_rider):,} แถว ประมวลผล {elapsed:.2f}s")
+        else: st.info("กรุณาเลือกวันเริ่มต้นและวันสิ้นสุด")
+
+    # ================= MODE 4: PHOTO SEARCH =================
+    elif mode == "🔎 ค้นหารูปย้อนหลัง":
+        st.title("🔎 ค้นหารูปย้อนหลัง")
+        set_profile_step("photo-search")
+        if not DRIVE_MIRROR_PATH: st.info("ปิดการใช้งาน Drive mirror อยู่ (AMAZE_DRIVE_MIRROR_PATH)"); st.stop()
+        mirror = get_drive_mirror(); info = mirror.stats()
+        if info['last_sync'] is None: st.warning("⏳ กำลังสร้าง index ครั้งแรก ผลค้นหาอาจยังไม่ครบ")
+        else: st.caption(f"🗂️ {info['orders']:,} Order, {info['packed'] + info['rider']:,} รูป · อัปเดตล่าสุด {int(time.time() - info['last_sync'])} วินาทีที่แล้ว")
+
+        col_s1, col_s2 = st.columns(2)
+        search_order = col_s1.text_input("Order ID (ขึ้นต้นด้วย)", key="search_order").strip().upper()
+        search_picker = col_s2.selectbox("พนักงาน", ["ทั้งหมด"] + mirror.list_pickers(), key="search_picker")
+        today = (datetime.utcnow() + timedelta(hours=7)).date()
+        start_date = end_date = None
+        if st.checkbox("กรองตามช่วงวันที่", value=True, key="search_use_dates"):
+            date_range = st.date_input("ช่วงวันที่", value=(today - timedelta(days=6), today), max_value=today, key="search_dates")
+            if isinstance(date_range, (list, tuple)) and date_range: start_date, end_date = date_range[0], date_range[-1]
+
+        t0 = time.perf_counter()
+        results = mirror.search(search_order or None, start_date, end_date, None if search_picker == "ทั้งหมด" else search_picker, limit=50)
+        st.caption(f"⏱️ {len(results)} Folder ใน {(time.perf_counter() - t0) * 1000:.1f} ms (แสดงสูงสุด 50)")
+        if not results: st.info("ไม่พบ Folder ตามเงื่อนไข")
+        for r in results:
+            with st.expander(f"📦 {r['folder_name']} · {r['date']} · 👷 {', '.join(r['pickers']) or '-'}"):
+                st.markdown(f"[📁 เปิด Folder](https://drive.google.com/drive/folders/{r['folder_id']})" + (f" · 🏍️ {', '.join(r['riders'])}" if r['riders'] else ""))
+                photo_rows = [{"ประเภท": p['kind'].upper(), "ไฟล์": p['name'], "ลิงก์": f"https://drive.google.com/open?id={p['id']}", "ขนาด (KB)": round(p['size'] / 1024, 1)} for p in r['packed'] + r['rider']]
+                if photo_rows: st.dataframe(pd.DataFrame(photo_rows), column_config={"ลิงก์": st.column_config.LinkColumn()}, use_container_width=True, hide_index=True)
+                else: st.caption("ไม่มีรูปใน Folder นี้")
+
+    # ================= MODE 5: PROFILER (admin) =================
+    elif mode == "🩺 Profiler" and is_admin():
+        st.title("🩺 Profiler ราย Session")
+        set_profile_step("profiler")
+        st.caption("เปิด profiler ให้ session ที่ช้า แล้วให้พนักงานทำงานตามปกติ: ทุก rerun ของ session นั้นจะถูกบันทึก flame graph แยกตามขั้นตอน")
+        reg = get_profiler_registry(); store = reg['store']; now = time.time()
+
+        st.markdown("#### Session ที่ใช้งานอยู่")
+        sessions = sorted(((sid, s) for sid, s in list(reg['sessions'].items()) if now - s['seen'] < PROFILER_SESSION_IDLE), key=lambda x: -x[1]['seen'])
+        for sid, s in sessions:
+            label = f"👤 {s['user']} · {s['step']} · {int(now - s['seen'])} วินาทีที่แล้ว" + (" (session นี้)" if sid == st.session_state.profile_session_id else "")
+            profiling = st.toggle(label, value=sid in reg['targets'], key=f"profile_target_{sid}")
+            with reg['lock']:
+                if profiling: reg['targets'].add(sid)
+                else: reg['targets'].discard(sid)
+
+        st.markdown("#### Profile ล่าสุด")
+        profiles = store.list(PROFILE_LIST_LIMIT)
+        if not profiles: st.info("ยังไม่มี profile"); st.stop()
+        categories = [name for name, _ in session_profiler.CATEGORIES] + ["app"]
+        # เวลาแยกตามหมวด (ms) = เวลา rerun x สัดส่วน sample ที่อยู่ในหมวดนั้น
+        df_prof = pd.DataFrame([{"เวลา": p.get('time', ""), "พนักงาน": p.get('user', "-"), "ขั้นตอน": p['step'], "รวม (ms)": p['duration_ms'],
+                                 **{c: round(p['duration_ms'] * p['categories'].get(c, 0) / max(p['samples'], 1), 1) for c in categories}} for p in profiles])
+        st.dataframe(df_prof, use_container_width=True, hide_index=True)
+        st.markdown("##### เวลาเฉลี่ยต่อ rerun แยกตามขั้นตอน (ms)")
+        st.bar_chart(df_prof.groupby("ขั้นตอน")[categories].mean())
+
+        labels = {p['id']: f"{p.get('time', '')} · {p['step']} · {p.get('user', '-')} · {p['duration_ms']:.0f} ms" for p in profiles}
+        profile_id = st.selectbox("ดู Flame graph", list(labels), format_func=labels.get, key="profile_view")
+        svg = store.read(profile_id, "svg")
+        st.markdown(f'<div style="overflow-x: auto">{svg}</div>', unsafe_allow_html=True)
+        col_d1, col_d2 = st.columns(2)
+        col_d1.download_button("⬇️ .folded (speedscope / flamegraph.pl)", store.read(profile_id, "folded"), file_name=f"{profile_id}.folded", use_container_width=True)
+        col_d2.download_button("⬇️ .svg", svg, file_name=f"{profile_id}.svg", mime="image/svg+xml", use_container_width=True)
@@ -0,0 +1,377 @@
+"""Load test สำหรับ Smart Picking System
+
+รัน session จำลองหลายชุดพร้อมกันผ่าน Streamlit AppTest โดยเดินตาม flow จริง
+(login -> order -> product -> location -> cart -> photo -> upload และ flow Rider)
+กับ Drive / Sheets ปลอมในหน่วยความจำ แล้วรายงาน throughput, latency p50/p95/p99
+ต่อ step, memory ต่อ session และระดับ concurrency ที่เริ่มอิ่มตัว
+
+    python Amaze_load_test.py --app Amaze_app_MFC_Gmail.py --levels 1,2,4,8,16
+    python Amaze_load_test.py --events recorded_scans.json --sheets-latency-ms 150
+
+ไฟล์ --events เป็น list ของ flow โดยแต่ละ flow คือ list ของ event เช่น
+{"step": "login", "user": "U0001", "password": "1234"}, {"step": "order", "value": "B01"},
+{"step": "product", "value": "<barcode>"}, {"step": "location", "value": "Z1-01"},
+{"step": "add_to_cart"}, {"step": "confirm_cart"}, {"step": "photo"}, {"step": "upload"},
+{"step": "rider", "value": "B01"}, {"step": "rider_photo"}, {"step": "rider_upload"}
+"""
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import gspread
+import googleapiclient.discovery
+import streamlit_back_camera_input
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+FAKE_OAUTH = {"refresh_token": "load-test", "client_id": "load-test", "client_secret": "load-test"}
+CATALOG_HEADERS = ["Barcode", "SKU", "Category", "Brand", "Size", "Variant", "Zone", "Location", "Stock"]
+FAKE_STOCK = 100000 # สต็อกต่อ SKU: ทุก flow จอง / หัก / reconcile จริงแต่ไม่มีใครโดน "สต็อกไม่พอ"
+USER_HEADERS = ["User ID", "Password", "Name"]
+
+
+# --- FAKE BACKENDS ---
+class FakeLatency:
+    def __init__(self, sheets_ms=0, drive_ms=0):
+        self.sheets = sheets_ms / 1000.0; self.drive = drive_ms / 1000.0
+        self._event = threading.Event() # ใช้ wait แทน time.sleep
+
+    def wait(self, seconds):
+        if seconds: self._event.wait(seconds)
+
+
+class FakeWorksheet:
+    def __init__(self, book, title, rows=None):
+        self.book = book; self.title = title; self.rows = [list(r) for r in (rows or [])]
+
+    def get_all_values(self):
+        self.book.latency.wait(self.book.latency.sheets)
+        with self.book.lock: return [list(r) for r in self.rows]
+
+    def get(self, range_name):
+        self.book.latency.wait(self.book.latency.sheets)
+        start = int(re.match(r"[A-Z]+(\d+)", range_name).group(1))
+        with self.book.lock: return [list(r) for r in self.rows[start - 1:]]
+
+    def _cell(self, a1):
+        letters, row = re.match(r"([A-Z]+)(\d+)", a1).groups(); col = 0
+        for ch in letters: col = col * 26 + ord(ch) - 64
+        return int(row) - 1, col - 1
+
+    def batch_get(self, ranges, **kwargs):
+        # เฉพาะช่องเดียวต่อ range (แบบที่ reconcile สต็อกใช้)
+        self.book.latency.wait(self.book.latency.sheets)
+        with self.book.lock:
+            out = []
+            for a1 in ranges:
+                r, c = self._cell(a1)
+                out.append([[self.rows[r][c]]] if r < len(self.rows) and c < len(self.rows[r]) and self.rows[r][c] != "" else [])
+            return out
+
+    def batch_update(self, data, **kwargs):
+        self.book.latency.wait(self.book.latency.sheets)
+        with self.book.lock:
+            for d in data:
+                r, c = self._cell(d['range']); self.rows[r][c] = str(d['values'][0][0])
+
+    def append_row(self, values, **kwargs):
+        self.book.latency.wait(self.book.latency.sheets)
+        with self.book.lock: self.rows.append([str(v) for v in values])
+
+    def append_rows(self, values, **kwargs):
+        self.book.latency.wait(self.book.latency.sheets)
+        with self.book.lock: self.rows.extend([str(v) for v in row] for row in values)
+
+
+class FakeSpreadsheet:
+    def __init__(self, latency, catalog_rows, user_rows):
+        self.latency = latency; self.lock = threading.Lock()
+        self.sheets = [FakeWorksheet(self, "Catalog", [CATALOG_HEADERS] + catalog_rows), FakeWorksheet(self, "User", [USER_HEADERS] + user_rows)]
+
+    def get_worksheet(self, index): return self.sheets[index]
+
+    def worksheet(self, title):
+        with self.lock:
+            for ws in self.sheets:
+                if ws.title == title: return ws
+        raise gspread.WorksheetNotFound(title)
+
+    def worksheets(self):
+        with self.lock: return list(self.sheets)
+
+    def add_worksheet(self, title, rows=None, cols=None):
+        with self.lock:
+            ws = FakeWorksheet(self, title); self.sheets.append(ws); return ws
+
+
+class FakeGspreadClient:
+    def __init__(self, book): self.book = book
+    def open_by_key(self, key): return self.book
+
+
+class _Request:
+    def __init__(self, fn): self.fn = fn
+    def execute(self, **kwargs): return self.fn()
+
+
+class FakeDriveFiles:
+    def __init__(self, drive): self.drive = drive
+
+    def list(self, q="", fields=None, orderBy=None, **kwargs):
+        def run():
+            self.drive.latency.wait(self.drive.latency.drive)
+            name = re.search(r"name = '([^']*)'", q); contains = re.search(r"name contains '([^']*)'", q); parent = re.search(r"'([^']*)' in parents", q)
+            with self.drive.lock:
+                files = [f for f in self.drive.items.values()
+                         if (not name or f["name"] == name.group(1)) and (not contains or contains.group(1) in f["name"])
+                         and (not parent or parent.group(1) in f["parents"]) and ("mimeType = 'application/vnd.google-apps.folder'" not in q or f["mimeType"] == "application/vnd.google-apps.folder")]
+            if orderBy == "createdTime desc": files.sort(key=lambda f: f["createdTime"], reverse=True)
+            return {"files": [{"id": f["id"], "name": f["name"]} for f in files]}
+        return _Request(run)
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            self.drive.latency.wait(self.drive.latency.drive)
+            with self.drive.lock:
+                self.drive.counter += 1; file_id = f"fake{self.drive.counter:08d}"
+                size = len(media_body._fd.getvalue()) if media_body is not None and hasattr(media_body, "_fd") else 0
+                self.drive.items[file_id] = {"id": file_id, "name": body["name"], "parents": list(body.get("parents", [])),
+                                             "mimeType": body.get("mimeType", "image/jpeg"), "createdTime": time.time(), "size": size}
+            return {"id": file_id}
+        return _Request(run)
+
+
+class FakeDriveService:
+    def __init__(self, latency):
+        self.latency = latency; self.lock = threading.Lock(); self.items = {}; self.counter = 0
+    def files(self): return FakeDriveFiles(self)
+
+
+# --- FAKE CAMERA ---
+def fake_back_camera_input(label, key=None, **kwargs):
+    # กล้องปลอม: รูปที่ "arm" ไว้ตาม prefix จะผูกกับ widget key แรกที่ตรง แล้วค้างอยู่จน key เปลี่ยน (เหมือนกล้องจริง)
+    import streamlit as st
+    armed = st.session_state.get("_lt_cam_armed", {}); bound = st.session_state.get("_lt_cam_bound", {})
+    if key in bound: return io.BytesIO(bound[key])
+    for prefix, data in list(armed.items()):
+        if key and key.startswith(prefix):
+            bound[key] = data; armed.pop(prefix)
+            st.session_state["_lt_cam_bound"] = bound; st.session_state["_lt_cam_armed"] = armed
+            return io.BytesIO(data)
+    return None
+
+
+def make_photo_bytes(seed):
+    buf = io.BytesIO(); Image.new("RGB", (640, 480), ((seed * 37) % 256, (seed * 91) % 256, 120)).save(buf, format="JPEG"); return buf.getvalue()
+
+
+# --- SCENARIO ---
+def build_fake_data(n_skus, n_users):
+    catalog = [[f"88500{i:08d}", f"SKU{i}", "Cat", f"Brand{i % 50}", "M", f"Variant{i}", f"Z{i % 10}", f"{i % 40:02d}-{i % 5}", str(FAKE_STOCK)] for i in range(n_skus)]
+    users = [[f"U{i:04d}", "1234", f"Picker {i}"] for i in range(n_users)]
+    return catalog, users
+
+
+def default_events(session_idx, catalog, items_per_order):
+    # เหตุการณ์สแกนของ 1 session: login แล้วแพ็ค 1 Order แล้วส่ง Rider
+    order_id = f"LT{session_idx:05d}"; events = [{"step": "login", "user": f"U{session_idx % 1000:04d}", "password": "1234"}, {"step": "order", "value": order_id}]
+    for j in range(items_per_order):
+        row = catalog[(session_idx * items_per_order + j) % len(catalog)]
+        events += [{"step": "product", "value": row[0]}, {"step": "location", "value": f"{row[6]}-{row[7]}"}, {"step": "add_to_cart"}]
+    events += [{"step": "confirm_cart"}, {"step": "photo"}, {"step": "upload"}, {"step": "rider", "value": order_id}, {"step": "rider_photo"}, {"step": "rider_upload"}]
+    return events
+
+
+def load_recorded_events(path, session_idx):
+    # ไฟล์ events = list ของ flow (list ของ event); session ที่ i ใช้ flow ที่ i % len และเติม suffix ให้ Order ไม่ชนกัน
+    with open(path, encoding="utf-8") as f: flows = json.load(f)
+    events = json.loads(json.dumps(flows[session_idx % len(flows)]))
+    for ev in events:
+        if ev["step"] in ("order", "rider"): ev["value"] = f"{ev['value']}-{session_idx}"
+    return events
+
+
+def _button(at, label):
+    for b in list(at.button) + list(at.sidebar.button):
+        if b.label == label: return b
+    raise RuntimeError(f"ไม่พบปุ่ม: {label}")
+
+
+def run_step(at, ev, photo):
+    step = ev["step"]
+    if step == "login":
+        at.text_input(key="input_user_manual").input(ev["user"]).run()
+        at.text_input(key="login_pass_input").input(ev["password"]).run()
+        _button(at, "✅ ยืนยัน Login").click().run()
+    elif step == "order": at.text_input(key="pack_order_man").input(ev["value"]).run()
+    elif step == "product": at.text_input(key="pack_prod_man").input(ev["value"]).run()
+    elif step == "location": at.text_input(key="loc_man").input(ev["value"]).run()
+    elif step == "add_to_cart": _button(at, "➕ เพิ่มลงตะกร้า").click().run()
+    elif step == "confirm_cart": _button(at, "✅ ยืนยันรายการครบแล้ว (ไปถ่ายรูป)").click().run()
+    elif step == "photo": at.session_state["_lt_cam_armed"] = {"pack_cam_fin_": photo}; at.run()
+    elif step == "upload": _button(at, "☁️ ยืนยัน Upload ทั้งหมด").click().run()
+    elif step == "rider":
+        at.sidebar.radio[0].set_value("🏍️ ส่งงาน Rider").run()
+        at.text_input(key="rider_ord_man").input(ev["value"]).run()
+    elif step == "rider_photo": at.session_state["_lt_cam_armed"] = {"rider_cam_act_": photo}; at.run()
+    elif step == "rider_upload": _button(at, "🚀 ยืนยันส่งรูปนี้").click().run()
+    else: raise ValueError(f"unknown step: {step}")
+    if at.exception: raise RuntimeError(f"{step}: {at.exception[0].message}")
+
+
+def install_shared_runtime():
+    # AppTest สร้างแล้วลบ Runtime ปลอม / st.secrets แบบ global ทุกครั้งที่ run จึงรันหลาย session พร้อมกันใน thread ไม่ได้
+    # -> ถ้า session อื่นเพิ่งลบ Runtime ไป ให้ใช้ตัวล่าสุดต่อ, ตั้ง secrets ครั้งเดียวทั้ง process
+    #    และใช้ ScriptCache ร่วมกัน (server จริง compile script ครั้งเดียวต่อ process)
+    import streamlit as st
+    import streamlit.testing.v1.app_test as app_test
+    import streamlit.testing.v1.local_script_runner as local_script_runner
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.secrets import Secrets
+    last = {}; script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+    def instance(cls):
+        if cls._instance is not None: last["runtime"] = cls._instance
+        if "runtime" not in last: raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in last)
+    secrets = Secrets(); secrets._secrets = {"oauth": FAKE_OAUTH}; st.secrets = secrets
+    config._set_option("global.appTest", True, "load-test")
+
+
+def run_session(app_path, events, photo, timeout):
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    timings = []; t0 = time.perf_counter(); at.run(); timings.append(("first_render", time.perf_counter() - t0))
+    for ev in events:
+        t0 = time.perf_counter()
+        try: run_step(at, ev, photo)
+        except Exception as e:
+            shown = [el.value for el in list(at.error) + list(at.warning)]
+            raise RuntimeError(f"{ev['step']}: {e!r} {shown}") from e
+        timings.append((ev["step"], time.perf_counter() - t0))
+    return at, timings
+
+
+# --- REPORT ---
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values); idx = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[idx]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_level(args, concurrency, catalog):
+    photo = make_photo_bytes(concurrency); sessions = args.sessions or concurrency
+    flows = [load_recorded_events(args.events, i) if args.events else default_events(i + concurrency * 10000, catalog, args.items) for i in range(sessions)]
+    step_times = defaultdict(list); errors = []; alive = []
+    rss_before = rss_bytes(); t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_session, args.app, flow, photo, args.timeout) for flow in flows]
+        for fut in futures:
+            try:
+                at, timings = fut.result(); alive.append(at)
+                for step, dt in timings: step_times[step].append(dt)
+            except Exception as e: errors.append(str(e))
+    wall = time.perf_counter() - t0; rss_after = rss_bytes()
+    all_steps = [dt for step, times in step_times.items() if step != "first_render" for dt in times]
+    return {
+        "concurrency": concurrency, "sessions": sessions, "completed": len(alive), "errors": errors[:5], "error_count": len(errors),
+        "wall_s": round(wall, 3), "flows_per_s": round(len(alive) / wall, 3) if wall else 0.0,
+        "steps_per_s": round(len(all_steps) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(all_steps, 50) * 1000, 1), "p95_ms": round(percentile(all_steps, 95) * 1000, 1), "p99_ms": round(percentile(all_steps, 99) * 1000, 1),
+        "mem_per_session_kb": round(max(0, rss_after - rss_before) / max(1, len(alive)) / 1024, 1),
+        "steps": {step: {"n": len(t), "p50_ms": round(percentile(t, 50) * 1000, 1), "p95_ms": round(percentile(t, 95) * 1000, 1), "p99_ms": round(percentile(t, 99) * 1000, 1)}
+                  for step, t in step_times.items()},
+    }
+
+
+def find_saturation(results):
+    # อิ่มตัว = เพิ่ม concurrency แล้ว throughput โตไม่ถึง 10% หรือ p95 แย่ลงเกิน 2 เท่าของระดับแรก
+    base_p95 = results[0]["p95_ms"] if results else 0
+    for prev, cur in zip(results, results[1:]):
+        if cur["steps_per_s"] < prev["steps_per_s"] * 1.1 or (base_p95 and cur["p95_ms"] > base_p95 * 2): return prev["concurrency"]
+    return None
+
+
+def print_report(results, saturation):
+    print(f"{'conc':>5} {'flows':>6} {'err':>4} {'flows/s':>8} {'steps/s':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'KB/sess':>9}")
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['completed']:>6} {r['error_count']:>4} {r['flows_per_s']:>8} {r['steps_per_s']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['mem_per_session_kb']:>9}")
+        for e in r["errors"]: print(f"      ❌ {e}")
+    if results:
+        print("\nStep latency (ระดับสุดท้าย):")
+        for step, s in results[-1]["steps"].items(): print(f"  {step:<14} n={s['n']:<5} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms")
+    print(f"\nจุดอิ่มตัว: {'concurrency ' + str(saturation) if saturation else 'ยังไม่อิ่มตัวในช่วงที่ทดสอบ'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test Smart Picking System ด้วย session จำลอง")
+    parser.add_argument("--app", default="Amaze_app_MFC_Gmail.py")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="ระดับ concurrency คั่นด้วย comma")
+    parser.add_argument("--sessions", type=int, default=0, help="จำนวน session ต่อระดับ (ค่าเริ่มต้น = concurrency)")
+    parser.add_argument("--items", type=int, default=3, help="จำนวนสินค้าต่อ Order (เมื่อไม่ใช้ --events)")
+    parser.add_argument("--events", help="ไฟล์ JSON ของ scan events ที่บันทึกไว้")
+    parser.add_argument("--skus", type=int, default=5000)
+    parser.add_argument("--sheets-latency-ms", type=float, default=0)
+    parser.add_argument("--drive-latency-ms", type=float, default=0)
+    parser.add_argument("--real-sleeps", action="store_true", help="ไม่ปิด time.sleep ในแอป")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="บันทึกผลเป็น JSON")
+    args = parser.parse_args(argv)
+    args.app = os.path.abspath(args.app)
+    if args.events: args.events = os.path.abspath(args.events)
+    if args.json: args.json = os.path.abspath(args.json)
+
+    catalog, users = build_fake_data(args.skus, 1000)
+    latency = FakeLatency(args.sheets_latency_ms, args.drive_latency_ms)
+    book = FakeSpreadsheet(latency, catalog, users); drive = FakeDriveService(latency)
+    gspread.authorize = lambda creds, *a, **kw: FakeGspreadClient(book)
+    googleapiclient.discovery.build = googleapiclient.discovery.build_from_document = lambda *a, **kw: drive
+    streamlit_back_camera_input.back_camera_input = fake_back_camera_input
+    if not args.real_sleeps:
+        # ปิดเฉพาะ time.sleep ที่เรียกจากตัวแอป (AppTest เองใช้ time.sleep รอ script อยู่)
+        real_sleep = time.sleep
+        time.sleep = lambda s: None if sys._getframe(1).f_code.co_filename == args.app else real_sleep(s)
+    install_shared_runtime()
+    os.environ["AMAZE_DRIVE_MIRROR_PATH"] = "" # Drive ปลอมไม่มี changes feed: ไม่รัน crawler ระหว่างวัดผล
+    os.environ["AMAZE_STOCK_RECONCILE_INTERVAL"] = "1" # reconcile สต็อกลง Sheet ปลอมระหว่างวัดผลด้วย
+
+    workdir = tempfile.mkdtemp(prefix="amaze_load_test_"); os.chdir(workdir) # ledger / archive ของแอปไม่ปนกับของจริง
+    # warm-up: รัน 1 flow ก่อนวัดผล (compile script, import library, สร้าง Folder ปี/เดือน/วันของวันนี้ เหมือนระบบที่เปิดใช้แล้ว)
+    run_session(args.app, default_events(99999, catalog, 1), make_photo_bytes(0), args.timeout)
+    results = []
+    for level in [int(x) for x in args.levels.split(",") if x.strip()]:
+        results.append(run_level(args, level, catalog))
+        r = results[-1]; print(f"... concurrency {level}: {r['completed']}/{r['sessions']} flows, {r['steps_per_s']} steps/s, p95 {r['p95_ms']}ms", file=sys.stderr)
+    saturation = find_saturation(results)
+    print_report(results, saturation)
+    time.sleep(3) # รอ reconcile รอบสุดท้าย
+    stock_col = CATALOG_HEADERS.index("Stock")
+    with book.lock: picked = sum(FAKE_STOCK - int(r[stock_col]) for r in book.sheets[0].rows[1:])
+    print(f"สต็อกใน Sheet ถูกหัก (reconcile): {picked} ชิ้น")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump({"results": results, "saturation": saturation}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
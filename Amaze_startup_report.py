@@ -0,0 +1,92 @@
+"""รายงานเวลา cold start ของแอป (import แบบเดิม vs lazy import)
+
+แต่ละการวัดรันใน process ใหม่ (เหมือน container ที่เพิ่ง start) แล้วรายงาน
+- เวลา import และ memory (RSS) ของ library หนักแต่ละตัว
+- เวลาถึงหน้าแรก (หน้า Login) และ RSS หลังแสดงผล ทั้งโหมดเดิม (AMAZE_EAGER_IMPORTS=1) และโหมด lazy
+
+    python Amaze_startup_report.py --app Amaze_app_MFC_Gmail.py --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("pandas", "gspread", "googleapiclient.discovery", "googleapiclient.http", "PIL.Image", "pyzbar.pyzbar")
+
+_RSS = """
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+"""
+
+# import streamlit ก่อน แล้ววัดเฉพาะส่วนที่ module นั้นเพิ่มเข้ามา
+IMPORT_PROBE = """
+import importlib, json, os, sys, time
+""" + _RSS + """
+import streamlit
+rss0 = _rss_mb(); t0 = time.perf_counter()
+try: importlib.import_module(sys.argv[1]); ok = True
+except Exception as e: ok = repr(e)
+print(json.dumps({"seconds": time.perf_counter() - t0, "rss_mb": _rss_mb() - rss0, "ok": ok}))
+"""
+
+# เวลาตั้งแต่ process เริ่มจนหน้าแรกของแอป render เสร็จ (ไม่มี secrets จึงไม่เรียก Google)
+RENDER_PROBE = """
+import time; T0 = time.perf_counter()
+import json, os, sys
+""" + _RSS + """
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120); at.run()
+heavy = [m for m in sys.argv[2:] if m in sys.modules]
+print(json.dumps({"seconds": time.perf_counter() - T0, "rss_mb": _rss_mb(), "heavy_loaded": heavy, "title": [t.value for t in at.title]}))
+"""
+
+
+def run_probe(code, args, env=None):
+    out = subprocess.run([sys.executable, "-c", code] + list(args), capture_output=True, text=True, env=env)
+    for line in reversed(out.stdout.strip().splitlines()):
+        if line.startswith("{"): return json.loads(line)
+    raise RuntimeError(f"probe failed: {out.stderr.strip()[-500:]}")
+
+
+def measure_render(app, eager, repeat):
+    env = dict(os.environ); env.pop("AMAZE_EAGER_IMPORTS", None)
+    if eager: env["AMAZE_EAGER_IMPORTS"] = "1"
+    runs = [run_probe(RENDER_PROBE, [app] + list(HEAVY_MODULES), env=env) for _ in range(repeat)]
+    return {"seconds": statistics.median(r["seconds"] for r in runs), "rss_mb": statistics.median(r["rss_mb"] for r in runs), "heavy_loaded": runs[-1]["heavy_loaded"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="รายงาน cold start: import แบบเดิมเทียบกับ lazy import")
+    parser.add_argument("--app", default="Amaze_app_MFC_Gmail.py")
+    parser.add_argument("--repeat", type=int, default=3, help="จำนวนรอบต่อการวัด (ใช้ค่า median)")
+    parser.add_argument("--json", help="บันทึกผลเป็น JSON")
+    args = parser.parse_args(argv)
+    app = os.path.abspath(args.app)
+
+    print("Import cost ต่อ module (หลัง import streamlit แล้ว):")
+    modules = {}
+    for name in HEAVY_MODULES:
+        runs = [run_probe(IMPORT_PROBE, [name]) for _ in range(args.repeat)]
+        modules[name] = {"seconds": statistics.median(r["seconds"] for r in runs), "rss_mb": statistics.median(r["rss_mb"] for r in runs), "ok": runs[-1]["ok"]}
+        m = modules[name]; status = "" if m["ok"] is True else f"  ⚠️ {m['ok']}"
+        print(f"  {name:<28} {m['seconds'] * 1000:8.1f} ms {m['rss_mb']:8.1f} MB{status}")
+
+    before = measure_render(app, eager=True, repeat=args.repeat)
+    after = measure_render(app, eager=False, repeat=args.repeat)
+    print(f"\nTime to first render ({os.path.basename(app)}):")
+    print(f"  {'':<8} {'seconds':>9} {'RSS MB':>9}  heavy modules loaded")
+    for label, r in (("before", before), ("after", after)):
+        print(f"  {label:<8} {r['seconds']:9.2f} {r['rss_mb']:9.1f}  {', '.join(r['heavy_loaded']) or '-'}")
+    print(f"  {'saved':<8} {before['seconds'] - after['seconds']:9.2f} {before['rss_mb'] - after['rss_mb']:9.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump({"modules": modules, "before": before, "after": after}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
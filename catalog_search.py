@@ -0,0 +1,146 @@
+"""Index ค้นหาสินค้าในหน่วยความจำ: Barcode และชื่อ (Brand + Variant)
+
+- prefix ของ Barcode / คำในชื่อ: sorted array + bisect
+- fuzzy (พิมพ์ผิด / สลับตัว): n-gram inverted index (ชื่อใช้ 3-gram, Barcode ใช้ 4-gram เพราะมีแค่ 10 ตัวอักษร),
+  ข้าม n-gram ที่พบบ่อยเกินไป
+- catalog โหลดใหม่: apply() แก้เฉพาะแถวที่เปลี่ยน (เปลี่ยนเยอะ / ลบสะสมเยอะ ค่อยสร้างใหม่ทั้งก้อน)
+
+    index = CatalogIndex(rows)               # rows = [(barcode, ชื่อสินค้า, location), ...]
+    index.search("88500001234", limit=8)     # -> [{'barcode', 'name', 'location', 'match', 'score'}, ...]
+    index = index.apply(new_rows)
+"""
+import bisect
+import threading
+from collections import Counter
+
+MAX_POSTING_RATIO = 0.02 # n-gram ที่อยู่ในเกิน 2% ของสินค้าไม่ช่วยแยก ข้ามไปตอนค้นแบบ fuzzy
+MIN_FUZZY_SCORE = 0.3
+REBUILD_RATIO = 0.2 # แถวที่เปลี่ยน / ถูกลบสะสมเกินสัดส่วนนี้ -> สร้าง index ใหม่ทั้งก้อน
+SCAN_CAP = 5000 # จำนวนสินค้าสูงสุดที่ไล่ตรวจต่อคำค้น (คำสั้นๆ อย่าง "a" จะไม่ไล่ทั้ง catalog)
+
+
+def _tokens(name): return sorted(set(name.lower().split()))
+
+
+def _grams(text, n=3):
+    grams = set()
+    for word in text.lower().split():
+        word = f" {word} "
+        grams.update(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+def _barcode_grams(barcode): return _grams(barcode, 4)
+
+
+class CatalogIndex:
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self.docs = [] # doc id -> (barcode, name, location), None = ถูกลบแล้ว
+        self.by_barcode = {}
+        self.barcode_keys = [] # sorted (barcode, doc)
+        self.token_keys = [] # sorted (token, doc)
+        self.postings = {} # n-gram -> [doc, ...]
+        self.dead = 0
+        rows = self._dedupe(rows)
+        for row in rows.values(): self._append(row)
+        self.barcode_keys.sort(); self.token_keys.sort()
+
+    def __len__(self): return len(self.by_barcode)
+
+    @staticmethod
+    def _dedupe(rows):
+        # Barcode ซ้ำ: ใช้แถวแรก เหมือน _find_product
+        out = {}
+        for barcode, name, location in rows:
+            barcode = str(barcode).strip()
+            if barcode and barcode not in out: out[barcode] = (barcode, str(name), str(location))
+        return out
+
+    def _append(self, row):
+        doc = len(self.docs); barcode, name, _ = row
+        self.docs.append(row); self.by_barcode[barcode] = doc
+        self.barcode_keys.append((barcode, doc))
+        self.token_keys.extend((t, doc) for t in _tokens(name))
+        grams = _barcode_grams(barcode) | _grams(name)
+        for g in grams: self.postings.setdefault(g, []).append(doc)
+        return doc
+
+    # --- INCREMENTAL UPDATE ---
+    def apply(self, rows):
+        # คืน index ที่ตรงกับ rows: แก้ในที่เดิมถ้าเปลี่ยนไม่มาก ไม่งั้นสร้างใหม่
+        new = self._dedupe(rows)
+        removed = [b for b, doc in self.by_barcode.items() if new.get(b) != self.docs[doc]]
+        added = [new[b] for b in new if b not in self.by_barcode or new[b] != self.docs[self.by_barcode[b]]]
+        if len(removed) + len(added) > REBUILD_RATIO * max(len(new), 1) or self.dead + len(removed) > REBUILD_RATIO * max(len(self.docs), 1):
+            return CatalogIndex(new.values())
+        with self._lock:
+            for barcode in removed: self._remove(barcode)
+            for row in added:
+                doc = self._append(row)
+                # _append เติมท้าย list: ย้ายเข้าตำแหน่งที่เรียงไว้
+                self.barcode_keys.pop(); bisect.insort(self.barcode_keys, (row[0], doc))
+                for t in _tokens(row[1]): self.token_keys.pop(); bisect.insort(self.token_keys, (t, doc))
+        return self
+
+    def _remove(self, barcode):
+        doc = self.by_barcode.pop(barcode); _, name, _ = self.docs[doc]
+        del self.barcode_keys[bisect.bisect_left(self.barcode_keys, (barcode, doc))]
+        for t in _tokens(name): del self.token_keys[bisect.bisect_left(self.token_keys, (t, doc))]
+        self.docs[doc] = None; self.dead += 1 # posting ของ n-gram ปล่อยไว้ กรองตอนค้น
+
+    # --- SEARCH ---
+    def _prefix_range(self, keys, prefix):
+        return bisect.bisect_left(keys, (prefix,)), bisect.bisect_left(keys, (prefix + "\uffff",))
+
+    def _prefix_barcodes(self, prefix, limit):
+        lo, hi = self._prefix_range(self.barcode_keys, prefix)
+        return [doc for _, doc in self.barcode_keys[lo:min(hi, lo + limit)]]
+
+    def _prefix_names(self, words, limit):
+        # เริ่มจากคำที่ match น้อยที่สุด แล้วตรวจคำที่เหลือกับชื่อสินค้าโดยตรง
+        ranges = sorted((hi - lo, lo, hi, w) for w in words for lo, hi in [self._prefix_range(self.token_keys, w)])
+        if not ranges or ranges[0][0] == 0: return []
+        _, lo, hi, first = ranges[0]; rest = [r[3] for r in ranges[1:]]; out = []; seen = set()
+        for _, doc in self.token_keys[lo:min(hi, lo + SCAN_CAP)]:
+            if doc in seen: continue
+            seen.add(doc); tokens = self.docs[doc][1].lower().split()
+            if all(any(t.startswith(w) for t in tokens) for w in rest):
+                out.append(doc)
+                if len(out) >= limit: break
+        return out
+
+    def _fuzzy(self, query, limit):
+        query_barcode = _barcode_grams(query); query_name = _grams(query)
+        max_posting = max(50, int(len(self.docs) * MAX_POSTING_RATIO))
+        lists = sorted((self.postings.get(g, ()) for g in query_barcode | query_name), key=len)
+        useful = [p for p in lists if 0 < len(p) <= max_posting] or [p for p in lists[:2] if p]
+        counts = Counter()
+        for p in useful: counts.update(p[:SCAN_CAP])
+        scored = []
+        for doc, _ in counts.most_common(limit * 4):
+            if self.docs[doc] is None: continue
+            barcode, name, _ = self.docs[doc]; by_barcode = _barcode_grams(barcode)
+            # Barcode พิมพ์ครบทั้งรหัส -> Jaccard, ชื่อมักพิมพ์แค่บางคำ -> สัดส่วนของคำค้นที่เจอในชื่อ
+            score = max(len(query_barcode & by_barcode) / len(query_barcode | by_barcode), 0.95 * len(query_name & _grams(name)) / len(query_name))
+            if score >= MIN_FUZZY_SCORE: scored.append((score, doc))
+        scored.sort(key=lambda x: -x[0])
+        return scored[:limit]
+
+    def search(self, query, limit=8):
+        query = str(query or "").strip()
+        if not query: return []
+        with self._lock:
+            results = []; seen = set()
+            def add(doc, match, score):
+                if doc not in seen and self.docs[doc] is not None and len(results) < limit:
+                    seen.add(doc); barcode, name, location = self.docs[doc]
+                    results.append({'barcode': barcode, 'name': name, 'location': location, 'match': match, 'score': round(score, 3)})
+            if query in self.by_barcode: add(self.by_barcode[query], 'exact', 1.0)
+            for doc in self._prefix_barcodes(query, limit): add(doc, 'prefix', 0.9)
+            words = query.lower().split()
+            if len(results) < limit:
+                for doc in self._prefix_names(words, limit): add(doc, 'name', 0.8)
+            if not results and len(query) >= 3: # ไม่เจอแบบตรง / ขึ้นต้นด้วย -> แนะนำตัวที่ใกล้เคียง
+                for score, doc in self._fuzzy(query, limit): add(doc, 'fuzzy', score)
+            return results
@@ -0,0 +1,263 @@
+"""Index ในเครื่องของ Folder / รูปทั้งหมดใต้ MAIN_FOLDER_ID (ค้นหาย้อนหลังได้โดยไม่ต้อง list Drive)
+
+ครั้งแรกเดินทั้ง tree หนึ่งรอบ (commit ทีละชุด Folder, ล้มกลางทางทำต่อจากคิวที่เก็บไว้) จากนั้นอ่านเฉพาะสิ่งที่เปลี่ยนจาก Drive changes feed
+โดยเก็บ page token ไว้ในไฟล์ SQLite เดียวกับ index (ปิด/เปิด process ใหม่แล้วทำต่อจากจุดเดิม)
+
+รองรับทั้งโครงสร้าง MAIN/YYYY/MM/DD-MM-YYYY/{order}_{HH-MM} และ MAIN/DD-MM-YYYY/{order}_{HH-MM}
+ชื่อพนักงานมาจาก Logs / Rider_Logs (ingest_log_rows) เพราะไฟล์บน Drive อัปโหลดด้วยบัญชีเดียวกันหมด
+
+    python drive_mirror.py search --order B01 --from 2026-10-01 --to 2026-10-19 --picker "Somchai"
+    python drive_mirror.py stats
+"""
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+FILE_FIELDS = "id, name, mimeType, parents, trashed, createdTime, modifiedTime, size"
+PARENTS_PER_QUERY = 40 # จำนวน Folder ต่อ 1 query ตอนเดิน tree ('a' in parents or 'b' in parents ...)
+PICKER_DAY_WINDOW = 3 # Log ของ Order นับว่าเป็นของ Folder นั้นถ้าห่างจากวันที่ Folder ไม่เกินกี่วัน (ส่ง Rider ข้ามวัน)
+
+_DATE_RE = re.compile(r"(\d{2})-(\d{2})-(\d{4})")
+_ORDER_RE = re.compile(r"(.+)_(\d{2}-\d{2})")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY, parent_id TEXT, name TEXT, kind TEXT, order_id TEXT, order_date TEXT,
+    created TEXT, modified TEXT, size INTEGER);
+CREATE INDEX IF NOT EXISTS items_parent ON items (parent_id);
+CREATE INDEX IF NOT EXISTS items_order ON items (kind, order_id);
+CREATE INDEX IF NOT EXISTS items_date ON items (kind, order_date);
+CREATE TABLE IF NOT EXISTS pickers (
+    order_id TEXT, day TEXT, picker TEXT, role TEXT, PRIMARY KEY (order_id, day, picker, role));
+CREATE INDEX IF NOT EXISTS pickers_picker ON pickers (picker, day);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def classify(name, mime, parent):
+    # parent = (kind, order_id, order_date) ของ Folder แม่ -> (kind, order_id, order_date) ของรายการนี้
+    parent_kind, parent_order, parent_date = parent
+    if mime == FOLDER_MIME:
+        m = _DATE_RE.fullmatch(name)
+        if m: return "date", None, f"{m.group(3)}-{m.group(2)}-{m.group(1)}"
+        if parent_kind == "date":
+            m = _ORDER_RE.fullmatch(name)
+            return "order", (m.group(1) if m else name).upper(), parent_date
+        return "folder", None, None
+    if parent_kind == "order":
+        if name.startswith("RIDER_"): return "rider", parent_order, parent_date
+        if "_PACKED_" in name: return "packed", parent_order, parent_date
+    return "file", parent_order, parent_date
+
+
+class DriveMirror:
+    def __init__(self, path, root_id):
+        self.path = path; self.root_id = root_id
+        self._local = threading.local(); self._write_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn, *args):
+        with self._write_lock:
+            conn = self._conn(); conn.execute("BEGIN IMMEDIATE")
+            try: result = fn(conn, *args); conn.execute("COMMIT"); return result
+            except BaseException: conn.execute("ROLLBACK"); raise
+
+    # --- STATE ---
+    def get_state(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_state(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def set_state(self, key, value): self._transaction(self._set_state, key, value)
+
+    # --- INDEX ---
+    def _parent_info(self, conn, parent_id):
+        if parent_id == self.root_id: return ("root", None, None)
+        return conn.execute("SELECT kind, order_id, order_date FROM items WHERE id = ?", (parent_id,)).fetchone()
+
+    def _upsert(self, conn, f, parent_id, parent):
+        kind, order_id, order_date = classify(f["name"], f.get("mimeType"), parent)
+        conn.execute("INSERT OR REPLACE INTO items (id, parent_id, name, kind, order_id, order_date, created, modified, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (f["id"], parent_id, f["name"], kind, order_id, order_date, f.get("createdTime"), f.get("modifiedTime"), int(f.get("size") or 0)))
+        return kind, order_id, order_date
+
+    def _delete(self, conn, file_id):
+        # ลบรายการและทุกอย่างที่อยู่ข้างใต้ (Folder ถูกลบ / ย้ายออกนอก MAIN_FOLDER_ID)
+        conn.execute("WITH RECURSIVE sub(id) AS (SELECT ? UNION ALL SELECT items.id FROM items JOIN sub ON items.parent_id = sub.id) "
+                     "DELETE FROM items WHERE id IN (SELECT id FROM sub)", (file_id,))
+
+    def _reclassify_children(self, conn, folder_id, info):
+        # Folder เปลี่ยนชื่อ/ย้ายที่ -> คำนวณประเภทของรายการข้างใต้ใหม่จาก index (ไม่เรียก Drive)
+        for cid, name, kind in conn.execute("SELECT id, name, kind FROM items WHERE parent_id = ?", (folder_id,)).fetchall():
+            mime = FOLDER_MIME if kind in ("date", "order", "folder") else None
+            child = classify(name, mime, info)
+            conn.execute("UPDATE items SET kind = ?, order_id = ?, order_date = ? WHERE id = ?", (*child, cid))
+            if mime: self._reclassify_children(conn, cid, child)
+
+    def _list_children(self, service, batch):
+        # รายการที่อยู่ใต้ Folder ชุดหนึ่ง (รวมหลาย Folder ต่อ 1 query เพื่อลดจำนวนครั้งที่เรียก Drive) -> (files, จำนวนครั้งที่เรียก)
+        q = "(" + " or ".join(f"'{fid}' in parents" for fid in batch) + ") and trashed = false"
+        files = []; calls = 0; page_token = None
+        while True:
+            res = service.files().list(q=q, fields=f"nextPageToken, files({FILE_FIELDS})", pageSize=1000, pageToken=page_token).execute(); calls += 1
+            files += res.get("files", []); page_token = res.get("nextPageToken")
+            if not page_token: return files, calls
+
+    def _store_children(self, conn, batch, files):
+        # บันทึกรายการลง index -> Folder ใหม่ที่ต้องเดินต่อ
+        parents = {fid: self._parent_info(conn, fid) for fid in batch}; folders = []
+        for f in files:
+            parent_id = next((p for p in f.get("parents", []) if p in parents), None)
+            if parent_id is None or parents[parent_id] is None: continue
+            self._upsert(conn, f, parent_id, parents[parent_id])
+            if f.get("mimeType") == FOLDER_MIME: folders.append(f["id"])
+        return folders
+
+    def _walk(self, conn, service, folder_ids):
+        # เดิน tree แบบ BFS ภายใน transaction ของผู้เรียก (Folder ใหม่จาก changes feed: tree เล็ก)
+        queue = list(folder_ids); calls = 0
+        while queue:
+            batch, queue = queue[:PARENTS_PER_QUERY], queue[PARENTS_PER_QUERY:]
+            files, n = self._list_children(service, batch); calls += n
+            queue += self._store_children(conn, batch, files)
+        return calls
+
+    def bootstrap(self, service):
+        # เดินทั้ง tree ทีละชุด Folder: แต่ละชุด commit พร้อมคิว Folder ที่เหลือใน state (ไม่ถือ write lock ระหว่างเรียก Drive)
+        # ล้มกลางทาง = รอบหน้าทำต่อจากคิวเดิม; ขอ token ก่อนเดิน: อะไรที่เปลี่ยนระหว่างเดินจะถูกอ่านซ้ำจาก changes feed
+        boot = self.get_state("bootstrap")
+        if boot is None:
+            boot = {'token': service.changes().getStartPageToken().execute()["startPageToken"], 'queue': [self.root_id]}
+            def _start(conn): conn.execute("DELETE FROM items"); self._set_state(conn, "bootstrap", boot)
+            self._transaction(_start)
+        calls = 0
+        while boot['queue']:
+            batch = boot['queue'][:PARENTS_PER_QUERY]
+            files, n = self._list_children(service, batch); calls += n
+            def _store(conn):
+                queue = boot['queue'][len(batch):] + self._store_children(conn, batch, files)
+                self._set_state(conn, "bootstrap", {'token': boot['token'], 'queue': queue}); return queue
+            boot['queue'] = self._transaction(_store)
+        def _finish(conn):
+            self._set_state(conn, "page_token", boot['token']); self._set_state(conn, "last_sync", time.time())
+            conn.execute("DELETE FROM state WHERE key = 'bootstrap'")
+        self._transaction(_finish)
+        return calls
+
+    def _apply_change(self, conn, change, new_folders):
+        f = change.get("file"); file_id = change.get("fileId")
+        if change.get("removed") or not f or f.get("trashed"): self._delete(conn, file_id); return
+        parent_id = next(iter(f.get("parents") or []), None)
+        parent = self._parent_info(conn, parent_id) if parent_id else None
+        if parent is None: self._delete(conn, file_id); return # ไม่ได้อยู่ใต้ MAIN_FOLDER_ID
+        before = conn.execute("SELECT kind, order_id, order_date FROM items WHERE id = ?", (file_id,)).fetchone()
+        info = self._upsert(conn, f, parent_id, parent)
+        if f.get("mimeType") != FOLDER_MIME: return
+        if before is None: new_folders.append(file_id) # Folder ใหม่ / ย้ายเข้ามาพร้อมของข้างใน
+        elif tuple(before) != info: self._reclassify_children(conn, file_id, info)
+
+    def sync(self, service):
+        # อ่าน changes feed ต่อจาก token ที่เก็บไว้ -> จำนวน change ที่อ่าน (ยังไม่มี token = bootstrap)
+        if self.get_state("page_token") is None: self.bootstrap(service); return 0
+        applied = 0
+        while True:
+            token = self.get_state("page_token")
+            res = service.changes().list(pageToken=token, spaces="drive", includeRemoved=True, pageSize=1000,
+                                         fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))").execute()
+            def _run(conn):
+                new_folders = []
+                for change in res.get("changes", []): self._apply_change(conn, change, new_folders)
+                if new_folders: self._walk(conn, service, new_folders)
+                # index และ token อยู่ใน transaction เดียวกัน: ถ้าหยุดกลางทางจะอ่าน page นี้ใหม่ทั้งหน้า
+                self._set_state(conn, "page_token", res.get("nextPageToken") or res["newStartPageToken"])
+                self._set_state(conn, "last_sync", time.time())
+            self._transaction(_run); applied += len(res.get("changes", []))
+            if "newStartPageToken" in res: return applied
+
+    def ingest_log_rows(self, rows, cursor_key, cursor):
+        # rows = [(timestamp, ชื่อพนักงาน, order_id, role), ...] จาก Log, cursor เก็บใน state ชื่อ cursor_key ใน transaction เดียวกัน
+        def _run(conn):
+            conn.executemany("INSERT OR IGNORE INTO pickers (order_id, day, picker, role) VALUES (?, ?, ?, ?)",
+                             [(str(o).strip().upper(), str(ts)[:10], str(p).strip(), role) for ts, p, o, role in rows if o and p])
+            self._set_state(conn, cursor_key, cursor)
+        self._transaction(_run)
+
+    # --- SEARCH ---
+    def search(self, order_id=None, start_date=None, end_date=None, picker=None, limit=200):
+        # คืน Folder ของ Order (ใหม่สุดก่อน) พร้อมรูป PACKED / RIDER และชื่อพนักงาน; order_id ค้นแบบขึ้นต้นด้วย
+        source = "items o"; where = ["o.kind = 'order'"]; args = []
+        if picker:
+            # เริ่มจากแถวของพนักงานคนนั้น (index picker, day) แล้ว join ไปหา Folder แทนการไล่ทุก Folder ในช่วงวันที่
+            source = "pickers p JOIN items o ON o.kind = 'order' AND o.order_id = p.order_id"
+            where.append(f"p.picker = ? AND p.day BETWEEN o.order_date AND date(o.order_date, '+{PICKER_DAY_WINDOW} day')"); args.append(picker.strip())
+            if start_date: where.append("p.day >= ?"); args.append(str(start_date))
+            if end_date: where.append(f"p.day <= date(?, '+{PICKER_DAY_WINDOW} day')"); args.append(str(end_date))
+        if order_id:
+            prefix = order_id.strip().upper(); where.append("o.order_id >= ? AND o.order_id < ?"); args += [prefix, prefix + "\uffff"]
+        if start_date: where.append("o.order_date >= ?"); args.append(str(start_date))
+        if end_date: where.append("o.order_date <= ?"); args.append(str(end_date))
+        conn = self._conn()
+        folders = conn.execute(f"SELECT DISTINCT o.id, o.name, o.order_id, o.order_date, o.created FROM {source} WHERE {' AND '.join(where)} "
+                               "ORDER BY o.order_date DESC, o.name DESC LIMIT ?", args + [limit]).fetchall()
+        if not folders: return []
+        ids = [f[0] for f in folders]; marks = ",".join("?" * len(ids))
+        photos = {}
+        for parent_id, fid, name, kind, created, size in conn.execute(
+                f"SELECT parent_id, id, name, kind, created, size FROM items WHERE parent_id IN ({marks}) ORDER BY name", ids):
+            photos.setdefault(parent_id, []).append({"id": fid, "name": name, "kind": kind, "created": created, "size": size})
+        orders = sorted({f[2] for f in folders}); names = {}
+        for oid, day, who, role in conn.execute(f"SELECT order_id, day, picker, role FROM pickers WHERE order_id IN ({','.join('?' * len(orders))})", orders):
+            names.setdefault(oid, []).append((day, who, role))
+        results = []
+        for fid, name, oid, odate, created in folders:
+            last_day = (datetime.strptime(odate, "%Y-%m-%d") + timedelta(days=PICKER_DAY_WINDOW)).strftime("%Y-%m-%d")
+            people = sorted({(who, role) for day, who, role in names.get(oid, []) if odate <= day <= last_day})
+            items = photos.get(fid, [])
+            results.append({"folder_id": fid, "folder_name": name, "order_id": oid, "date": odate, "created": created,
+                            "packed": [p for p in items if p["kind"] == "packed"], "rider": [p for p in items if p["kind"] == "rider"],
+                            "pickers": [who for who, role in people if role == "PACK"], "riders": [who for who, role in people if role == "RIDER"]})
+        return results
+
+    def list_pickers(self):
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT picker FROM pickers ORDER BY picker")]
+
+    def stats(self):
+        counts = dict(self._conn().execute("SELECT kind, COUNT(*) FROM items GROUP BY kind").fetchall())
+        return {"orders": counts.get("order", 0), "packed": counts.get("packed", 0), "rider": counts.get("rider", 0),
+                "items": sum(counts.values()), "last_sync": self.get_state("last_sync")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ค้นหา Folder / รูปของ Order จาก index ในเครื่อง")
+    parser.add_argument("--db", default="drive_mirror.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_search = sub.add_parser("search")
+    p_search.add_argument("--order"); p_search.add_argument("--from", dest="start"); p_search.add_argument("--to", dest="end")
+    p_search.add_argument("--picker"); p_search.add_argument("--limit", type=int, default=50)
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+    mirror = DriveMirror(args.db, root_id=None)
+    if args.command == "stats": print(json.dumps(mirror.stats(), ensure_ascii=False, indent=2)); return
+    t0 = time.perf_counter()
+    results = mirror.search(args.order, args.start, args.end, args.picker, args.limit)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"{len(results)} folder ใน {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""ชั้น I/O แบบ asyncio สำหรับ Drive / Sheets: event loop เดียวทั้ง process + pool ของ client (HTTP connection)
+
+- event loop ตัวเดียวรันใน thread ของตัวเอง ทุกคำสั่ง Google เป็น coroutine มี timeout และยกเลิกได้
+- google-api-python-client / gspread เป็น blocking: แต่ละคำสั่งยืม client จาก pool (connection keep-alive ใช้ซ้ำ)
+  แล้วรันใน executor ขนาดเท่า pool -> ทั้ง process ใช้ thread I/O ไม่เกิน pool_size ไม่ว่าจะมีกี่ session
+  และงานที่ไม่ขึ้นกันใน rerun เดียว (เช่น อัปรูปหลายรูป) ยิงพร้อมกันได้
+- code เดิมเรียกผ่าน run() / gather() แบบ sync
+
+    io = GoogleIO(lambda: {'drive': build_from_document(doc, credentials=creds), 'sheet': gspread.authorize(creds).open_by_key(SHEET_ID)})
+    file_id = io.run(io.upload_file(data, "A_Img1.jpg", folder_id))
+    ids = io.gather(*(io.upload_file(d, n, folder_id) for d, n in photos))
+"""
+import asyncio
+import concurrent.futures
+import io
+import threading
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 60
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+
+class GoogleIO:
+    def __init__(self, client_factory, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.client_factory = client_factory; self.pool_size = pool_size; self.timeout = timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(pool_size, thread_name_prefix="google-io")
+        self._clients = asyncio.Queue(); self._client_count = 0
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="google-io-loop", daemon=True).start()
+
+    # --- CLIENT POOL (client ไม่ใช้ข้าม thread พร้อมกัน: ยืมแล้วคืนเมื่องานใน thread เสร็จจริง) ---
+    async def _acquire(self):
+        if self._clients.empty() and self._client_count < self.pool_size:
+            self._client_count += 1
+            try: return await self.loop.run_in_executor(self._executor, self.client_factory)
+            except BaseException:
+                self._client_count -= 1; raise
+        return await self._clients.get()
+
+    def _release(self, client, job):
+        if not job.cancelled(): job.exception() # งานที่หมดเวลาไปแล้ว: อ่าน exception ทิ้ง ไม่ให้ asyncio เตือน
+        self._clients.put_nowait(client)
+
+    async def call(self, fn, timeout=None):
+        # fn(client) รันใน executor; หมดเวลา / ถูกยกเลิก -> คนรอได้ error ทันที, client กลับเข้า pool เมื่อ fn จบจริง
+        client = await self._acquire()
+        job = self.loop.run_in_executor(self._executor, fn, client)
+        job.add_done_callback(lambda j: self._release(client, j))
+        try: return await asyncio.wait_for(asyncio.shield(job), timeout or self.timeout)
+        except asyncio.TimeoutError: raise TimeoutError(f"Google I/O เกิน {timeout or self.timeout} วินาที") from None
+
+    # --- SYNC WRAPPER (เรียกจาก script thread) ---
+    def run(self, coro, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try: return future.result(timeout)
+        except BaseException:
+            future.cancel(); raise # รอไม่ไหว / rerun ถูกหยุด -> ยกเลิก coroutine ด้วย
+
+    def gather(self, *coros, return_exceptions=False, timeout=None):
+        async def _all(): return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+        return self.run(_all(), timeout)
+
+    # --- DRIVE ---
+    async def list_files(self, q, fields="files(id)", order_by=None, timeout=None):
+        def _list(c):
+            kwargs = {'q': q, 'fields': fields}
+            if order_by: kwargs['orderBy'] = order_by
+            return c['drive'].files().list(**kwargs).execute().get('files', [])
+        return await self.call(_list, timeout)
+
+    async def create_folder(self, name, parent_id, timeout=None):
+        meta = {'name': name, 'parents': [parent_id], 'mimeType': FOLDER_MIME}
+        return await self.call(lambda c: c['drive'].files().create(body=meta, fields='id').execute().get('id'), timeout)
+
+    async def upload_file(self, data, filename, folder_id, mimetype='image/jpeg', timeout=None):
+        def _upload(c):
+            from googleapiclient.http import MediaIoBaseUpload
+            body = io.BytesIO(data) if isinstance(data, bytes) else data
+            media = MediaIoBaseUpload(body, mimetype=mimetype, chunksize=1024 * 1024, resumable=True)
+            return c['drive'].files().create(body={'name': filename, 'parents': [folder_id]}, media_body=media, fields='id').execute().get('id')
+        return await self.call(_upload, timeout)
+
+    # --- SHEETS ---
+    @staticmethod
+    def _worksheet(c, name, headers):
+        import gspread
+        worksheets = c.setdefault('worksheets', {})
+        if name not in worksheets:
+            try: worksheets[name] = c['sheet'].worksheet(name)
+            except gspread.WorksheetNotFound:
+                try: ws = c['sheet'].add_worksheet(title=name, rows="1000", cols=str(len(headers)))
+                except gspread.exceptions.APIError: ws = c['sheet'].worksheet(name) # client อื่นสร้างไปพร้อมกันแล้ว
+                else: ws.append_row(list(headers))
+                worksheets[name] = ws
+        return worksheets[name]
+
+    async def append_row(self, sheet_name, headers, row, timeout=None):
+        def _append(c):
+            try: self._worksheet(c, sheet_name, headers).append_row(list(row))
+            except Exception:
+                c.get('worksheets', {}).pop(sheet_name, None); raise
+        return await self.call(_append, timeout)
+
+    @staticmethod
+    def _open(c, sheet): return c['sheet'].get_worksheet(sheet) if isinstance(sheet, int) else c['sheet'].worksheet(sheet)
+
+    async def get_all_values(self, sheet, timeout=None):
+        # sheet: ชื่อ หรือ index (0 = Sheet แรก เช่น catalog)
+        return await self.call(lambda c: self._open(c, sheet).get_all_values(), timeout)
+
+    async def get_values(self, sheet, a1_range, headers=None, timeout=None):
+        # อ่านเฉพาะช่วง เช่น "A120:I" (แถวหลัง cursor), ส่ง headers = สร้าง Sheet ให้ถ้ายังไม่มี
+        return await self.call(lambda c: (self._worksheet(c, sheet, headers) if headers else self._open(c, sheet)).get(a1_range), timeout)
+
+    async def get_cells(self, sheet, cells, timeout=None):
+        # อ่านหลายช่องที่กระจายกันใน request เดียว -> {"H12": "5", ...} (ช่องว่าง = "")
+        def _get(c):
+            ranges = self._open(c, sheet).batch_get(list(cells))
+            return {a1: (r[0][0] if r and r[0] else "") for a1, r in zip(cells, ranges)}
+        return await self.call(_get, timeout)
+
+    async def worksheet_titles(self, timeout=None):
+        return await self.call(lambda c: [ws.title for ws in c['sheet'].worksheets()], timeout)
+
+    async def update_cells(self, sheet, values, timeout=None):
+        # values: {"H12": 5, ...} เขียนทุกช่องใน request เดียว
+        return await self.call(lambda c: self._open(c, sheet).batch_update([{'range': a1, 'values': [[v]]} for a1, v in values.items()]), timeout)
+
+    async def append_rows(self, sheet_name, headers, rows, timeout=None):
+        def _append(c):
+            try: self._worksheet(c, sheet_name, headers).append_rows([list(r) for r in rows])
+            except Exception:
+                c.get('worksheets', {}).pop(sheet_name, None); raise
+        return await self.call(_append, timeout)
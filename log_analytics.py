@@ -0,0 +1,88 @@
+"""Analytics ของ Logs / Rider_Logs: cache แบบ columnar ต่อ shard รายเดือน อ่านเฉพาะแถวที่เพิ่มมาใหม่
+
+- shard ที่ archive เป็น Parquet แล้ว: อ่านไฟล์ครั้งเดียวแล้วไม่อ่านซ้ำ
+- shard อื่น: เก็บ cursor (จำนวนแถวที่อ่านแล้วรวม header) แล้วดึงเฉพาะแถวหลัง cursor
+- shard ของเดือนที่ผ่านไปแล้วจะถือว่าปิดก็ต่อเมื่อไม่มีแถวค้างใน LogStore (ส่งขึ้น Sheet ครบแล้ว) ก่อนอ่านรอบนั้น
+  ไม่อย่างนั้นแถวที่ replicator ส่งขึ้นทีหลัง (Sheets ล่มข้ามสิ้นเดือน) จะไม่ถูกนับ
+
+    analytics = LogAnalytics(read_rows, archive_path, current_month, pending=store.pending)
+    df = analytics.load("Logs", LOG_HEADERS, start_date, end_date)
+    compute_picker_throughput(df)
+"""
+import os
+import threading
+
+import pandas as pd
+
+
+def shard_name(base_name, month_key): return f"{base_name}_{month_key}"
+
+
+def prepare_log_frame(df):
+    df = df.copy()
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+    if 'Pick Qty' in df.columns: df['Pick Qty'] = pd.to_numeric(df['Pick Qty'], errors='coerce').fillna(0)
+    return df
+
+
+def _empty_frame(headers): return prepare_log_frame(pd.DataFrame(columns=list(headers)))
+
+
+class LogAnalytics:
+    def __init__(self, read_rows, archive_path, current_month, pending=None):
+        # read_rows(shard_name, headers, start_row) -> แถวของ Sheet ตั้งแต่แถว start_row ([] ถ้ายังไม่มี Sheet)
+        # archive_path(shard_name) -> ไฟล์ Parquet, current_month() -> "YYYY_MM", pending(shard_name) -> แถวที่ยังไม่ขึ้น Sheet
+        self.read_rows = read_rows; self.archive_path = archive_path; self.current_month = current_month
+        self.pending = pending or (lambda shard: 0)
+        self._lock = threading.Lock(); self._shards = {} # shard_name -> {'df', 'cursor', 'closed'}
+
+    def _refresh(self, base_name, headers, month_key):
+        name = shard_name(base_name, month_key); entry = self._shards.get(name)
+        if entry and entry['closed']: return entry['df']
+        path = self.archive_path(name)
+        if os.path.exists(path):
+            entry = {'df': prepare_log_frame(pd.read_parquet(path)), 'cursor': 0, 'closed': True}
+        else:
+            settled = month_key < self.current_month() and not self.pending(name) # ตรวจก่อนอ่าน: อ่านรอบนี้แล้วได้ครบแน่นอน
+            entry = entry or {'df': _empty_frame(headers), 'cursor': 1, 'closed': False}
+            rows = self.read_rows(name, headers, entry['cursor'] + 1)
+            if rows:
+                new_df = pd.DataFrame([list(r) + [''] * (len(headers) - len(r)) for r in rows], columns=list(headers))
+                entry = {'df': pd.concat([entry['df'], prepare_log_frame(new_df)], ignore_index=True), 'cursor': entry['cursor'] + len(rows)}
+            entry['closed'] = settled
+        self._shards[name] = entry
+        return entry['df']
+
+    def load(self, base_name, headers, start_date, end_date):
+        # เดือนที่ปิดแล้วโหลดครั้งเดียว, เดือนที่ยังเปิดดึงเฉพาะแถวหลัง cursor
+        frames = []; year, month = start_date.year, start_date.month
+        with self._lock:
+            while (year, month) <= (end_date.year, end_date.month):
+                frames.append(self._refresh(base_name, headers, f"{year:04d}_{month:02d}"))
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        df = pd.concat(frames, ignore_index=True) if frames else _empty_frame(headers)
+        start_ts = pd.Timestamp(start_date); end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        return df[(df['Timestamp'] >= start_ts) & (df['Timestamp'] < end_ts)]
+
+
+def compute_picker_throughput(df_logs):
+    # จำนวนชิ้นต่อชั่วโมงทำงาน (นับเฉพาะชั่วโมงที่มีการเบิกจริง)
+    if df_logs.empty: return pd.DataFrame(columns=['Picker Name', 'Items', 'Orders', 'Active Hours', 'Items/Hour'])
+    out = df_logs.assign(Hour=df_logs['Timestamp'].dt.floor('h')).groupby('Picker Name').agg(
+        Items=('Pick Qty', 'sum'), Orders=('Order ID', 'nunique'), **{'Active Hours': ('Hour', 'nunique')})
+    out['Items/Hour'] = (out['Items'] / out['Active Hours']).round(1)
+    return out.sort_values('Items/Hour', ascending=False).reset_index()
+
+
+def compute_handover_latency(df_logs, df_rider):
+    # เวลาจากแพ็คเสร็จ (Log แรกของ Order) ถึงส่ง Rider (Rider Log แรกของ Order)
+    packed = df_logs.groupby('Order ID')['Timestamp'].min().rename('Packed At')
+    handed = df_rider.groupby('Order ID')['Timestamp'].min().rename('Rider At')
+    out = pd.concat([packed, handed], axis=1, join='inner')
+    out['Latency (min)'] = ((out['Rider At'] - out['Packed At']).dt.total_seconds() / 60).round(1)
+    return out[out['Latency (min)'] >= 0].sort_values('Latency (min)', ascending=False).reset_index()
+
+
+def compute_busiest_locations(df_logs, top_n=20):
+    out = df_logs.groupby('Location').agg(Picks=('Order ID', 'size'), Items=('Pick Qty', 'sum'))
+    return out.sort_values('Items', ascending=False).head(top_n).reset_index()
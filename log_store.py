@@ -0,0 +1,169 @@
+"""Log หลักในเครื่อง (SQLite WAL) แล้วทยอยส่งขึ้น Google Sheets ใน background
+
+- บันทึก Log = commit ลงไฟล์ในเครื่องไม่กี่ ms: picker ไม่ต้องรอ Sheets และแถวไม่หายแม้ Sheets ล่ม
+- แต่ละแถวมี key (เช่น submission + ลำดับรายการ) กดซ้ำ / rerun ซ้ำได้แถวเดียว
+- replicator อ่านแถวหลัง cursor ทีละ batch, รวมแถวที่ติดกันของ Sheet เดียวกันเป็น append_rows ครั้งเดียว
+  แล้วเลื่อน cursor (เก็บในไฟล์เดียวกัน) หลังส่งสำเร็จเท่านั้น: ปิด/เปิด process ใหม่แล้วส่งต่อจากจุดเดิม
+  (ถ้า process ตายหลัง Sheets รับแล้วแต่ก่อนเลื่อน cursor แถวชุดนั้นจะถูกส่งซ้ำ: at-least-once, ไม่มีหาย)
+- หลาย process ใช้ไฟล์เดียวกันได้: มี lease ให้ส่งขึ้น Sheets ได้ทีละ process
+  ทุกครั้งที่เลื่อน cursor จะตรวจ + ต่ออายุ lease ใน transaction เดียวกัน และ cursor เลื่อนไปข้างหน้าเท่านั้น
+
+    store = LogStore("log_store.db", {"Logs": LOG_HEADERS, "Rider_Logs": RIDER_HEADERS})
+    store.append("Logs", "Logs_2026_10", row, key="PACK_ab12:0")
+    LogReplicator(store, lambda shard, headers, rows: ws(shard, headers).append_rows(rows)).start()
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+REPLICATE_INTERVAL = 5
+REPLICATE_BATCH = 500
+LEASE_TTL = 60
+
+
+class LeaseLost(RuntimeError):
+    """process อื่นได้ lease ไประหว่างส่ง (เช่น process นี้ค้างนานเกิน ttl): หยุดส่ง ไม่เลื่อน cursor"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_rows (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, base_name TEXT NOT NULL, shard TEXT NOT NULL, row TEXT NOT NULL,
+    key TEXT UNIQUE, created REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS log_rows_shard ON log_rows (shard, seq);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class LogStore:
+    def __init__(self, path, schemas):
+        # schemas: base_name -> headers (แถวต้องมีจำนวนคอลัมน์ตรงกับ headers)
+        self.path = path; self.schemas = {k: tuple(v) for k, v in schemas.items()}
+        self._local = threading.local(); self._write_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=FULL") # commit แล้วต้องไม่หายแม้ไฟดับ
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn, *args):
+        with self._write_lock:
+            conn = self._conn(); conn.execute("BEGIN IMMEDIATE")
+            try: result = fn(conn, *args); conn.execute("COMMIT"); return result
+            except BaseException: conn.execute("ROLLBACK"); raise
+
+    # --- STATE (cursor, lease) ---
+    def get_state(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_state(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def set_state(self, key, value): self._transaction(self._set_state, key, value)
+
+    # --- WRITE ---
+    def append_many(self, base_name, shard, rows, keys=None):
+        # บันทึกหลายแถวใน transaction เดียว -> seq ของแถวที่เพิ่มจริง (แถวที่ key ซ้ำถูกข้าม)
+        headers = self.schemas[base_name]; rows = [list(r) for r in rows]; keys = keys or [None] * len(rows)
+        for r in rows:
+            if len(r) != len(headers): raise ValueError(f"{base_name}: ต้องมี {len(headers)} คอลัมน์ ได้ {len(r)}")
+        def _run(conn):
+            seqs = []; now = time.time()
+            for r, k in zip(rows, keys):
+                cur = conn.execute("INSERT OR IGNORE INTO log_rows (base_name, shard, row, key, created) VALUES (?, ?, ?, ?, ?)",
+                                   (base_name, shard, json.dumps(r, ensure_ascii=False, default=str), k, now))
+                if cur.rowcount: seqs.append(cur.lastrowid)
+            return seqs
+        return self._transaction(_run)
+
+    def append(self, base_name, shard, row, key=None):
+        seqs = self.append_many(base_name, shard, [row], [key])
+        return seqs[0] if seqs else None
+
+    # --- READ ---
+    def cursor(self): return self.get_state("cursor", 0)
+
+    def pending(self, shard=None):
+        # จำนวนแถวที่ยังไม่ได้ขึ้น Sheets (ทั้งหมด หรือเฉพาะ shard)
+        if shard is None: return self._conn().execute("SELECT COUNT(*) FROM log_rows WHERE seq > ?", (self.cursor(),)).fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM log_rows WHERE shard = ? AND seq > ?", (shard, self.cursor())).fetchone()[0]
+
+    def rows(self, shard, after_seq=0, limit=None):
+        # แถวของ shard ในเครื่อง (รวมที่ยังไม่ขึ้น Sheets) -> [(seq, row), ...]
+        sql = "SELECT seq, row FROM log_rows WHERE shard = ? AND seq > ? ORDER BY seq" + (" LIMIT ?" if limit else "")
+        args = (shard, after_seq, limit) if limit else (shard, after_seq)
+        return [(seq, json.loads(row)) for seq, row in self._conn().execute(sql, args)]
+
+    def tail(self, after_seq=0, limit=REPLICATE_BATCH):
+        # แถวทุก shard หลัง seq (เรียงตาม seq) -> [(seq, base_name, shard, row), ...] สำหรับผู้อ่านที่เก็บ cursor เอง
+        return [(seq, base_name, shard, json.loads(row)) for seq, base_name, shard, row in self._conn().execute(
+            "SELECT seq, base_name, shard, row FROM log_rows WHERE seq > ? ORDER BY seq LIMIT ?", (after_seq, limit))]
+
+    def stats(self):
+        oldest = self._conn().execute("SELECT MIN(created) FROM log_rows WHERE seq > ?", (self.cursor(),)).fetchone()[0]
+        return {'rows': self._conn().execute("SELECT COUNT(*) FROM log_rows").fetchone()[0], 'pending': self.pending(),
+                'cursor': self.cursor(), 'lag_seconds': round(time.time() - oldest, 1) if oldest else 0.0,
+                'last_error': self.get_state("last_error")}
+
+    # --- REPLICATION ---
+    def claim_lease(self, owner, ttl=LEASE_TTL):
+        # process เดียวที่ถือ lease ส่งขึ้น Sheets ได้ (ต่ออายุทุกรอบ, ตายแล้ว lease หมดอายุเอง)
+        def _run(conn):
+            lease = self.get_state("lease"); now = time.time()
+            if lease and lease['owner'] != owner and lease['expires'] > now: return False
+            self._set_state(conn, "lease", {'owner': owner, 'expires': now + ttl}); return True
+        return self._transaction(_run)
+
+    def _advance(self, conn, seq, owner, ttl):
+        # เลื่อน cursor เฉพาะไปข้างหน้า; owner = ต้องยังถือ lease อยู่ (ต่ออายุไปในตัว) ไม่อย่างนั้น LeaseLost
+        if owner is not None:
+            lease = self.get_state("lease")
+            if not lease or lease['owner'] != owner: raise LeaseLost(f"lease ถูก {lease and lease['owner']} ถือแทนแล้ว")
+            self._set_state(conn, "lease", {'owner': owner, 'expires': time.time() + ttl})
+        if seq > self.get_state("cursor", 0): self._set_state(conn, "cursor", seq)
+
+    def replicate_once(self, push, batch_size=REPLICATE_BATCH, owner=None, ttl=LEASE_TTL):
+        # push(shard, headers, rows) ส่งแถวชุดหนึ่งขึ้น Sheets -> จำนวนแถวที่ส่งสำเร็จ (owner = เจ้าของ lease ที่ต้องถืออยู่ตลอด)
+        batch = self._conn().execute("SELECT seq, base_name, shard, row FROM log_rows WHERE seq > ? ORDER BY seq LIMIT ?",
+                                     (self.cursor(), batch_size)).fetchall()
+        sent = 0; i = 0
+        while i < len(batch):
+            j = i
+            while j < len(batch) and batch[j][2] == batch[i][2]: j += 1 # แถวติดกันของ Sheet เดียวกัน
+            base_name, shard = batch[i][1], batch[i][2]
+            push(shard, self.schemas[base_name], [json.loads(r[3]) for r in batch[i:j]])
+            self._transaction(self._advance, batch[j - 1][0], owner, ttl); sent += j - i; i = j
+        return sent
+
+
+class LogReplicator:
+    def __init__(self, store, push, interval=REPLICATE_INTERVAL, batch_size=REPLICATE_BATCH):
+        self.store = store; self.push = push; self.interval = interval; self.batch_size = batch_size
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"; self._wake = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="log-replicator", daemon=True).start()
+        return self
+
+    def notify(self): self._wake.set() # มีแถวใหม่: ส่งเลยไม่ต้องรอรอบ
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval); self._wake.clear()
+            ttl = max(LEASE_TTL, self.interval * 3)
+            try:
+                if not self.store.claim_lease(self.owner, ttl): continue
+                while self.store.replicate_once(self.push, self.batch_size, self.owner, ttl) == self.batch_size: pass
+                if self.store.get_state("last_error"): self.store.set_state("last_error", None)
+            except LeaseLost as e: print(f"ℹ️ หยุดส่ง Log: {e}") # process ที่ถือ lease ใหม่ส่งต่อจาก cursor เอง
+            except Exception as e:
+                print(f"⚠️ ส่ง Log ขึ้น Sheets ไม่สำเร็จ (จะลองใหม่): {e}")
+                try: self.store.set_state("last_error", f"{time.strftime('%H:%M:%S')} {e}")
+                except Exception: pass
+                time.sleep(self.interval) # Sheets ล่ม: ไม่ลองถี่ตาม notify ของทุกแถวใหม่
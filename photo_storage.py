@@ -0,0 +1,360 @@
+"""ที่เก็บรูปแบบเลือกได้: Google Drive, ดิสก์ในเครื่อง / NAS, S3-compatible (MinIO ฯลฯ)
+
+ทุก backend ใช้โครงเดียวกับ Drive เดิม: {ส่วนของวันที่...}/{order}_{HH-MM}/{ชื่อไฟล์}
+(ส่วนของวันที่มาจากแอป เช่น ["2026", "10", "19-10-2026"] หรือ ["19-10-2026"])
+
+    drive    (ค่าเริ่มต้น)
+    file:///mnt/nas/photos?base_url=http://nas.local/photos      ลิงก์ใน Log ใช้ base_url (ไม่ตั้ง = file://)
+    s3://bucket/prefix?endpoint=http://minio:9000&region=us-east-1&public_url=...   key จาก AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY
+
+ตั้ง mirror_to_drive แล้วทุก Folder / รูปที่เก็บใน backend หลักจะถูกคัดลอกขึ้น Drive ใน background
+(มี journal ในดิสก์ ถ้า process ตายระหว่างทางจะคัดลอกต่อตอนเริ่มใหม่)
+"""
+import concurrent.futures
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+NO_DATE_FOLDER = "ไม่พบ Folder วันที่ของวันนี้ (ยังไม่มีการเปิดบิลวันนี้)"
+UPLOAD_WORKERS = 4
+
+
+def no_order_folder(order_id): return f"ไม่พบ Folder ของ Order: {order_id} ในวันนี้"
+
+
+def check_name(name):
+    # ชื่อ Folder / ไฟล์หนึ่งส่วน (order_id มาจากการพิมพ์ / API): ห้ามมี / \ หรือ .. ไม่ให้ path / key ออกนอก root
+    name = str(name)
+    if not name or "/" in name or "\\" in name or ".." in name or "\0" in name: raise ValueError(f"ชื่อ Folder / ไฟล์ไม่ถูกต้อง: {name!r}")
+    return name
+
+
+def check_ref(ref):
+    # ref จาก backend เอง (ส่วนของวันที่/Folder/ไฟล์ คั่นด้วย /): ทุกส่วนต้องผ่าน check_name
+    for part in str(ref).split("/"): check_name(part)
+    return ref
+
+
+class PhotoStorage:
+    """interface: folder_ref / file_ref เป็นค่าที่ backend นั้นใช้อ้างอิง (Drive = id, ดิสก์ / S3 = path)"""
+
+    def create_order_folder(self, date_parts, order_id, time_suffix):
+        # -> (folder_ref, "{order}_{HH-MM}")
+        raise NotImplementedError
+
+    def find_order_folder(self, date_parts, order_id):
+        # Folder ล่าสุดของ Order ในวันนั้น -> (folder_ref, ชื่อ Folder) หรือ (None, ข้อความ error)
+        raise NotImplementedError
+
+    def upload(self, data, filename, folder_ref):
+        raise NotImplementedError
+
+    def link(self, file_ref):
+        # ลิงก์ที่บันทึกลง Log
+        raise NotImplementedError
+
+    def upload_many(self, photos, folder_ref):
+        # photos: {key: (bytes, ชื่อไฟล์)} อัปพร้อมกัน -> ({key: file_ref} ของรูปที่สำเร็จ, error แรกถ้ามี)
+        done = {}; error = None
+        with concurrent.futures.ThreadPoolExecutor(min(UPLOAD_WORKERS, max(len(photos), 1))) as pool:
+            jobs = {k: pool.submit(self.upload, data, name, folder_ref) for k, (data, name) in photos.items()}
+            for k, job in jobs.items():
+                try: done[k] = job.result()
+                except Exception as e: error = error or e
+        return done, error
+
+
+def _latest_order_folder(names, order_id):
+    # ชื่อ {order}_{HH-MM}: กรองให้ขึ้นต้นด้วย "ORDER_" จริง แล้วเอาเวลาล่าสุด
+    names = [n for n in names if n.startswith(f"{order_id}_")]
+    return max(names) if names else None
+
+
+# --- GOOGLE DRIVE (ผ่าน google_io.GoogleIO, Folder id ใช้ shared cache key เดียวกับแอป) ---
+class DriveStorage(PhotoStorage):
+    def __init__(self, gio, root_id, cached_lookup=None, cache_get=None, cache_set=None, folder_ttl=2 * 86400):
+        self.gio = gio; self.root_id = root_id; self.folder_ttl = folder_ttl
+        self.cached_lookup = cached_lookup or (lambda key, loader, ttl, cache_if=None: loader())
+        self.cache_get = cache_get or (lambda key: None)
+        self.cache_set = cache_set or (lambda key, value, ttl=None: None)
+
+    def _folder(self, parent_id, name, create):
+        def _lookup():
+            q = f"name = '{name}' and '{parent_id}' in parents and mimeType = '{FOLDER_MIME}' and trashed = false"
+            files = self.gio.run(self.gio.list_files(q))
+            if files: return files[0]['id']
+            return self.gio.run(self.gio.create_folder(name, parent_id)) if create else None
+        # Folder ID ใช้ร่วมกันทุก replica (single-flight กันสร้าง Folder วันที่ซ้ำ)
+        return self.cached_lookup(f"folder:{parent_id}:{name}", _lookup, self.folder_ttl, cache_if=None if create else bool)
+
+    def _date_folder(self, date_parts, create):
+        parent_id = self.root_id
+        for name in date_parts:
+            parent_id = self._folder(parent_id, name, create)
+            if not parent_id: return None
+        return parent_id
+
+    def create_order_folder(self, date_parts, order_id, time_suffix):
+        folder_name = f"{order_id}_{time_suffix}"
+        folder_id = self.gio.run(self.gio.create_folder(folder_name, self._date_folder(date_parts, create=True)))
+        self.cache_set(f"order_folder:{date_parts[-1]}:{order_id}", (folder_id, folder_name), self.folder_ttl)
+        return folder_id, folder_name
+
+    def find_order_folder(self, date_parts, order_id):
+        # Order นี้เคยสร้าง/เจอแล้ว (จาก replica ไหนก็ได้) ไม่ต้องค้น Drive
+        cached = self.cache_get(f"order_folder:{date_parts[-1]}:{order_id}")
+        if cached: return cached
+        date_id = self._date_folder(date_parts, create=False)
+        if not date_id: return None, NO_DATE_FOLDER
+        # ค้นหาแบบกว้าง (name contains) แล้วกรองให้ขึ้นต้นด้วย ORDER_ ใน Python
+        q = f"'{date_id}' in parents and name contains '{order_id}' and mimeType = '{FOLDER_MIME}' and trashed = false"
+        for f in self.gio.run(self.gio.list_files(q, "files(id, name)", order_by="createdTime desc")):
+            if f['name'].startswith(f"{order_id}_"):
+                self.cache_set(f"order_folder:{date_parts[-1]}:{order_id}", (f['id'], f['name']), self.folder_ttl)
+                return f['id'], f['name']
+        return None, no_order_folder(order_id)
+
+    def ensure_order_folder(self, date_parts, folder_name):
+        # ใช้ตอน mirror: Folder ชื่อนี้ในวันนั้น (มีแล้วใช้ของเดิม)
+        return self._folder(self._date_folder(date_parts, create=True), folder_name, create=True)
+
+    def upload(self, data, filename, folder_ref): return self.gio.run(self.gio.upload_file(data, filename, folder_ref))
+
+    def upload_many(self, photos, folder_ref):
+        keys = list(photos)
+        results = self.gio.gather(*(self.gio.upload_file(data, name, folder_ref) for data, name in photos.values()), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        return {k: r for k, r in zip(keys, results) if not isinstance(r, BaseException)}, (errors[0] if errors else None)
+
+    def link(self, file_ref): return f"https://drive.google.com/open?id={file_ref}"
+
+
+# --- ดิสก์ในเครื่อง / NAS (folder_ref, file_ref = path สัมพัทธ์จาก root คั่นด้วย /) ---
+class LocalStorage(PhotoStorage):
+    def __init__(self, root, base_url=None):
+        self.root = os.path.abspath(root); self.base_url = base_url.rstrip("/") if base_url else None
+        os.makedirs(self.root, exist_ok=True); self._real_root = os.path.realpath(self.root)
+
+    def _abs(self, ref):
+        # path จริง (ตาม symlink แล้ว) ต้องอยู่ใต้ root
+        path = os.path.join(self.root, *check_ref(ref).split("/"))
+        if os.path.commonpath([os.path.realpath(path), self._real_root]) != self._real_root: raise ValueError(f"path ออกนอก root: {ref!r}")
+        return path
+
+    def create_order_folder(self, date_parts, order_id, time_suffix):
+        folder_name = check_name(f"{check_name(order_id)}_{time_suffix}"); ref = "/".join(list(date_parts) + [folder_name])
+        os.makedirs(self._abs(ref), exist_ok=True)
+        return ref, folder_name
+
+    def find_order_folder(self, date_parts, order_id):
+        try: check_name(order_id)
+        except ValueError: return None, no_order_folder(order_id)
+        date_ref = "/".join(date_parts)
+        try: names = [e.name for e in os.scandir(self._abs(date_ref)) if e.is_dir()]
+        except FileNotFoundError: return None, NO_DATE_FOLDER
+        name = _latest_order_folder(names, order_id)
+        return (f"{date_ref}/{name}", name) if name else (None, no_order_folder(order_id))
+
+    def upload(self, data, filename, folder_ref):
+        ref = f"{folder_ref}/{check_name(filename)}"; path = self._abs(ref)
+        data = data if isinstance(data, bytes) else data.read()
+        with open(path + ".tmp", "wb") as f: f.write(data)
+        os.replace(path + ".tmp", path) # ไม่มีไฟล์ครึ่งๆ กลางๆ ถ้า process ตายระหว่างเขียน
+        return ref
+
+    def read(self, file_ref):
+        with open(self._abs(file_ref), "rb") as f: return f.read()
+
+    def link(self, file_ref):
+        if self.base_url: return f"{self.base_url}/{quote(file_ref)}"
+        return "file://" + quote(self._abs(file_ref))
+
+
+# --- S3-COMPATIBLE (AWS Signature V4, path-style: ใช้กับ MinIO / Ceph / R2 ได้) ---
+class S3Error(RuntimeError):
+    def __init__(self, status, body):
+        super().__init__(f"S3 {status}: {body[:300]!r}"); self.status = status
+
+
+def _hmac(key, msg): return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+class S3Storage(PhotoStorage):
+    def __init__(self, endpoint, bucket, access_key, secret_key, prefix="", region="us-east-1", public_url=None, timeout=30):
+        parsed = urlparse(endpoint)
+        self.secure = parsed.scheme == "https"; self.host = parsed.netloc; self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket; self.prefix = prefix.strip("/"); self.region = region; self.timeout = timeout
+        self.access_key = access_key; self.secret_key = secret_key
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self._local = threading.local()
+
+    def _key(self, ref): return f"{self.prefix}/{check_ref(ref)}" if self.prefix else check_ref(ref)
+
+    def _conn(self):
+        # connection keep-alive ต่อ thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, timeout=self.timeout)
+        return conn
+
+    def _sign(self, method, path, qs, headers, payload_hash, now):
+        # header Authorization แบบ AWS Signature V4
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ"); day = now.strftime("%Y%m%d")
+        signed = ";".join(sorted(h.lower() for h in headers))
+        canonical_headers = "".join(f"{h.lower()}:{str(v).strip()}\n" for h, v in sorted(headers.items(), key=lambda x: x[0].lower()))
+        canonical = "\n".join([method, path, qs, canonical_headers, signed, payload_hash])
+        scope = f"{day}/{self.region}/s3/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode("utf-8")).hexdigest()])
+        signing_key = _hmac(_hmac(_hmac(_hmac(("AWS4" + self.secret_key).encode("utf-8"), day), self.region), "s3"), "aws4_request")
+        return (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, SignedHeaders={signed}, "
+                f"Signature={hmac.new(signing_key, to_sign.encode('utf-8'), hashlib.sha256).hexdigest()}")
+
+    def _request(self, method, key="", query=None, body=b"", headers=None):
+        path = "/" + quote(self.bucket) + ("/" + quote(key, safe="/-_.~") if key else "")
+        qs = "&".join(f"{quote(k, safe='-_.~')}={quote(str(v), safe='-_.~')}" for k, v in sorted((query or {}).items()))
+        now = datetime.utcnow(); payload_hash = hashlib.sha256(body).hexdigest()
+        headers = dict(headers or {}, host=self.host, **{'x-amz-content-sha256': payload_hash, 'x-amz-date': now.strftime("%Y%m%dT%H%M%SZ")})
+        headers['Authorization'] = self._sign(method, path, qs, headers, payload_hash, now)
+        for attempt in (1, 2):
+            try:
+                conn = self._conn(); conn.request(method, path + (f"?{qs}" if qs else ""), body=body, headers=headers)
+                resp = conn.getresponse(); data = resp.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self._local.conn = None # connection หลุด (เช่น server ปิด keep-alive) ลองใหม่ครั้งเดียว
+                if attempt == 2: raise
+        if resp.status >= 300: raise S3Error(resp.status, data)
+        return data
+
+    def _list_prefixes(self, parent, name_prefix=""):
+        # "sub-folder" ใต้ parent (CommonPrefixes) ที่ชื่อขึ้นต้นด้วย name_prefix -> [ชื่อ, ...]
+        prefix = parent + name_prefix; names = []; token = None
+        while True:
+            query = {'list-type': 2, 'prefix': prefix, 'delimiter': "/"}
+            if token: query['continuation-token'] = token
+            root = ET.fromstring(self._request("GET", query=query))
+            for el in root.iter():
+                tag = el.tag.rsplit("}", 1)[-1]
+                if tag == "Prefix" and el.text and el.text != prefix: names.append(el.text[len(parent):].rstrip("/"))
+                elif tag == "NextContinuationToken": token = el.text
+            if root.findtext("{*}IsTruncated") != "true": return names
+
+    def create_order_folder(self, date_parts, order_id, time_suffix):
+        # S3 ไม่มี Folder: ใส่ object ว่างลงท้าย / ไว้ ให้หาเจอก่อนมีรูป (แบบเดียวกับ console ของ S3 / MinIO)
+        folder_name = check_name(f"{check_name(order_id)}_{time_suffix}"); ref = "/".join(list(date_parts) + [folder_name])
+        self._request("PUT", self._key(ref) + "/")
+        return ref, folder_name
+
+    def find_order_folder(self, date_parts, order_id):
+        try: check_name(order_id)
+        except ValueError: return None, no_order_folder(order_id)
+        date_ref = "/".join(date_parts)
+        parent = self._key(date_ref) + "/"
+        name = _latest_order_folder(self._list_prefixes(parent, f"{order_id}_"), order_id)
+        if name: return f"{date_ref}/{name}", name
+        if not self._list_prefixes(parent): return None, NO_DATE_FOLDER
+        return None, no_order_folder(order_id)
+
+    def upload(self, data, filename, folder_ref):
+        ref = f"{folder_ref}/{check_name(filename)}"
+        self._request("PUT", self._key(ref), body=data if isinstance(data, bytes) else data.read(), headers={'Content-Type': 'image/jpeg'})
+        return ref
+
+    def read(self, file_ref): return self._request("GET", self._key(file_ref))
+
+    def link(self, file_ref):
+        return f"{self.public_url or self.endpoint + '/' + quote(self.bucket)}/{quote(self._key(file_ref))}"
+
+
+# --- MIRROR ขึ้น Drive (background + journal ในดิสก์) ---
+class MirroredStorage(PhotoStorage):
+    """ใช้ backend หลักตามปกติ แล้วคัดลอก Folder / รูปขึ้น Drive ทีหลัง ให้คนที่เปิดดูรูปใน Drive ยังเห็นครบ"""
+
+    def __init__(self, primary, drive_factory, journal_path="photo_mirror.jsonl", retry_delay=30):
+        self.primary = primary; self.drive_factory = drive_factory; self.drive = None
+        self.journal_path = journal_path; self.retry_delay = retry_delay
+        self._lock = threading.Lock(); self._queue = queue.Queue(); self._seq = 0; self._folders = {}
+        for rec in self._replay(): self._queue.put(rec)
+        threading.Thread(target=self._worker, name="photo-mirror", daemon=True).start()
+
+    def _replay(self):
+        # งานที่ยังไม่ done จากรอบก่อน แล้วเขียน journal ใหม่ให้เหลือแค่งานค้าง
+        pending = {}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try: rec = json.loads(line)
+                    except ValueError: continue
+                    if 'done' in rec: pending.pop(rec['done'], None)
+                    else: pending[rec['seq']] = rec
+        self._seq = max(pending, default=0)
+        with open(self.journal_path + ".tmp", "w", encoding="utf-8") as f:
+            for rec in pending.values(): f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        return list(pending.values())
+
+    def _journal(self, rec):
+        with self._lock, open(self.journal_path, "a", encoding="utf-8") as f: f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _enqueue(self, **rec):
+        with self._lock: self._seq += 1; rec['seq'] = self._seq
+        self._journal(rec); self._queue.put(rec)
+
+    def _mirror(self, rec):
+        if self.drive is None: self.drive = self.drive_factory()
+        parts = rec['folder'].split("/"); folder_id = self._folders.get(rec['folder'])
+        if folder_id is None: folder_id = self._folders[rec['folder']] = self.drive.ensure_order_folder(parts[:-1], parts[-1])
+        if rec.get('file'): self.drive.upload(self.primary.read(rec['file']), rec['file'].rsplit("/", 1)[-1], folder_id)
+
+    def _worker(self):
+        while True:
+            rec = self._queue.get()
+            try: self._mirror(rec)
+            except Exception as e:
+                print(f"⚠️ Mirror รูปขึ้น Drive ไม่สำเร็จ (จะลองใหม่): {e}")
+                time.sleep(self.retry_delay); self._queue.put(rec); continue
+            self._journal({'done': rec['seq']})
+
+    def pending(self): return self._queue.qsize()
+
+    def create_order_folder(self, date_parts, order_id, time_suffix):
+        ref, name = self.primary.create_order_folder(date_parts, order_id, time_suffix)
+        self._enqueue(folder=ref); return ref, name
+
+    def find_order_folder(self, date_parts, order_id): return self.primary.find_order_folder(date_parts, order_id)
+
+    def upload(self, data, filename, folder_ref):
+        ref = self.primary.upload(data, filename, folder_ref)
+        self._enqueue(folder=folder_ref, file=ref); return ref
+
+    def upload_many(self, photos, folder_ref):
+        done, error = self.primary.upload_many(photos, folder_ref)
+        for ref in done.values(): self._enqueue(folder=folder_ref, file=ref)
+        return done, error
+
+    def link(self, file_ref): return self.primary.link(file_ref)
+
+
+def open_storage(url=None, drive_factory=None, mirror_to_drive=False, journal_path="photo_mirror.jsonl", access_key=None, secret_key=None):
+    # drive_factory: ฟังก์ชันที่คืน DriveStorage (สร้างเมื่อใช้ Drive หรือ mirror เท่านั้น)
+    url = url or "drive"
+    if url == "drive": return drive_factory()
+    parsed = urlparse(url); params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+    if parsed.scheme in ("", "file"):
+        primary = LocalStorage(unquote(parsed.netloc + parsed.path), params.get('base_url'))
+    elif parsed.scheme == "s3":
+        access_key = access_key or os.environ.get("AWS_ACCESS_KEY_ID"); secret_key = secret_key or os.environ.get("AWS_SECRET_ACCESS_KEY")
+        if not (access_key and secret_key and params.get('endpoint')): raise ValueError("s3 storage ต้องมี endpoint, access key และ secret key")
+        primary = S3Storage(params['endpoint'], parsed.netloc, access_key, secret_key, parsed.path, params.get('region', "us-east-1"), params.get('public_url'))
+    else: raise ValueError(f"unsupported photo storage url: {url}")
+    return MirroredStorage(primary, drive_factory, journal_path) if mirror_to_drive else primary
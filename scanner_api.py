@@ -0,0 +1,429 @@
+"""HTTP/JSON API สำหรับเครื่องสแกนมือถือ (hardware scanner แบบ keyboard wedge) รันคู่กับหน้า Streamlit
+
+ใช้ Sheet / Folder / Log / shared cache ชุดเดียวกับแอป: catalog และ user โหลดผ่าน shared cache key เดียวกัน,
+รูปเก็บผ่าน photo_storage ตัวเดียวกับแอป (ค่าเริ่มต้น Drive: Folder ปี/เดือน/วันและ Order -> Folder ใช้ key เดียวกัน),
+Drive / Sheets ทุกคำสั่งผ่าน google_io, Log commit ลง log store ในเครื่อง (ไฟล์เดียวกับแอปได้)
+แล้ว replicator ทยอยส่งขึ้น Sheet รายเดือนเดียวกัน (--log-store "" = เขียนลง Sheet ตรงแบบเดิม)
+สแกน / ตรวจ Location / เพิ่มลงตะกร้า ทำในหน่วยความจำทั้งหมด (ไม่มี rerun, ไม่เรียก Google)
+เพิ่มลงตะกร้าจองสต็อกใน stock ledger ของ process นี้ (ไม่พอ = 409), ส่งงานสำเร็จ = หักสต็อก แล้ว reconcile ลง Sheet เป็นรอบ
+
+    python scanner_api.py --app gmail --port 8502 --secrets .streamlit/secrets.toml
+    python scanner_api.py --app gmail --photo-storage "s3://photos/amaze?endpoint=http://minio:9000" --mirror-to-drive
+
+POST /login               {"user_id", "password"}                 -> {"token", "name"}
+GET  /products/<barcode>                                          -> {"name", "location"}
+GET  /products/search?q=<คำค้น>&limit=8                           -> {"results": [{"barcode", "name", "location", "match", "score"}, ...]}
+POST /location/validate   {"barcode", "location"}                 -> {"valid", "expected"}
+GET  /cart  |  DELETE /cart
+POST /cart/lines          {"order_id", "barcode", "location", "qty"}
+POST /pack                {"photos": [base64 JPEG, ...]}           (ส่งตะกร้าปัจจุบัน)
+POST /rider               {"order_id", "photo": base64 JPEG}
+POST /logout  |  GET /health                                      -> {"status", "products", "stock": {"tracked", "reserved", "holders", "pending"}}
+ทุก endpoint ยกเว้น /login และ /health ต้องส่ง header  Authorization: Bearer <token>
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+import catalog_search
+import google_io
+import log_store
+import photo_storage
+import shared_cache
+import sheet_data
+import stock_ledger
+import submission_ledger
+
+PRESETS = {
+    "gmail": {"main_folder_id": "1VjyciJOBhBNCwo9z2iF1WVWXQjTyRkJ2", "sheet_id": "1rWgqfrut0H0wRSTocEq04mGGgnZs0T45uaMYZmXVdj8",
+              "layout": "year_month_date", "log_image": "last",
+              "scopes": ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]},
+    "piacking": {"main_folder_id": "1FHfyzzTzkK5PaKx6oQeFxTbLEq-Tmii7", "sheet_id": "1jNlztb3vfG0c8sw_bMTuA9GEqircx_uVE7uywd5dR2I",
+                 "layout": "date", "log_image": "first", "scopes": None},
+}
+LOG_SHEET_NAME = 'Logs'
+RIDER_SHEET_NAME = 'Rider_Logs'
+USER_SHEET_NAME = 'User'
+LOG_HEADERS = ("Timestamp", "Picker Name", "Order ID", "Barcode", "Product Name", "Location", "Pick Qty", "User", "Image Link (Col I)")
+RIDER_HEADERS = ("Timestamp", "User Name", "Order ID", "Folder Name", "Rider Image Link")
+SHEET_CACHE_TTL = 600
+FOLDER_CACHE_TTL = 2 * 86400
+GENERATION_CHECK_INTERVAL = 5 # วินาที: เช็คปุ่ม "โหลดข้อมูลใหม่" จากหน้า UI
+SESSION_TTL = 12 * 3600
+MAX_PHOTOS = 5
+CLIENT_POOL_SIZE = 8
+SUBMISSION_LEDGER_PATH = "submission_ledger.jsonl" # ไฟล์เดียวกับแอป: ส่งซ้ำข้ามแอปกับ API ก็ได้งานเดียว
+SUBMISSION_LEDGER_DAYS = 7
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message); self.status = status
+
+
+# --- TIME HELPER ---
+def thai_now(): return datetime.utcnow() + timedelta(hours=7)
+def get_thai_time(): return thai_now().strftime("%Y-%m-%d %H:%M:%S")
+def get_thai_ts_filename(): return thai_now().strftime("%Y%m%d_%H%M%S")
+def get_log_shard_name(base_name): return f"{base_name}_{thai_now().strftime('%Y_%m')}"
+
+
+def normalize_photo(data):
+    # แปลงเป็น JPEG แบบเดียวกับตอนถ่ายในแอป
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    if img.mode in ("RGBA", "P"): img = img.convert("RGB")
+    buf = io.BytesIO(); img.save(buf, format='JPEG'); return buf.getvalue()
+
+
+def load_oauth_credentials(secrets_path, scopes=None):
+    import tomllib
+    from google.oauth2.credentials import Credentials
+    with open(secrets_path, "rb") as f: info = tomllib.load(f)["oauth"]
+    return Credentials(None, refresh_token=info["refresh_token"], token_uri="https://oauth2.googleapis.com/token",
+                       client_id=info["client_id"], client_secret=info["client_secret"], scopes=scopes)
+
+
+class ScannerService:
+    def __init__(self, config, creds, cache=None, ledger_path=SUBMISSION_LEDGER_PATH, storage=None, logs=None, stock=None):
+        # storage: photo_storage.PhotoStorage (ดิสก์ / S3 เหมือนแอป), None = Drive (photo_storage.DriveStorage) เหมือนแอป
+        # logs: log_store.LogStore (Log หลักในเครื่อง), None = append ลง Sheet ตรง
+        # stock: stock_ledger.StockLedger (จองสต็อกตอนเพิ่มลงตะกร้า), None = ไม่ตรวจสต็อก
+        self.config = config; self.creds = creds; self.logs = logs; self.log_replicator = None; self.stock = stock
+        self.cache = cache or shared_cache.open_cache(prefix=f"amaze:{config['sheet_id']}")
+        self.ledger = submission_ledger.SubmissionLedger(ledger_path, SUBMISSION_LEDGER_DAYS)
+        self.gio = google_io.GoogleIO(lambda: self._new_client(), pool_size=CLIENT_POOL_SIZE)
+        self.storage = storage or self.drive_storage()
+        self._index_lock = threading.Lock(); self._index = {'products': {}, 'users': {}, 'search': catalog_search.CatalogIndex(), 'generation': None, 'loaded': 0, 'checked': 0}
+        self._sessions = {}; self._sessions_lock = threading.Lock()
+
+    def _new_client(self):
+        # client ของ google_io (pool: httplib2 ใช้ข้าม thread พร้อมกันไม่ได้)
+        import gspread
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.discovery_cache import get_static_doc
+        drive = build_from_document(get_static_doc('drive', 'v3'), credentials=self.creds)
+        return {'drive': drive, 'sheet': gspread.authorize(self.creds).open_by_key(self.config['sheet_id'])}
+
+    def drive_storage(self):
+        return photo_storage.DriveStorage(self.gio, self.config['main_folder_id'], self.cached_lookup,
+                                          lambda key: self._cache_call("get", key), lambda key, value, ttl=None: self._cache_call("set", key, value, ttl), FOLDER_CACHE_TTL)
+
+    # --- SHARED CACHE (key เดียวกับแอป) ---
+    def cached_lookup(self, key, loader, ttl, cache_if=None):
+        called = []
+        def _load(): called.append(True); return loader()
+        try: return self.cache.get_or_refresh(key, _load, ttl=ttl, cache_if=cache_if)
+        except Exception as e:
+            if called: raise
+            print(f"⚠️ Shared cache ใช้ไม่ได้: {e}"); return loader()
+
+    def _cache_call(self, method, *args):
+        try: return getattr(self.cache, method)(*args)
+        except Exception as e: print(f"⚠️ Shared cache ใช้ไม่ได้: {e}"); return None
+
+    # --- CATALOG / USER INDEX ---
+    def download_sheet_data(self, sheet_name): return sheet_data.values_to_frame(self.gio.run(self.gio.get_all_values(sheet_name)))
+
+    def _load_sheet(self, sheet_name, generation):
+        return self.cached_lookup(f"sheet:{generation}:{sheet_name}", lambda: self.download_sheet_data(sheet_name), SHEET_CACHE_TTL, cache_if=lambda df: not df.empty)
+
+    def _build_index(self, generation):
+        # barcode -> (ชื่อสินค้า, Zone-Location), user id -> (password, ชื่อ): แถวแรกที่ตรงชนะ เหมือน _find_product / _find_login_user
+        products = {}; users = {}
+        df_items = self._load_sheet(0, generation)
+        if not df_items.empty and 'Barcode' in df_items.columns:
+            zones = df_items['Zone'] if 'Zone' in df_items.columns else [''] * len(df_items)
+            locs = df_items['Location'] if 'Location' in df_items.columns else [''] * len(df_items)
+            barcode_col = list(df_items.columns).index('Barcode')
+            for row, zone, loc in zip(df_items.itertuples(index=False), zones, locs):
+                barcode = row[barcode_col]
+                if barcode in products: continue
+                try: full_name = f"{row[3]} {row[5]}"
+                except IndexError: full_name = "Error Name"
+                products[barcode] = (full_name, f"{str(zone).strip()}-{str(loc).strip()}")
+        df_users = self._load_sheet(USER_SHEET_NAME, generation)
+        if not df_users.empty and len(df_users.columns) >= 3:
+            for uid, pw, name in zip(df_users.iloc[:, 0].astype(str), df_users.iloc[:, 1], df_users.iloc[:, 2]):
+                users.setdefault(uid, (str(pw).strip(), name))
+        # index ค้นหาแก้เฉพาะแถวที่เปลี่ยนจาก catalog รอบก่อน
+        search = self._index['search'].apply((barcode, name, loc) for barcode, (name, loc) in products.items()) if products else self._index['search']
+        return products, users, search
+
+    def index(self):
+        # ใช้ index เดิมระหว่างโหลดใหม่: มีแค่ thread เดียวที่ refresh, ที่เหลือตอบจากของเดิมทันที
+        idx = self._index; now = time.time()
+        if now - idx['checked'] < GENERATION_CHECK_INTERVAL and idx['loaded']: return idx
+        if not self._index_lock.acquire(blocking=not idx['loaded']): return idx
+        try:
+            idx = self._index
+            if now - idx['checked'] >= GENERATION_CHECK_INTERVAL or not idx['loaded']:
+                generation = self._cache_call("generation", "sheets") or 0
+                if generation != idx['generation'] or now - idx['loaded'] >= SHEET_CACHE_TTL:
+                    products, users, search = self._build_index(generation)
+                    if products or not idx['products']: idx = {'products': products, 'users': users, 'search': search, 'generation': generation, 'loaded': now}
+                idx = dict(idx, checked=now); self._index = idx
+            return idx
+        finally: self._index_lock.release()
+
+    # --- SESSION ---
+    def login(self, user_id, password):
+        user = self.index()['users'].get(str(user_id).strip())
+        if user is None: raise ApiError(404, f"ไม่พบรหัสพนักงาน: {user_id}")
+        if str(password).strip() != user[0]: raise ApiError(401, "รหัสผ่านไม่ถูกต้อง")
+        token = secrets.token_urlsafe(24)
+        session = {'user_id': str(user_id).strip(), 'name': user[1], 'order_id': "", 'items': [], 'lock': threading.Lock(), 'expires': time.time() + SESSION_TTL, 'holder': secrets.token_hex(8)}
+        with self._sessions_lock:
+            now = time.time(); self._sessions = {k: s for k, s in self._sessions.items() if s['expires'] > now}
+            self._sessions[token] = session
+        return token, session
+
+    def session(self, token):
+        session = self._sessions.get(token)
+        if session is None or session['expires'] < time.time(): raise ApiError(401, "กรุณา Login ใหม่")
+        if self.stock: self.stock.touch(session['holder']) # ยังใช้งานอยู่: ของที่จองไว้ไม่หมดอายุ (เหมือนแอปที่ touch ทุก rerun)
+        return session
+
+    def logout(self, token):
+        with self._sessions_lock: session = self._sessions.pop(token, None)
+        if session and self.stock: self.stock.release(session['holder'])
+
+    # --- SCAN ---
+    def resolve(self, barcode):
+        product = self.index()['products'].get(str(barcode).strip())
+        if product is None: raise ApiError(404, f"ไม่พบ Barcode: {barcode}")
+        return {'barcode': str(barcode).strip(), 'name': product[0], 'location': product[1]}
+
+    def search(self, query, limit=8):
+        return {'results': self.index()['search'].search(query, max(1, min(int(limit), 50)))}
+
+    def validate_location(self, barcode, location):
+        expected = self.resolve(barcode)['location']; location = str(location).strip().upper()
+        return {'valid': bool(location) and (location == expected or location in expected), 'location': location, 'expected': expected}
+
+    def add_line(self, session, order_id, barcode, location, qty=1):
+        order_id = str(order_id or session['order_id']).strip().upper()
+        if not order_id: raise ApiError(400, "ต้องระบุ order_id")
+        try: photo_storage.check_name(order_id) # ใช้เป็นชื่อ Folder / ไฟล์รูป
+        except ValueError as e: raise ApiError(400, str(e))
+        product = self.resolve(barcode); check = self.validate_location(barcode, location)
+        if not check['valid']: raise ApiError(409, f"ผิดตำแหน่ง ({check['location']}) เป้าหมาย: {check['expected']}")
+        try: qty = int(qty)
+        except (TypeError, ValueError): raise ApiError(400, "qty ต้องเป็นตัวเลข")
+        if qty < 1: raise ApiError(400, "qty ต้องมากกว่า 0")
+        with session['lock']:
+            if order_id != session['order_id']: # เปลี่ยน Order = เริ่มตะกร้าใหม่
+                session['order_id'] = order_id; session['items'] = []
+                if self.stock: self.stock.release(session['holder'])
+            if self.stock:
+                reserved, left = self.stock.reserve(session['holder'], (product['barcode'], product['location']), qty)
+                if not reserved: raise ApiError(409, f"สต็อกไม่พอ: เหลือให้เบิก {left} ชิ้น")
+            session['items'].append({"Barcode": product['barcode'], "Product Name": product['name'], "Location": check['location'], "Qty": qty,
+                                     stock_ledger.TARGET_FIELD: product['location']})
+            return self.cart(session)
+
+    def cart(self, session):
+        return {'order_id': session['order_id'], 'items': [{k: v for k, v in item.items() if not k.startswith("_")} for item in session['items']]}
+
+    def reset_cart(self, session):
+        with session['lock']:
+            session['order_id'] = ""; session['items'] = []
+            if self.stock: self.stock.release(session['holder'])
+
+    # --- STOCK (คอลัมน์สต็อกของ Sheet catalog) ---
+    def read_catalog_stock(self):
+        # snapshot catalog ใน shared cache ชุดเดียวกับแอป (ไม่ดึงทั้ง Sheet ทุกรอบ)
+        df = self._load_sheet(0, self._cache_call("generation", "sheets") or 0)
+        if df.empty: raise RuntimeError("โหลด catalog ไม่ได้")
+        return stock_ledger.parse_catalog_frame(df, self.config.get('stock_column'))
+
+    def read_catalog_cells(self, cells): return self.gio.run(self.gio.get_cells(0, cells))
+
+    def write_catalog_stock(self, cells): self.gio.run(self.gio.update_cells(0, cells))
+
+    # --- PHOTOS (photo_storage ตัวเดียวกับแอป, โครง Folder ตาม layout ของแอปนั้น) ---
+    def _date_parts(self):
+        now = thai_now(); date_str = now.strftime("%d-%m-%Y")
+        return [now.strftime("%Y"), now.strftime("%m"), date_str] if self.config['layout'] == "year_month_date" else [date_str]
+
+    def create_order_folder(self, order_id): return self.storage.create_order_folder(self._date_parts(), order_id, thai_now().strftime('%H-%M'))[0]
+
+    def find_order_folder(self, order_id):
+        folder_ref, name = self.storage.find_order_folder(self._date_parts(), order_id)
+        if folder_ref is None: raise ApiError(404, name)
+        return folder_ref, name
+
+    # --- LOGS (log store ในเครื่อง -> Sheet รายเดือนเดียวกับแอป) ---
+    def push_log_rows(self, shard_name, headers, rows):
+        # ใช้เป็น push ของ LogReplicator (google_io สร้าง Sheet ของเดือนใหม่ให้เอง)
+        self.gio.run(self.gio.append_rows(shard_name, headers, rows))
+
+    def start_log_replicator(self, interval=log_store.REPLICATE_INTERVAL):
+        self.log_replicator = log_store.LogReplicator(self.logs, self.push_log_rows, interval).start()
+
+    def commit_logs(self, base_name, headers, rows, keys):
+        shard_name = get_log_shard_name(base_name)
+        if self.logs is None: self.push_log_rows(shard_name, headers, rows); return
+        self.logs.append_many(base_name, shard_name, rows, keys)
+        if self.log_replicator: self.log_replicator.notify()
+
+    # --- SUBMIT ---
+    def submit_pack(self, session, photos):
+        if not photos: raise ApiError(400, "ต้องมีรูปอย่างน้อย 1 รูป")
+        if len(photos) > MAX_PHOTOS: raise ApiError(400, f"รูปได้สูงสุด {MAX_PHOTOS} รูป")
+        with session['lock']:
+            order_id = session['order_id']; items = list(session['items'])
+            if not order_id or not items: raise ApiError(400, "ตะกร้าว่าง")
+            photos = [normalize_photo(p) for p in photos]
+            key = submission_ledger.make_submission_key("PACK", session['user_id'], order_id, items, *photos); sub = self.ledger.get(key)
+            if sub.get('done'):
+                session['order_id'] = ""; session['items'] = []
+                if self.stock: self.stock.release(session['holder']) # ส่งซ้ำ: ของที่จองรอบนี้ไม่ได้เบิกจริง
+                return {'submission': key, 'folder_id': sub.get('folder_id'), 'duplicate': True}
+            # ทำต่อจากจุดที่ค้างไว้ (ถ้ามี): ใช้ Folder / ไฟล์ / Log ที่ส่งสำเร็จแล้วซ้ำ
+            fid = sub.get('folder_id') or self.create_order_folder(order_id)
+            ts = sub.get('ts') or get_thai_ts_filename()
+            self.ledger.record(key, folder_id=fid, ts=ts)
+            uploads = sub.get('uploads', {})
+            pending = {str(i): (data, f"{order_id}_PACKED_{ts}_Img{i + 1}.jpg") for i, data in enumerate(photos) if str(i) not in uploads}
+            if pending:
+                done, error = self.storage.upload_many(pending, fid); uploads.update(done); self.ledger.record(key, uploads=uploads)
+                if error: raise ApiError(502, f"อัปโหลดรูปไม่สำเร็จ {len(pending) - len(done)} รูป: {error}")
+            if self.config['log_image'] == "last": image_id = uploads.get(str(len(photos) - 1)) or "-"
+            else: image_id = uploads.get('0', "")
+            logged = sub.get('logged', 0); timestamp = get_thai_time(); image_link = self.storage.link(image_id)
+            rows = [[timestamp, session['name'], order_id, item['Barcode'], item['Product Name'], item['Location'], item['Qty'], session['user_id'], image_link]
+                    for item in items[logged:]]
+            if rows:
+                try: self.commit_logs(LOG_SHEET_NAME, LOG_HEADERS, rows, [f"{key}:{n}" for n in range(logged, len(items))])
+                except Exception as e: raise ApiError(502, f"บันทึก Log ไม่สำเร็จ: {e}")
+            self.ledger.record(key, logged=len(items), done=True)
+            if self.stock: self.stock.commit(session['holder'], stock_ledger.cart_lines(items)) # หักตามที่ส่งจริง แม้ยอดจองหมดอายุไปแล้ว
+            session['order_id'] = ""; session['items'] = []
+            return {'submission': key, 'folder_id': fid, 'files': [uploads[str(i)] for i in range(len(photos))], 'logged': len(items), 'duplicate': False}
+
+    def rider_handover(self, session, order_id, photo):
+        order_id = str(order_id or "").strip().upper()
+        if not order_id or not photo: raise ApiError(400, "ต้องระบุ order_id และ photo")
+        folder_id, folder_name = self.find_order_folder(order_id)
+        key = submission_ledger.make_submission_key("RIDER", order_id, folder_id, photo); sub = self.ledger.get(key)
+        if sub.get('done'): return {'submission': key, 'folder_name': folder_name, 'file_id': sub.get('file_id'), 'duplicate': True}
+        ts = sub.get('ts') or get_thai_ts_filename(); self.ledger.record(key, ts=ts)
+        uid = sub.get('file_id') or self.storage.upload(photo, f"RIDER_{order_id}_{ts}.jpg", folder_id)
+        self.ledger.record(key, file_id=uid)
+        try: self.commit_logs(RIDER_SHEET_NAME, RIDER_HEADERS, [[get_thai_time(), session['name'], order_id, folder_name, self.storage.link(uid)]], [key])
+        except Exception as e: raise ApiError(502, f"บันทึก Rider Log ไม่สำเร็จ: {e}")
+        self.ledger.record(key, done=True)
+        return {'submission': key, 'folder_name': folder_name, 'file_id': uid, 'duplicate': False}
+
+
+# --- HTTP ---
+def _decode_photo(value):
+    try: return base64.b64decode(value, validate=True)
+    except (TypeError, ValueError): raise ApiError(400, "รูปต้องเป็น base64")
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive: เครื่องสแกนใช้ connection เดิมต่อเนื่อง
+        disable_nagle_algorithm = True # header กับ body เขียนแยกกัน ถ้าไม่ปิด Nagle จะค้างรอ ACK ~40ms ต่อ request
+
+        def log_message(self, fmt, *args): pass # หลายร้อย request ต่อวินาที ไม่พิมพ์ทุกบรรทัด
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status); self.send_header("Content-Type", "application/json; charset=utf-8"); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length: return {}
+            try: return json.loads(self.rfile.read(length))
+            except ValueError: raise ApiError(400, "body ต้องเป็น JSON")
+
+        def _token(self):
+            auth = self.headers.get("Authorization", "")
+            return auth[7:].strip() if auth.startswith("Bearer ") else ""
+
+        def _route(self, method):
+            path, _, query = self.path.partition("?"); path = path.rstrip("/"); body = self._body() if method in ("POST", "DELETE") else {}
+            if method == "GET" and path == "/health": return {'status': 'ok', 'products': len(service.index()['products']), 'stock': service.stock.stats() if service.stock else None}
+            if method == "POST" and path == "/login":
+                token, session = service.login(body.get('user_id', ""), body.get('password', ""))
+                return {'token': token, 'name': session['name'], 'user_id': session['user_id']}
+            token = self._token(); session = service.session(token)
+            if method == "GET" and path == "/products/search":
+                params = parse_qs(query)
+                try: limit = int(params.get('limit', ["8"])[0])
+                except ValueError: raise ApiError(400, "limit ต้องเป็นตัวเลข")
+                return service.search(params.get('q', [""])[0], limit)
+            if method == "GET" and path.startswith("/products/"): return service.resolve(unquote(path[len("/products/"):]))
+            if method == "POST" and path == "/location/validate": return service.validate_location(body.get('barcode', ""), body.get('location', ""))
+            if path == "/cart":
+                if method == "GET": return service.cart(session)
+                if method == "DELETE": service.reset_cart(session); return service.cart(session)
+            if method == "POST" and path == "/cart/lines":
+                return service.add_line(session, body.get('order_id'), body.get('barcode', ""), body.get('location', ""), body.get('qty', 1))
+            if method == "POST" and path == "/pack": return service.submit_pack(session, [_decode_photo(p) for p in body.get('photos') or []])
+            if method == "POST" and path == "/rider": return service.rider_handover(session, body.get('order_id'), _decode_photo(body.get('photo') or ""))
+            if method == "POST" and path == "/logout": service.logout(token); return {}
+            raise ApiError(404, f"ไม่มี endpoint: {method} {path}")
+
+        def _handle(self, method):
+            try: self._send(200, dict(self._route(method), ok=True))
+            except ApiError as e: self._send(e.status, {'ok': False, 'error': str(e)})
+            except Exception as e:
+                print(f"❌ {method} {self.path}: {e!r}"); self._send(500, {'ok': False, 'error': str(e)})
+
+        def do_GET(self): self._handle("GET")
+        def do_POST(self): self._handle("POST")
+        def do_DELETE(self): self._handle("DELETE")
+    return Handler
+
+
+def make_server(service, host="0.0.0.0", port=8502):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True; server.request_queue_size = 256
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON API สำหรับเครื่องสแกนมือถือ")
+    parser.add_argument("--app", choices=sorted(PRESETS), default="gmail", help="ใช้ Sheet / Folder ชุดเดียวกับแอปไหน")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"), help="ไฟล์ secrets ที่มี [oauth] เหมือนแอป")
+    parser.add_argument("--cache-url", help="shared cache เดียวกับแอป (ค่าเริ่มต้น AMAZE_CACHE_URL หรือ sqlite:///shared_cache.db)")
+    parser.add_argument("--ledger", default=SUBMISSION_LEDGER_PATH, help="submission ledger เดียวกับแอป (กันส่งซ้ำข้ามแอปกับ API)")
+    parser.add_argument("--photo-storage", default=os.environ.get("AMAZE_PHOTO_STORAGE", "drive"), help="ที่เก็บรูปเดียวกับแอป: drive, file:///path หรือ s3://bucket/prefix?endpoint=...")
+    parser.add_argument("--mirror-to-drive", action="store_true", help="คัดลอกรูปจาก storage ด้านบนขึ้น Drive ใน background")
+    parser.add_argument("--mirror-journal", default="photo_mirror_api.jsonl")
+    parser.add_argument("--stock-column", default=os.environ.get("AMAZE_STOCK_COLUMN", "Stock"), help="คอลัมน์สต็อกใน Sheet catalog, ค่าว่าง = ไม่ตรวจสต็อก")
+    parser.add_argument("--log-store", default=os.environ.get("AMAZE_LOG_STORE_PATH", "log_store.db"), help="SQLite ของ Log (ใช้ไฟล์เดียวกับแอปได้), ค่าว่าง = เขียนลง Sheet ตรง")
+    args = parser.parse_args(argv)
+    config = dict(PRESETS[args.app], stock_column=args.stock_column)
+    service = ScannerService(config, load_oauth_credentials(args.secrets, config['scopes']),
+                             shared_cache.open_cache(args.cache_url, prefix=f"amaze:{config['sheet_id']}"), args.ledger)
+    service.storage = photo_storage.open_storage(args.photo_storage, service.drive_storage, args.mirror_to_drive, args.mirror_journal)
+    if args.log_store:
+        service.logs = log_store.LogStore(args.log_store, {LOG_SHEET_NAME: LOG_HEADERS, RIDER_SHEET_NAME: RIDER_HEADERS}); service.start_log_replicator()
+    if args.stock_column:
+        service.stock = stock_ledger.StockLedger()
+        stock_ledger.StockReconciler(service.stock, service.read_catalog_stock, service.read_catalog_cells, service.write_catalog_stock, service.cache).start()
+    service.index() # โหลด catalog ก่อนเปิดรับ request
+    server = make_server(service, args.host, args.port)
+    print(f"📡 Scanner API ({args.app}) ที่ http://{args.host}:{args.port}")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Sampling profiler ราย session: sample stack ของ thread ที่รัน rerun ของ session เดียว แล้วเก็บ flame graph ลงดิสก์
+
+- ไม่ใช้ sys.setprofile (ซึ่งช้าทุกบรรทัด): มี thread แยก sample ทุก SAMPLE_INTERVAL เฉพาะ thread ที่เลือก
+  session อื่นไม่ถูกแตะ เสียแค่ GIL ช่วงสั้นๆ ตอน sample
+- rerun จบเมื่อ frame ต้นทาง (<module> ของแอปรอบนี้) หายไปจาก stack: ครอบคลุมทั้งจบปกติ, st.rerun() และ st.stop()
+- แต่ละ rerun เก็บ 3 ไฟล์: .json (ข้อมูล + เวลาแยกตามหมวด), .folded (collapsed stack ใช้กับ flamegraph.pl / speedscope), .svg
+
+    profiler = SamplingProfiler(sys._getframe(), {'session': sid, 'user': name}, on_finish=store.save).start()
+    profiler.step = "scan"                  # tag ของ rerun นี้ (ตัวสุดท้ายที่ตั้งชนะ)
+    store.list(50)                          # -> [meta, ...] ใหม่สุดก่อน
+"""
+import html
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005
+MAX_DURATION = 300 # rerun ที่ค้างนานกว่านี้ตัดจบ ไม่ sample ไปเรื่อยๆ
+MAX_PROFILES = 300 # จำนวน profile ที่เก็บบนดิสก์ (เก่าสุดถูกลบก่อน)
+
+# หมวดของเวลา: ดู frame จากในสุดออกมา หมวดแรกที่ตรงชนะ (numpy ที่ pandas เรียกนับเป็น pandas)
+CATEGORIES = (
+    ("pyzbar", ("pyzbar/",)),
+    ("PIL", ("PIL/",)),
+    ("pandas", ("pandas/", "numpy/", "pyarrow/")),
+    # google_io / photo_storage: script thread รอผลจาก event loop / pool ของ I/O (frame ใน Google library อยู่คนละ thread)
+    ("Google I/O", ("google_io.py", "photo_storage.py", "googleapiclient/", "gspread/", "google/", "httplib2/", "requests/", "urllib3/", "ssl.py", "socket.py", "http/client.py")),
+    ("local cache", ("shared_cache.py", "drive_mirror.py", "catalog_search.py", "log_store.py", "submission_ledger.py", "sqlite3/")),
+    ("streamlit", ("streamlit/",)),
+)
+COLORS = {"pyzbar": "#e377c2", "PIL": "#ff7f0e", "pandas": "#1f77b4", "Google I/O": "#d62728", "local cache": "#9467bd", "streamlit": "#7f7f7f", "app": "#2ca02c"}
+
+_STDLIB = os.path.dirname(os.__file__)
+_short_paths = {}
+
+
+def short_path(filename):
+    # site-packages/pandas/core/frame.py -> pandas/core/frame.py, ไฟล์ของแอป -> ชื่อไฟล์
+    path = _short_paths.get(filename)
+    if path is None:
+        norm = filename.replace("\\", "/")
+        if "site-packages/" in norm: path = norm.rsplit("site-packages/", 1)[1]
+        elif filename.startswith(_STDLIB): path = os.path.relpath(filename, _STDLIB).replace("\\", "/")
+        else: path = os.path.basename(filename)
+        _short_paths[filename] = path
+    return path
+
+
+def categorize(paths):
+    # paths: ไฟล์ของแต่ละ frame จากนอกสุดไปในสุด
+    for path in reversed(paths):
+        for name, patterns in CATEGORIES:
+            if any(p in path for p in patterns): return name
+    return "app"
+
+
+class SamplingProfiler:
+    def __init__(self, root_frame, meta=None, on_finish=None, interval=SAMPLE_INTERVAL):
+        self.meta = dict(meta or {}); self.on_finish = on_finish; self.interval = interval
+        self.step = self.meta.pop('step', "-")
+        self.thread_id = threading.get_ident()
+        self._root = root_frame
+        self.stacks = Counter(); self.categories = Counter()
+
+    def start(self):
+        self.started = time.time()
+        threading.Thread(target=self._run, name="session-profiler", daemon=True).start()
+        return self
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id); labels = []; paths = []
+        while frame is not None:
+            path = short_path(frame.f_code.co_filename)
+            labels.append(f"{frame.f_code.co_name} ({path})"); paths.append(path)
+            if frame is self._root: break
+            frame = frame.f_back
+        if frame is None: return False # frame ต้นทางหายไป = rerun นี้จบแล้ว
+        labels.reverse(); paths.reverse()
+        self.stacks[";".join(labels)] += 1; self.categories[categorize(paths)] += 1
+        return True
+
+    def _run(self):
+        t0 = time.perf_counter()
+        try:
+            while time.perf_counter() - t0 < MAX_DURATION and self._sample(): time.sleep(self.interval)
+        finally:
+            duration = time.perf_counter() - t0; self._root = None # ไม่ถือ frame (และตัวแปรของ rerun) ไว้ต่อ
+        if self.on_finish is None: return
+        meta = dict(self.meta, step=self.step, started=self.started, duration_ms=round(duration * 1000, 1),
+                    samples=sum(self.stacks.values()), categories=dict(self.categories))
+        try: self.on_finish(meta, self.stacks)
+        except Exception as e: print(f"⚠️ บันทึก profile ไม่สำเร็จ: {e}")
+
+
+# --- FLAME GRAPH (SVG แบบ icicle: ราก rerun อยู่บนสุด, ความกว้าง = สัดส่วน sample) ---
+def render_flamegraph(stacks, title="", width=1200, row_height=17):
+    root = {'n': 0, 'kids': {}}
+    for stack, count in stacks.items():
+        node = root; node['n'] += count
+        for label in stack.split(";"):
+            node = node['kids'].setdefault(label, {'n': 0, 'kids': {}}); node['n'] += count
+    total = root['n'] or 1; scale = width / total; rects = []; depth_max = [0]
+
+    def walk(node, x, depth):
+        for label, kid in sorted(node['kids'].items()):
+            w = kid['n'] * scale
+            if w >= 0.5:
+                depth_max[0] = max(depth_max[0], depth)
+                path = label[label.rfind("(") + 1:-1]; color = COLORS[categorize([path])]
+                tip = html.escape(f"{label} · {kid['n']} samples ({kid['n'] * 100 / total:.1f}%)")
+                text = html.escape(label[:int(w / 7)]) if w > 35 else ""
+                y = 24 + depth * row_height
+                rects.append(f'<g><title>{tip}</title><rect x="{x:.1f}" y="{y}" width="{max(w - 0.5, 0.5):.1f}" height="{row_height - 1}" fill="{color}" rx="1"/>'
+                             f'<text x="{x + 3:.1f}" y="{y + row_height - 5}">{text}</text></g>')
+                walk(kid, x, depth + 1)
+            x += w
+
+    walk(root, 0, 0)
+    height = 24 + (depth_max[0] + 1) * row_height + 4
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">'
+            f'<style>text{{fill:#fff;pointer-events:none}} .title{{fill:#000}} rect:hover{{stroke:#000}}</style>'
+            f'<text class="title" x="2" y="15" font-size="13">{html.escape(title)}</text>'
+            + "".join(rects) + "</svg>")
+
+
+class ProfileStore:
+    def __init__(self, directory, keep=MAX_PROFILES):
+        self.directory = directory; self.keep = keep; self._lock = threading.Lock()
+
+    def _path(self, profile_id, ext): return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def save(self, meta, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        safe = lambda v: "".join(c if c.isalnum() or c == "-" else "_" for c in str(v))
+        profile_id = f"{int(meta['started'] * 1000)}_{safe(meta.get('step', '-'))}_{safe(meta.get('session', ''))[:8]}"
+        meta = dict(meta, id=profile_id)
+        title = f"{meta.get('step')} · {meta.get('user', '-')} · {meta['duration_ms']:.0f} ms · {meta['samples']} samples"
+        with open(self._path(profile_id, "folded"), "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        with open(self._path(profile_id, "svg"), "w", encoding="utf-8") as f: f.write(render_flamegraph(stacks, title))
+        with open(self._path(profile_id, "json"), "w", encoding="utf-8") as f: json.dump(meta, f, ensure_ascii=False)
+        self._prune()
+        return profile_id
+
+    def _ids(self):
+        try: return sorted(n[:-5] for n in os.listdir(self.directory) if n.endswith(".json"))
+        except FileNotFoundError: return []
+
+    def _prune(self):
+        with self._lock:
+            for profile_id in self._ids()[:-self.keep]:
+                for ext in ("json", "folded", "svg"):
+                    try: os.remove(self._path(profile_id, ext))
+                    except FileNotFoundError: pass
+
+    def list(self, limit=50):
+        out = []
+        for profile_id in reversed(self._ids()[-limit:]):
+            try:
+                with open(self._path(profile_id, "json"), encoding="utf-8") as f: out.append(json.load(f))
+            except (OSError, ValueError): continue
+        return out
+
+    def read(self, profile_id, ext):
+        with open(self._path(profile_id, ext), encoding="utf-8") as f: return f.read()
@@ -0,0 +1,201 @@
+"""Shared cache ที่ใช้ร่วมกันได้หลาย replica (หลาย process / หลายเครื่อง)
+
+เลือก backend จาก URL:
+    sqlite:///shared_cache.db         ไฟล์ SQLite (WAL) สำหรับหลาย process บนเครื่องเดียว / volume เดียวกัน
+    redis://[:password@]host:6379/0   อะไรก็ได้ที่พูด Redis protocol (redis, valkey, keydb หรือ stand-in ในเครื่อง)
+
+ค่าทั้งหมดเก็บแบบ pickle จึงใช้กับ store ภายในที่เชื่อถือได้เท่านั้น
+"""
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+DEFAULT_CACHE_URL = "sqlite:///shared_cache.db"
+PURGE_INTERVAL = 600 # SQLite: ลบแถวที่หมดอายุอย่างมากทุกกี่วินาที (ไม่งั้นไฟล์โตไม่หยุด: catalog ทุก generation, order_folder ทุก Order)
+
+
+class SQLiteCache:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local(); self._next_purge = 0.0
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()): return None
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        now = time.time(); expires = now + ttl if ttl else None
+        self._conn().execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+        if now >= self._next_purge: self._next_purge = now + PURGE_INTERVAL; self.purge(now)
+
+    def purge(self, now=None):
+        return self._conn().execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires < ?", (now or time.time(),)).rowcount
+
+    def add(self, key, value, ttl=None):
+        # set เฉพาะเมื่อยังไม่มี key (หรือหมดอายุแล้ว) -> True ถ้าได้ set
+        now = time.time(); expires = now + ttl if ttl else None
+        cur = self._conn().execute(
+            "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE kv.expires IS NOT NULL AND kv.expires < ?", (key, value, expires, now))
+        return cur.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            value = int(row[0]) + 1 if row else 1
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, NULL)", (key, str(value).encode()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK"); raise
+        return value
+
+
+class RedisCache:
+    """Client Redis protocol (RESP) ขนาดเล็ก ใช้แค่ GET / SET / DEL / INCR"""
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None, timeout=2.0):
+        self.host, self.port, self.db, self.password, self.timeout = host, port, db, password, timeout
+        self._lock = threading.Lock(); self._sock = None; self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile("rb")
+        if self.password: self._send("AUTH", self.password)
+        if self.db: self._send("SELECT", self.db)
+
+    def _close(self):
+        try:
+            if self._sock is not None: self._sock.close()
+        finally:
+            self._sock = None; self._file = None
+
+    def _send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for a in args:
+            a = a if isinstance(a, bytes) else str(a).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(a), a))
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line: raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+": return rest
+        if kind == b"-": raise RuntimeError(rest.decode(errors="replace"))
+        if kind == b":": return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0: return None
+            data = self._file.read(n + 2); return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read_reply() for _ in range(n)]
+        raise RuntimeError(f"unexpected reply: {line!r}")
+
+    def _command(self, *args, retry=True):
+        # connection หลุด: ลองใหม่ 1 ครั้งเฉพาะคำสั่งที่ส่งซ้ำได้ (GET / SET / DEL), INCR / SET NX ถ้าส่งไปถึงแล้วส่งซ้ำผลจะผิด -> raise
+        with self._lock:
+            for attempt in (1, 2):
+                sent = False
+                try:
+                    if self._sock is None: self._connect()
+                    sent = True; return self._send(*args)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt == 2 or (sent and not retry): raise
+
+    def get(self, key): return self._command("GET", key)
+
+    def set(self, key, value, ttl=None):
+        if ttl: self._command("SET", key, value, "PX", int(ttl * 1000))
+        else: self._command("SET", key, value)
+
+    def add(self, key, value, ttl=None):
+        args = ("SET", key, value, "NX") + (("PX", int(ttl * 1000)) if ttl else ())
+        return self._command(*args, retry=False) is not None
+
+    def delete(self, key): self._command("DEL", key)
+
+    def incr(self, key): return self._command("INCR", key, retry=False)
+
+
+class SharedCache:
+    """ชั้นบนของ backend: generation สำหรับ invalidate ข้าม process และ refresh แบบ single-flight"""
+
+    def __init__(self, backend, prefix="amaze"):
+        self.backend = backend; self.prefix = prefix
+
+    def _key(self, key): return f"{self.prefix}:{key}"
+
+    def get(self, key, default=None):
+        raw = self.backend.get(self._key(key))
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(self._key(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    def add(self, key, value, ttl=None):
+        # set เฉพาะเมื่อยังไม่มี key (หรือหมดอายุแล้ว) -> True ถ้าได้ set: ใช้เป็น lease ข้าม replica
+        return self.backend.add(self._key(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    def delete(self, key): self.backend.delete(self._key(key))
+
+    def generation(self, namespace):
+        raw = self.backend.get(self._key(f"gen:{namespace}"))
+        return int(raw) if raw is not None else 0
+
+    def invalidate(self, namespace):
+        # ทุก replica เห็น generation ใหม่ในการเรียกครั้งถัดไป -> key เดิมทั้งหมดของ namespace นี้ถูกข้าม
+        return self.backend.incr(self._key(f"gen:{namespace}"))
+
+    def get_or_refresh(self, key, loader, ttl=None, cache_if=None, lock_ttl=60, wait=30):
+        # single-flight: มีแค่ replica เดียวที่เรียก loader, ตัวอื่นรอผลจาก cache
+        full_key = self._key(key); lock_key = self._key(f"lock:{key}")
+        raw = self.backend.get(full_key)
+        if raw is not None: return pickle.loads(raw)
+        deadline = time.time() + wait; delay = 0.05
+        while not self.backend.add(lock_key, b"1", lock_ttl):
+            if time.time() >= deadline: return loader()
+            time.sleep(delay); delay = min(delay * 2, 0.5)
+            raw = self.backend.get(full_key)
+            if raw is not None: return pickle.loads(raw)
+        try:
+            value = loader()
+            if cache_if is None or cache_if(value): self.set(key, value, ttl)
+            return value
+        finally:
+            self.backend.delete(lock_key)
+
+
+def open_cache(url=None, prefix="amaze"):
+    url = url or os.environ.get("AMAZE_CACHE_URL") or DEFAULT_CACHE_URL
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        path = unquote(parsed.path)
+        if url.startswith("sqlite:///") and not url.startswith("sqlite:////"): path = path.lstrip("/")
+        return SharedCache(SQLiteCache(path or "shared_cache.db"), prefix)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return SharedCache(RedisCache(parsed.hostname or "localhost", parsed.port or 6379, db, unquote(parsed.password) if parsed.password else None), prefix)
+    raise ValueError(f"unsupported cache url: {url}")
@@ -0,0 +1,32 @@
+"""แปลงค่าจาก Google Sheet (get_all_values) เป็น DataFrame แบบเดียวกันทั้งแอปและ scanner API
+
+- ตัดช่องว่างหัวคอลัมน์, คอลัมน์ barcode / id เป็นข้อความและตัด ".0" ท้าย (Sheet ส่งตัวเลขมาเป็น 885...0.0)
+- หัวคอลัมน์ "barcode" ตัวพิมพ์ใดก็ได้ เปลี่ยนชื่อเป็น "Barcode"
+pandas import ตอนเรียกใช้ (แอปโหลด library หนักแบบ lazy): งานที่ใช้แค่แถวดิบ (เช่นหน้า Login) ใช้ key_text / find_row ได้โดยไม่โหลด pandas
+"""
+import re
+
+
+def is_key_column(header): return 'barcode' in str(header).lower() or 'id' in str(header).lower()
+
+
+def key_text(value): return re.sub(r'\.0$', '', str(value))
+
+
+def find_row(rows, value, column=0):
+    # แถวแรก (ไม่รวม header) ที่คอลัมน์ column ตรงกับ value แบบเดียวกับ values_to_frame -> list หรือ None
+    if len(rows) < 2: return None
+    clean = key_text if is_key_column(rows[0][column]) else str
+    return next((row for row in rows[1:] if len(row) > column and clean(row[column]) == str(value)), None)
+
+
+def values_to_frame(rows):
+    import pandas as pd
+    if len(rows) < 2: return pd.DataFrame()
+    df = pd.DataFrame(rows[1:], columns=rows[0]); df.columns = df.columns.str.strip()
+    for col in df.columns:
+        if is_key_column(col): df[col] = df[col].astype(str).str.replace(r'\.0$', '', regex=True)
+    if 'Barcode' not in df.columns:
+        for col in df.columns:
+            if col.lower() == 'barcode': df.rename(columns={col: 'Barcode'}, inplace=True); break
+    return df
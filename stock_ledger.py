@@ -0,0 +1,217 @@
+"""จองสต็อกในหน่วยความจำ (ทั้ง process) กันพนักงานหลายคนเบิกชิ้นสุดท้ายที่ Location เดียวกัน
+
+key = (barcode, "Zone-Location") แบบเดียวกับ _find_product, ค่าเริ่มต้นมาจากคอลัมน์สต็อกของ Sheet catalog
+
+    เพิ่มลงตะกร้า  -> reserve(holder, key, qty)     พอ = จองทันที, ไม่พอ = (False, ที่เหลือให้เบิก)
+    รีเซ็ต / ทิ้งไว้ -> release(holder)               (holder ที่เงียบเกิน hold_ttl ถูกปล่อยอัตโนมัติ)
+    อัปโหลดสำเร็จ  -> commit(holder, cart_lines(items))  หักตามตะกร้าที่ส่งจริง (แม้ยอดจองหมดอายุไปแล้ว) แล้วรอ reconcile
+    StockReconciler ทุก interval: seed ยอดจาก snapshot ของ catalog ใน shared cache (ไม่ดึงทั้ง Sheet เอง)
+      process ที่มียอดหักค้าง ถือ lease ใน shared cache (เขียนได้ทีละ process) อ่านเฉพาะช่องที่จะหักจาก Sheet, เขียนใน request เดียว
+      แล้วเก็บค่าที่เขียนไว้ใน shared cache ให้ทุก process ใช้ทับ snapshot จนกว่า snapshot จะโหลดใหม่หลังการเขียนแน่นอน
+
+ทุกคำสั่งเป็น O(1) ต่อรายการ: lock แยกตาม key (striped) ไม่มี lock ใหญ่ตัวเดียวขวางการสแกน
+key ที่ไม่มีค่าสต็อกใน Sheet = ไม่จำกัด (ไม่ตรวจ)
+"""
+import os
+import re
+import threading
+import time
+import uuid
+
+HOLD_TTL = 1800
+RECONCILE_INTERVAL = 60
+LOCK_STRIPES = 64
+LEASE_TTL = 60
+WRITTEN_TTL = 1200
+LEASE_KEY = "stock:lease"; WRITTEN_KEY = "stock:written" # key ใน shared cache
+TARGET_FIELD = "_target_loc" # field ในรายการตะกร้า: Zone-Location เป้าหมายจาก catalog (key ที่ใช้จอง), ไม่แสดง / ไม่ลง Log
+
+
+def _qty(text):
+    try: return int(float(str(text).replace(",", "")))
+    except (ValueError, OverflowError): return None # ช่องว่าง / ไม่ใช่ตัวเลข / inf = ไม่จำกัด
+
+
+def parse_catalog_stock(values, stock_column):
+    # ค่าจาก get_all_values() ของ catalog -> {(barcode, "Zone-Location"): (cell A1, จำนวน, cell A1 ของ barcode)} หรือ None ถ้าไม่มีคอลัมน์สต็อก
+    if not values or not stock_column: return None
+    headers = [str(h).strip().lower() for h in values[0]]
+    if stock_column.strip().lower() not in headers or "barcode" not in headers: return None
+    col = headers.index(stock_column.strip().lower()); barcode_col = headers.index("barcode")
+    zone_col = headers.index("zone") if "zone" in headers else None; loc_col = headers.index("location") if "location" in headers else None
+    cell = lambda r, c: str(values[r][c]) if c is not None and c < len(values[r]) else ""
+    out = {}
+    for r in range(1, len(values)):
+        key = (re.sub(r"\.0$", "", cell(r, barcode_col)), f"{cell(r, zone_col).strip()}-{cell(r, loc_col).strip()}")
+        qty = _qty(cell(r, col))
+        if qty is None: continue
+        out.setdefault(key, (_a1(r + 1, col + 1), qty, _a1(r + 1, barcode_col + 1))) # แถวแรกที่ตรงชนะ เหมือน _find_product
+    return out
+
+
+def parse_catalog_frame(df, stock_column):
+    # DataFrame ของ catalog (sheet_data.values_to_frame: แถวครบตามลำดับใน Sheet) -> แบบเดียวกับ parse_catalog_stock
+    if df is None or df.empty: return None
+    return parse_catalog_stock([list(df.columns)] + df.astype(str).values.tolist(), stock_column)
+
+
+def cart_lines(items):
+    # รายการตะกร้าที่ส่ง -> {(barcode, Zone-Location เป้าหมาย): จำนวน}
+    lines = {}
+    for item in items:
+        if not item.get(TARGET_FIELD): continue
+        key = (str(item['Barcode']), item[TARGET_FIELD]); lines[key] = lines.get(key, 0) + int(item['Qty'])
+    return lines
+
+
+def _a1(row, col):
+    letters = ""
+    while col: col, rem = divmod(col - 1, 26); letters = chr(65 + rem) + letters
+    return f"{letters}{row}"
+
+
+class StockLedger:
+    def __init__(self, stripes=LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._on_hand = {}; self._reserved = {}; self._pending = {} # pending = commit แล้วแต่ยังไม่ได้เขียนลง Sheet
+        self._holds = {}; self._holds_lock = threading.Lock()
+
+    def _lock(self, key): return self._locks[hash(key) % len(self._locks)]
+
+    def available(self, key):
+        # จำนวนที่ยังเบิกได้ (ไม่รวมที่คนอื่นจองไว้), None = ไม่ได้ตรวจสต็อก key นี้
+        on_hand = self._on_hand.get(key)
+        return None if on_hand is None else on_hand - self._reserved.get(key, 0)
+
+    def reserve(self, holder, key, qty):
+        # -> (จองได้ไหม, จำนวนที่เหลือให้เบิกหลังจองนี้ / ที่มีอยู่ถ้าจองไม่ได้)
+        with self._lock(key):
+            on_hand = self._on_hand.get(key)
+            if on_hand is None: return True, None
+            available = on_hand - self._reserved.get(key, 0)
+            if qty > available: return False, available
+            self._reserved[key] = self._reserved.get(key, 0) + qty
+        with self._holds_lock:
+            hold = self._holds.setdefault(holder, {'lines': {}, 'seen': 0})
+            hold['lines'][key] = hold['lines'].get(key, 0) + qty; hold['seen'] = time.time()
+        return True, available - qty
+
+    def touch(self, holder):
+        hold = self._holds.get(holder)
+        if hold is not None: hold['seen'] = time.time()
+
+    def _pop(self, holder):
+        with self._holds_lock: hold = self._holds.pop(holder, None)
+        return hold['lines'] if hold else {}
+
+    def release(self, holder):
+        lines = self._pop(holder)
+        for key, qty in lines.items():
+            with self._lock(key): self._reserved[key] = self._reserved.get(key, 0) - qty
+        return lines
+
+    def commit(self, holder, lines=None):
+        # ของถูกเบิกจริง: ปล่อยยอดจองของ holder แล้วหักสต็อกตาม lines ({key: จำนวน} จากตะกร้าที่ส่ง, None = ตามที่จองไว้)
+        # ไม่ขึ้นกับยอดจอง: session ที่เงียบจนยอดจองหมดอายุแล้วค่อยส่ง ก็ยังหักครบ (ให้เรียกครั้งเดียวต่อการส่ง)
+        held = self.release(holder)
+        lines = held if lines is None else lines
+        for key, qty in lines.items():
+            with self._lock(key):
+                if key in self._on_hand: self._on_hand[key] -= qty; self._pending[key] = self._pending.get(key, 0) + qty
+        return lines
+
+    def expire(self, ttl=HOLD_TTL):
+        # session ที่หายไปโดยไม่รีเซ็ต (ปิดแท็บ / มือถือดับ): ปล่อยของที่จองไว้
+        cutoff = time.time() - ttl
+        stale = [h for h, hold in list(self._holds.items()) if hold['seen'] < cutoff]
+        return {h: self.release(h) for h in stale}
+
+    # --- RECONCILE ---
+    def pending(self): return {k: v for k, v in list(self._pending.items()) if v}
+
+    def confirm(self, flushed):
+        # ยอดที่เขียนลง Sheet แล้ว (commit ที่เกิดระหว่างเขียนยังค้างอยู่ใน pending)
+        for key, qty in flushed.items():
+            with self._lock(key): self._pending[key] = self._pending.get(key, 0) - qty
+
+    def seed(self, stock):
+        # stock: {key: จำนวนใน Sheet} -> สต็อกในเครื่อง = ค่าใน Sheet - ที่ commit แล้วแต่ยังไม่ได้เขียน
+        for key, qty in stock.items():
+            with self._lock(key): self._on_hand[key] = qty - self._pending.get(key, 0)
+        for key in [k for k in list(self._on_hand) if k not in stock]:
+            with self._lock(key): self._on_hand.pop(key, None) # ลบสต็อกออกจาก Sheet = เลิกตรวจ
+
+    def stats(self):
+        return {'tracked': len(self._on_hand), 'reserved': sum(v for v in list(self._reserved.values()) if v),
+                'holders': len(self._holds), 'pending': sum(self.pending().values())}
+
+
+class StockReconciler:
+    def __init__(self, ledger, read_stock, read_cells, write_cells, cache=None, interval=RECONCILE_INTERVAL, hold_ttl=HOLD_TTL, written_ttl=WRITTEN_TTL):
+        # read_stock() -> parse_catalog_stock ของ snapshot catalog (โหลด snapshot ไม่ได้ให้ raise ไม่ใช่คืน None)
+        # read_cells([A1]) -> {A1: ค่าใน Sheet ตอนนี้}, write_cells({A1: จำนวน}) เขียนใน request เดียว
+        # cache: SharedCache สำหรับ lease + ค่าที่เขียนแล้ว (None = process เดียว เก็บในเครื่อง)
+        # written_ttl: ค่าที่เขียนแล้วใช้ทับ snapshot นานเท่านี้ (>= อายุสูงสุดของ snapshot: หลังจากนั้น snapshot โหลดหลังการเขียนแน่นอน)
+        self.ledger = ledger; self.read_stock = read_stock; self.read_cells = read_cells; self.write_cells = write_cells
+        self.cache = cache; self.interval = interval; self.hold_ttl = hold_ttl; self.written_ttl = written_ttl
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"; self._written_local = {}; self.last_error = None
+
+    def start(self):
+        threading.Thread(target=self._run, name="stock-reconciler", daemon=True).start()
+        return self
+
+    # --- LEASE (เขียน Sheet ได้ทีละ process) ---
+    def _claim(self):
+        if self.cache is None: return True
+        return self.cache.add(LEASE_KEY, self.owner, LEASE_TTL) or self.cache.get(LEASE_KEY) == self.owner
+
+    def _release(self):
+        if self.cache is not None and self.cache.get(LEASE_KEY) == self.owner: self.cache.delete(LEASE_KEY)
+
+    # --- ค่าที่เขียนแล้ว (ทับ snapshot ที่อาจยังเป็นค่าก่อนเขียน) ---
+    def _written(self):
+        written = self.cache.get(WRITTEN_KEY, {}) if self.cache is not None else self._written_local
+        cutoff = time.time() - self.written_ttl
+        return {key: value for key, (value, ts) in written.items() if ts >= cutoff}
+
+    def _remember(self, values):
+        now = time.time(); cutoff = now - self.written_ttl
+        raw = self.cache.get(WRITTEN_KEY, {}) if self.cache is not None else self._written_local
+        written = {key: entry for key, entry in raw.items() if entry[1] >= cutoff}
+        written.update({key: (value, now) for key, value in values.items()})
+        if self.cache is not None: self.cache.set(WRITTEN_KEY, written, self.written_ttl)
+        else: self._written_local = written
+
+    def _flush(self, stock, flushed):
+        # อ่าน-หัก-เขียนเฉพาะช่องที่มียอดหัก (ถือ lease อยู่): ยอดที่คนเติมใน Sheet ไม่ถูกทับ
+        cells = [a1 for key in flushed for a1 in (stock[key][0], stock[key][2])]
+        current = self.read_cells(cells); updates = {}; values = {}; done = {}
+        for key, qty in flushed.items():
+            cell, _, barcode_cell = stock[key]
+            if re.sub(r"\.0$", "", str(current.get(barcode_cell, ""))) != key[0]: continue # แถวเลื่อนหลัง snapshot: รอ snapshot ใหม่
+            value = _qty(current.get(cell, "")); done[key] = qty
+            if value is not None: updates[cell] = values[key] = value - qty # ช่องถูกล้าง = เลิกตรวจ ทิ้งยอดนี้
+        if updates: self.write_cells(updates)
+        self.ledger.confirm(done); self._remember(values)
+
+    def reconcile_once(self):
+        self.ledger.expire(self.hold_ttl)
+        stock = self.read_stock(); pending = self.ledger.pending()
+        if stock is None: # Sheet ไม่มีคอลัมน์สต็อก: ไม่ตรวจอะไร
+            self.ledger.seed({}); self.ledger.confirm(pending); return False
+        self.ledger.confirm({key: qty for key, qty in pending.items() if key not in stock}) # แถวถูกลบจาก Sheet ไปแล้ว: ทิ้งยอดนี้
+        flushed = {key: qty for key, qty in pending.items() if key in stock}
+        if flushed and self._claim(): # ไม่ได้ lease: ยอดค้างไว้ใน pending ลองรอบหน้า
+            try: self._flush(stock, flushed)
+            finally: self._release()
+        written = self._written()
+        self.ledger.seed({key: written.get(key, qty) for key, (cell, qty, _) in stock.items()})
+        return True
+
+    def _run(self):
+        while True:
+            try: tracked = self.reconcile_once(); self.last_error = None
+            except Exception as e:
+                tracked = True; self.last_error = f"{time.strftime('%H:%M:%S')} {e}"
+                print(f"⚠️ Reconcile สต็อกไม่สำเร็จ (จะลองใหม่): {e}")
+            time.sleep(self.interval if tracked else self.interval * 10)
@@ -0,0 +1,52 @@
+"""บันทึกความคืบหน้าของการส่งงาน (แพ็ค / ส่ง Rider) กันกดซ้ำ / rerun / retry สร้าง Folder และ Log ซ้ำ
+
+ไฟล์ jsonl เดียวกันใช้ได้ทั้งแอปและ scanner API: key มาจากเนื้อหาที่ส่ง (make_submission_key)
+แต่ละบรรทัดคือส่วนที่อัปเดตของ key นั้น, ตอนเปิดไฟล์ตัดรายการที่เก่ากว่า keep_days แล้วเขียนไฟล์ใหม่ให้ไฟล์ไม่โตเรื่อยๆ
+
+    ledger = SubmissionLedger("submission_ledger.jsonl", keep_days=7)
+    key = make_submission_key("PACK", user_id, order_id, items, *photos)
+    ledger.record(key, folder_id=fid); ledger.get(key).get('done')
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def make_submission_key(kind, *parts):
+    # key มาจากเนื้อหาที่ส่ง: กดซ้ำด้วยข้อมูลเดิม (จาก UI หรือ API) ได้ key เดิม, เปลี่ยนรูป/รายการได้ key ใหม่
+    h = hashlib.sha256(kind.encode("utf-8"))
+    for p in parts:
+        h.update(p if isinstance(p, bytes) else json.dumps(p, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")); h.update(b"|")
+    return f"{kind}_{h.hexdigest()[:32]}"
+
+
+class SubmissionLedger:
+    def __init__(self, path, keep_days=None):
+        # key -> ความคืบหน้าของการส่งครั้งนั้น (folder, ไฟล์ที่อัปแล้ว, จำนวน log ที่บันทึกแล้ว, done)
+        self.path = path; self.lock = threading.Lock(); self.entries = {}
+        if not os.path.exists(path): return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try: rec = json.loads(line); self.entries.setdefault(rec['key'], {}).update(rec['data'])
+                except (ValueError, KeyError): continue
+        if keep_days is not None: self.compact(time.time() - keep_days * 86400)
+
+    def compact(self, cutoff):
+        # ตัดรายการที่สร้างก่อน cutoff แล้วเขียนไฟล์ใหม่ (tmp + rename)
+        with self.lock:
+            self.entries = {k: v for k, v in self.entries.items() if v.get('created', 0) >= cutoff}
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                for k, v in self.entries.items(): f.write(json.dumps({'key': k, 'data': v}, ensure_ascii=False) + "\n")
+            os.replace(self.path + ".tmp", self.path)
+
+    def get(self, key):
+        with self.lock: return dict(self.entries.get(key, {}))
+
+    def record(self, key, **data):
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            if 'created' not in entry: data['created'] = time.time()
+            entry.update(data)
+            with open(self.path, "a", encoding="utf-8") as f: f.write(json.dumps({'key': key, 'data': data}, ensure_ascii=False) + "\n")